@@ -0,0 +1,68 @@
+"""
+bench_ask_recommend
+===================
+
+End-to-end page latency: two-call flow vs fused endpoint.
+
+Workflow
+--------
+For every question in ``tests/qa_eval.jsonl``:
+
+1. **two-call** – ``POST /api/ask`` followed by ``POST /api/recommend``
+   (what the web UI did so far).
+2. **fused**    – a single ``POST /api/ask_recommend``.
+
+Each flow uses its own fresh user id so neither benefits from the
+other's profile or from request coalescing. Mean / p50 / p95 latency
+per flow is printed at the end.
+
+Running
+-------
+Start the server first (``uvicorn main:app``), then:
+
+>>> python scripts/bench_ask_recommend.py --base-url http://127.0.0.1:8000
+"""
+import argparse
+import json
+import time
+import uuid
+
+import httpx
+import numpy as np
+
+
+def two_call(client: httpx.Client, question: str, uid: str):
+    client.post("/api/ask", json={"question": question, "user_id": uid}).raise_for_status()
+    client.post("/api/recommend", json={"user_id": uid, "top_k": 3}).raise_for_status()
+
+
+def fused(client: httpx.Client, question: str, uid: str):
+    client.post("/api/ask_recommend",
+                json={"question": question, "user_id": uid, "top_k": 3}).raise_for_status()
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--base-url", default="http://127.0.0.1:8000")
+    ap.add_argument("--dataset", default="tests/qa_eval.jsonl")
+    args = ap.parse_args()
+
+    with open(args.dataset, encoding="utf-8") as f:
+        questions = [json.loads(line)["user_input"] for line in f if line.strip()]
+
+    latencies = {"two-call": [], "fused": []}
+    with httpx.Client(base_url=args.base_url, timeout=120) as client:
+        for q in questions:
+            for name, flow in (("two-call", two_call), ("fused", fused)):
+                t0 = time.perf_counter()
+                flow(client, q, f"bench-{name}-{uuid.uuid4().hex[:8]}")
+                latencies[name].append(time.perf_counter() - t0)
+
+    print(f"{'flow':10s} {'mean (s)':>9s} {'p50 (s)':>9s} {'p95 (s)':>9s}")
+    for name, lat in latencies.items():
+        print(f"{name:10s} {np.mean(lat):9.3f} {np.percentile(lat, 50):9.3f} "
+              f"{np.percentile(lat, 95):9.3f}")
+
+
+if __name__ == "__main__":
+    main()
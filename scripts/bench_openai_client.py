@@ -0,0 +1,96 @@
+"""
+bench_openai_client
+===================
+
+Embedding throughput and connection reuse of the shared OpenAI client
+layer (:py:mod:`app.services.provider`) under concurrency.
+
+Workflow
+--------
+1. Optionally start ``scripts/stub_openai.py`` (``--spawn-stub``);
+   otherwise ``--base-url`` / ``OPENAI_BASE_URL`` is used as is.
+2. For every concurrency level, ``N`` threads each embed ``--queries``
+   distinct questions with ``embed_query``, once one request per call
+   (``single``) and once through the batching window (``batched``).
+3. Print wall-clock queries/s, upstream requests, mean batch size and
+   the share of requests served on an already open connection.
+
+Running
+-------
+>>> python scripts/bench_openai_client.py --spawn-stub --concurrency 1 8 32 128
+"""
+import argparse
+import os
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import httpx
+
+from app.services.provider import OpenAIProvider
+
+ROOT = Path(__file__).resolve().parents[1]
+
+
+def run(mode: str, concurrency: int, n_queries: int, base_url: str, window: float) -> dict:
+    provider = OpenAIProvider(base_url=base_url, embed_window=window)
+    emb = provider.embeddings()
+    embed = emb.embed_query if mode == "batched" else emb.inner.embed_query
+
+    def user(u: int):
+        for i in range(n_queries):
+            embed(f"pregunta {u}-{i}: ¿cuánto cobra la plataforma por hito?")
+
+    t0 = time.perf_counter()
+    with ThreadPoolExecutor(concurrency) as pool:
+        list(pool.map(user, range(concurrency)))
+    elapsed = time.perf_counter() - t0
+    status = provider.status()
+    provider.close()
+    return {
+        "qps": concurrency * n_queries / elapsed,
+        "requests": status["http_requests"],
+        "batch": concurrency * n_queries / max(1, status["http_requests"]),
+        "reuse": status["connection_reuse"],
+    }
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--concurrency", type=int, nargs="+", default=[1, 8, 32, 128])
+    ap.add_argument("--queries", type=int, default=20, help="queries per thread")
+    ap.add_argument("--window-ms", type=float, default=5.0)
+    ap.add_argument("--base-url", default=os.getenv("OPENAI_BASE_URL"))
+    ap.add_argument("--spawn-stub", action="store_true")
+    ap.add_argument("--stub-port", type=int, default=9010)
+    args = ap.parse_args()
+
+    stub = None
+    if args.spawn_stub:
+        os.environ.setdefault("OPENAI_API_KEY", "sk-stub")
+        args.base_url = f"http://127.0.0.1:{args.stub_port}/v1"
+        stub = subprocess.Popen([sys.executable, str(ROOT / "scripts/stub_openai.py"),
+                                 "--port", str(args.stub_port)])
+        for _ in range(120):
+            try:
+                httpx.get(f"http://127.0.0.1:{args.stub_port}/docs", timeout=2)
+                break
+            except httpx.HTTPError:
+                time.sleep(0.5)
+    try:
+        print(f"{'mode':8s} {'threads':>7s} {'queries/s':>10s} {'requests':>9s} "
+              f"{'texts/req':>10s} {'conn reuse':>11s}")
+        for n in args.concurrency:
+            for mode in ("single", "batched"):
+                r = run(mode, n, args.queries, args.base_url, args.window_ms / 1000)
+                print(f"{mode:8s} {n:7d} {r['qps']:10.1f} {r['requests']:9d} "
+                      f"{r['batch']:10.1f} {r['reuse']:11.1%}")
+    finally:
+        if stub is not None:
+            stub.terminate()
+
+
+if __name__ == "__main__":
+    main()
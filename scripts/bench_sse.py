@@ -0,0 +1,78 @@
+"""
+bench_sse
+=========
+
+Micro-benchmark for the SSE encoder used by ``GET /api/v1/ask_stream``.
+
+Workflow
+--------
+1. Spawn *N* concurrent synthetic answers, each emitting ``--tokens``
+   tokens at ``--rate`` tokens/s (no LLM, no network).
+2. Encode them either one frame per token (``raw``, the legacy
+   behaviour) or through :py:func:`app.api.v1.sse.encode_sse`
+   (``coalesced``).
+3. Print frames per answer and server CPU seconds per stream.
+
+Running
+-------
+>>> python scripts/bench_sse.py --streams 1 10 100
+"""
+import argparse
+import asyncio
+import time
+from collections import Counter
+
+from app.api.v1.sse import encode_sse
+
+
+async def synthetic_answer(n_tokens: int, rate: float):
+    for i in range(n_tokens):
+        await asyncio.sleep(1 / rate)
+        yield "token", f"tok{i} "
+
+
+async def raw_frames(events):
+    async for _, token in events:
+        yield f"data: {token}\n\n"
+
+
+async def drain(frames, stats: Counter):
+    async for _ in frames:
+        stats["frames"] += 1
+
+
+async def run(mode: str, streams: int, n_tokens: int, rate: float) -> dict:
+    stats = Counter()
+    cpu0 = time.process_time()
+    jobs = []
+    for _ in range(streams):
+        events = synthetic_answer(n_tokens, rate)
+        frames = raw_frames(events) if mode == "raw" else encode_sse(events)
+        jobs.append(drain(frames, stats))
+    await asyncio.gather(*jobs)
+    cpu = time.process_time() - cpu0
+    return {
+        "mode": mode,
+        "streams": streams,
+        "frames_per_answer": stats["frames"] / streams,
+        "cpu_ms_per_stream": 1000 * cpu / streams,
+    }
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--streams", type=int, nargs="+", default=[1, 10, 100])
+    ap.add_argument("--tokens", type=int, default=300)
+    ap.add_argument("--rate", type=float, default=200.0, help="tokens per second")
+    args = ap.parse_args()
+
+    print(f"{'mode':10s} {'streams':>7s} {'frames/answer':>14s} {'cpu ms/stream':>14s}")
+    for n in args.streams:
+        for mode in ("raw", "coalesced"):
+            r = asyncio.run(run(mode, n, args.tokens, args.rate))
+            print(f"{r['mode']:10s} {r['streams']:7d} "
+                  f"{r['frames_per_answer']:14.1f} {r['cpu_ms_per_stream']:14.2f}")
+
+
+if __name__ == "__main__":
+    main()
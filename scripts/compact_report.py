@@ -0,0 +1,96 @@
+"""
+compact_report
+==============
+
+Accuracy vs memory report for the compact recommender vectors
+(:py:mod:`app.services.compact`).
+
+Workflow
+--------
+1. Embed every history query and user input of
+   ``tests/profile_eval.jsonl`` once (one batched call) and take the
+   top-3 retrieved files of each query as the answer sources.
+2. For every codec configuration (full precision, float16, int8,
+   truncated and PCA-projected variants) replay the same profiles
+   through a fresh :class:`RecommendationService` and compute
+   title-level Precision@3, exactly like ``run_ragas_eval_profiles``.
+3. Report bytes per vector and the resulting memory for one million
+   document chunks and one million users (``--queries-per-user``).
+
+No LLM call is made; only the embedding API is used.
+
+Running
+-------
+>>> python scripts/compact_report.py --queries-per-user 10
+"""
+import argparse
+import tempfile
+from pathlib import Path
+
+import numpy as np
+
+from eval_runner import load_jsonl
+from app.deps import get_rag
+from app.services.compact import VectorCodec
+from app.services.recommender import RecommendationService
+
+CONFIGS = {
+    "full (f64 docs / f32 queries)": None,
+    "float16": VectorCodec(dtype="float16"),
+    "int8": VectorCodec(dtype="int8"),
+    "truncate-512 float16": VectorCodec(512, "float16"),
+    "truncate-256 int8": VectorCodec(256, "int8"),
+    "pca-256 int8": VectorCodec(256, "int8", "pca"),
+}
+
+
+def precision_at_k(recs: list[dict], expected: list[str]) -> float:
+    titles = [r["title"].lower() for r in recs]
+    return sum(t in expected for t in titles) / len(titles) if titles else 0.0
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--dataset", default="tests/profile_eval.jsonl")
+    ap.add_argument("--queries-per-user", type=float, default=None,
+                    help="average stored queries per user (default: from dataset)")
+    args = ap.parse_args()
+
+    examples = load_jsonl(args.dataset)
+    rag = get_rag()
+
+    queries = sorted({q for ex in examples for q in [*ex["history"], ex["user_input"]]})
+    qvecs = dict(zip(queries, rag.emb.embed_documents(queries)))
+    sources = {q: [d.metadata["source"] for d in
+                   rag.vectordb.similarity_search_by_vector(qvecs[q], k=3)]
+               for q in queries}
+    qpu = args.queries_per_user or np.mean([len(ex["history"]) + 1 for ex in examples])
+
+    print(f"{'config':30s} {'P@3':>6s} {'B/doc':>7s} {'B/query':>8s} "
+          f"{'GB / 1M chunks':>15s} {'GB / 1M users':>14s}")
+    for name, codec in CONFIGS.items():
+        try:
+            svc = RecommendationService(rag.vectordb, codec=codec, provider=rag.provider,
+                                        persist_path=str(Path(tempfile.mkdtemp()) / "p.json"))
+        except ValueError as exc:                           # e.g. fewer chunks than PCA dims
+            print(f"{name:30s} skipped: {exc}")
+            continue
+        scores = []
+        for idx, ex in enumerate(examples):
+            uid = f"report_{idx}"
+            for q in [*ex["history"], ex["user_input"]]:
+                svc.recommend_with_hits(uid, qvecs[q], sources[q], [], k=3)
+            scores.append(precision_at_k(svc.recommend(uid, k=3, fresh=True),
+                                         ex["expected_sources"]))
+
+        _, emb, _, _ = svc._get_vectors()
+        doc_bytes = emb.nbytes / len(emb)
+        query_stack = svc._profiles["report_0"].qvecs
+        query_bytes = (query_stack.nbytes / len(query_stack) if codec is not None
+                       else query_stack[0].nbytes)
+        print(f"{name:30s} {np.mean(scores):6.3f} {doc_bytes:7.0f} {query_bytes:8.0f} "
+              f"{doc_bytes * 1e6 / 1e9:15.2f} {query_bytes * qpu * 1e6 / 1e9:14.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,131 @@
+"""
+eval_runner
+===========
+
+Shared machinery for the offline evaluation scripts.
+
+* :class:`ResultStore` – append-only JSONL file with one record per
+  finished example. Re-running a script skips every example already in
+  the file, so an interrupted run resumes where it stopped.
+* :func:`replay` – runs an async worker over all examples concurrently,
+  bounded by an :class:`asyncio.Semaphore`.
+* :func:`latency_summary` – mean and p50/p95/p99 of ``perf_counter``
+  latencies.
+
+Used by ``run_ragas_eval.py`` and ``run_ragas_eval_profiles.py``.
+"""
+import asyncio
+import hashlib
+import json
+from pathlib import Path
+
+import numpy as np
+
+
+def load_jsonl(path) -> list[dict]:
+    """Read a JSONL file into a list of dicts (blank lines are skipped)."""
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def example_key(idx: int, example: dict) -> str:
+    """Stable key of one example: position + content hash (detects edited datasets)."""
+    digest = hashlib.sha1(json.dumps(example, sort_keys=True).encode()).hexdigest()[:10]
+    return f"{idx}:{digest}"
+
+
+class ResultStore:
+    """
+    Append-only per-example result cache.
+
+    Parameters
+    ----------
+    path : str | Path
+        JSONL file; created (with parent folders) if missing.
+    fresh : bool, default False
+        Discard previously stored results instead of resuming.
+
+    A line cut short by an interrupted run is dropped from the file;
+    if a key was stored twice the last record wins.
+    """
+    def __init__(self, path, fresh: bool = False):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        if fresh and self.path.exists():
+            self.path.unlink()
+        self.done: dict[str, dict] = {}
+        if self.path.exists():
+            text = self.path.read_text(encoding="utf-8")
+            if text and not text.endswith("\n"):       # killed mid-write
+                text = text[: text.rfind("\n") + 1]
+                self.path.write_text(text, encoding="utf-8")
+            for line in text.splitlines():
+                if line.strip():
+                    row = json.loads(line)
+                    self.done[row["key"]] = row
+
+    def add(self, key: str, record: dict):
+        """Persist one finished example immediately."""
+        record = {"key": key, **record}
+        with self.path.open("a", encoding="utf-8") as f:
+            f.write(json.dumps(record, ensure_ascii=False) + "\n")
+        self.done[key] = record
+
+    def ordered(self, examples: list[dict]) -> list[dict]:
+        """Stored records in dataset order (missing examples are skipped)."""
+        keys = (example_key(i, ex) for i, ex in enumerate(examples))
+        return [self.done[k] for k in keys if k in self.done]
+
+
+async def replay(examples: list[dict], worker, store: ResultStore,
+                 concurrency: int = 8) -> list[dict]:
+    """
+    Run ``await worker(idx, example)`` for every example not yet stored.
+
+    At most *concurrency* workers run at once. Failed examples are
+    reported and left out of the store so that the next run retries
+    them.
+
+    Returns
+    -------
+    list of dict
+        All stored records (old and new) in dataset order.
+    """
+    sem = asyncio.Semaphore(concurrency)
+    todo = [(i, ex) for i, ex in enumerate(examples)
+            if example_key(i, ex) not in store.done]
+    print(f"{len(examples) - len(todo)} cached, {len(todo)} to run "
+          f"(concurrency={concurrency})")
+
+    async def one(idx, example):
+        async with sem:
+            record = await worker(idx, example)
+        store.add(example_key(idx, example), record)
+
+    outcomes = await asyncio.gather(*(one(i, ex) for i, ex in todo),
+                                    return_exceptions=True)
+    failures = [(i, exc) for (i, _), exc in zip(todo, outcomes) if exc is not None]
+    for i, exc in failures:
+        print(f"⚠️  example {i} failed: {exc!r}")
+    if failures:
+        raise SystemExit(f"{len(failures)} example(s) failed; re-run to resume.")
+    return store.ordered(examples)
+
+
+def latency_summary(latencies) -> dict:
+    """Mean and tail percentiles (seconds) of a list of latencies."""
+    lat = np.asarray(latencies, dtype=float)
+    if not lat.size:
+        return {"n": 0, "total": 0.0, "mean": 0.0, "p50": 0.0, "p95": 0.0, "p99": 0.0}
+    p50, p95, p99 = np.percentile(lat, [50, 95, 99])
+    return {"n": int(lat.size), "total": float(lat.sum()), "mean": float(lat.mean()),
+            "p50": float(p50), "p95": float(p95), "p99": float(p99)}
+
+
+def print_latency(name: str, latencies):
+    """Print :func:`latency_summary` as one aligned block."""
+    s = latency_summary(latencies)
+    print(f"\n=== {name} latency ===")
+    print(f"Queries: {s['n']}   Sum of latencies (s): {s['total']:.2f}")
+    print(f"mean {s['mean']:.3f}s   p50 {s['p50']:.3f}s   "
+          f"p95 {s['p95']:.3f}s   p99 {s['p99']:.3f}s")
@@ -0,0 +1,310 @@
+"""
+loadtest
+========
+
+HTTP load generator that replays recorded support sessions against the
+FastAPI app and sweeps concurrency to find the saturation point.
+
+Traffic
+-------
+Sessions come from ``tests/synthetic_query_histories.json`` (one per
+user, greeting with the name from ``tests/synthetic_user_profiles.json``
+when available) and, optionally, from ``--traffic`` JSONL files whose
+lines carry ``question`` (and optionally ``user_id``) fields.
+
+For every question of a session a virtual user runs
+
+    POST /api/ask  →  GET /api/ask_stream  →  POST /api/recommend
+
+with an exponential think time (mean ``--think`` seconds) in between.
+``ask_stream`` additionally records time-to-first-token (TTFT).
+
+Target
+------
+* ``--base-url`` – an already running server, or
+* ``--spawn``    – start :mod:`stub_openai` plus ``uvicorn main:app``
+  (pointed at the stub through ``OPENAI_BASE_URL``) in a scratch
+  directory, so profiles / Chroma files of the repo are not touched.
+
+Report
+------
+For each concurrency level: throughput, p50/p95/p99 latency per
+endpoint, error rate and TTFT percentiles, written to
+``--out``.json and ``--out``.html (tables + latency/TTFT curves).
+Against the stub (``--spawn`` or ``--stub-url``) the report also counts
+the upstream calls of the level (``GET /stats`` of the stub), so a run
+whose answers never reach the chat endpoint is visible at a glance.
+
+Running
+-------
+>>> python scripts/loadtest.py --spawn --levels 1 4 16 32 --duration 30
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import httpx
+import numpy as np
+
+ROOT      = Path(__file__).resolve().parents[1]
+ENDPOINTS = ["ask", "ask_stream", "recommend"]
+
+
+# ---------- traffic ----------------------------------------------------------
+def load_sessions(traffic: list[str]) -> list[dict]:
+    """Build ``{"user_id", "questions"}`` sessions from the recorded datasets."""
+    names = {p["user_id"]: p.get("name")
+             for p in json.loads((ROOT / "tests/synthetic_user_profiles.json").read_text())}
+    sessions = []
+    for h in json.loads((ROOT / "tests/synthetic_query_histories.json").read_text()):
+        questions = list(h["query_history"])
+        if names.get(h["user_id"]):
+            questions[0] = f"Hola, soy {names[h['user_id']]}. {questions[0]}"
+        sessions.append({"user_id": h["user_id"], "questions": questions})
+
+    for path in traffic:
+        by_user = {}
+        with open(path, encoding="utf-8") as f:
+            for i, line in enumerate(f):
+                row = json.loads(line)
+                if "question" in row:
+                    by_user.setdefault(row.get("user_id", f"traffic-{i}"), []).append(row["question"])
+        sessions += [{"user_id": u, "questions": q} for u, q in by_user.items()]
+    return sessions
+
+
+# ---------- virtual users ----------------------------------------------------
+async def timed(records: list, endpoint: str, call):
+    """Run one request, appending ``{endpoint, latency, ok, ttft}`` to *records*."""
+    start = time.perf_counter()
+    rec = {"endpoint": endpoint, "ok": False, "ttft": None}
+    try:
+        rec["ttft"] = await call(start)
+        rec["ok"] = True
+    except Exception as exc:                       # counted as error
+        rec["error"] = type(exc).__name__
+    rec["latency"] = time.perf_counter() - start
+    records.append(rec)
+
+
+async def virtual_user(vu: int, client: httpx.AsyncClient, sessions: list[dict],
+                       think: float, stop_at: float, records: list):
+    """Loop over sessions until *stop_at*, replaying ask → ask_stream → recommend."""
+    rng = random.Random(vu)
+    n = 0
+    while time.perf_counter() < stop_at:
+        session = sessions[(vu + n) % len(sessions)]
+        uid = f"{session['user_id']}-vu{vu}-{n}"
+        n += 1
+        for question in session["questions"]:
+            if time.perf_counter() >= stop_at:
+                return
+
+            async def ask(_):
+                r = await client.post("/api/ask", json={"question": question, "user_id": uid})
+                r.raise_for_status()
+
+            async def ask_stream(start):
+                ttft = None
+                async with client.stream("GET", "/api/ask_stream",
+                                         params={"question": question, "user_id": uid}) as r:
+                    r.raise_for_status()
+                    async for line in r.aiter_lines():
+                        if ttft is None and line == "event: token":
+                            ttft = time.perf_counter() - start
+                        if line == "event: error":
+                            raise RuntimeError("stream error event")
+                return ttft
+
+            async def recommend(_):
+                r = await client.post("/api/recommend", json={"user_id": uid, "top_k": 3})
+                r.raise_for_status()
+
+            for endpoint, call in zip(ENDPOINTS, (ask, ask_stream, recommend)):
+                await timed(records, endpoint, call)
+                await asyncio.sleep(rng.expovariate(1 / think) if think > 0 else 0)
+
+
+async def run_level(base_url: str, sessions: list[dict], concurrency: int,
+                    duration: float, think: float) -> dict:
+    """Run *concurrency* virtual users for *duration* seconds and summarise."""
+    records: list[dict] = []
+    limits = httpx.Limits(max_connections=concurrency * 2)
+    async with httpx.AsyncClient(base_url=base_url, timeout=120, limits=limits) as client:
+        start = time.perf_counter()
+        await asyncio.gather(*(virtual_user(vu, client, sessions, think, start + duration, records)
+                               for vu in range(concurrency)))
+        elapsed = time.perf_counter() - start
+    return summarise(records, concurrency, elapsed)
+
+
+def stub_stats(stub_url: str | None) -> dict:
+    """Upstream call counters of :mod:`stub_openai` (empty without a stub)."""
+    if not stub_url:
+        return {}
+    return httpx.get(f"{stub_url}/stats", timeout=5).json()
+
+
+def _pct(values) -> dict:
+    if not values:
+        return {"p50": None, "p95": None, "p99": None}
+    p50, p95, p99 = np.percentile(values, [50, 95, 99])
+    return {"p50": float(p50), "p95": float(p95), "p99": float(p99)}
+
+
+def summarise(records: list[dict], concurrency: int, elapsed: float) -> dict:
+    """Throughput, error rate and latency/TTFT percentiles of one level."""
+    ok = [r for r in records if r["ok"]]
+    return {
+        "concurrency": concurrency,
+        "requests": len(records),
+        "throughput_rps": len(ok) / elapsed if elapsed else 0.0,
+        "error_rate": 1 - len(ok) / len(records) if records else 0.0,
+        "latency": {ep: _pct([r["latency"] for r in ok if r["endpoint"] == ep])
+                    for ep in ENDPOINTS},
+        "ttft": _pct([r["ttft"] for r in ok if r["ttft"] is not None]),
+    }
+
+
+# ---------- spawning ---------------------------------------------------------
+def _wait_ready(url: str, timeout: float = 300):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            httpx.get(url, timeout=2)
+            return
+        except httpx.HTTPError:
+            time.sleep(0.5)
+    raise SystemExit(f"{url} did not come up within {timeout}s")
+
+
+def spawn(app_port: int, stub_port: int, stub_args: list[str]) -> list[subprocess.Popen]:
+    """Start the OpenAI stub and the app (in a scratch cwd) as subprocesses."""
+    scratch = Path(tempfile.mkdtemp(prefix="loadtest-"))
+    (scratch / "docs").symlink_to(ROOT / "docs")
+    env = {**os.environ,
+           "OPENAI_API_KEY": "sk-stub",
+           "OPENAI_BASE_URL": f"http://127.0.0.1:{stub_port}/v1",
+           "OPENAI_API_BASE": f"http://127.0.0.1:{stub_port}/v1",
+           "PYTHONPATH": os.pathsep.join([str(ROOT / "src"), str(ROOT)])}
+    procs = [
+        subprocess.Popen([sys.executable, str(ROOT / "scripts/stub_openai.py"),
+                          "--port", str(stub_port), *stub_args], env=env),
+    ]
+    _wait_ready(f"http://127.0.0.1:{stub_port}/docs")
+    procs.append(subprocess.Popen([sys.executable, "-m", "uvicorn", "main:app",
+                                   "--port", str(app_port), "--log-level", "warning"],
+                                  cwd=scratch, env=env))
+    _wait_ready(f"http://127.0.0.1:{app_port}/")
+    return procs
+
+
+# ---------- report -----------------------------------------------------------
+def _svg_chart(title: str, xs: list, series: dict[str, list], unit: str) -> str:
+    """Tiny dependency-free SVG line chart."""
+    w, h, pad = 420, 240, 40
+    values = [v for vs in series.values() for v in vs if v is not None] or [1]
+    ymax = max(values) * 1.1 or 1
+    def px(i): return pad + i * (w - 2 * pad) / max(len(xs) - 1, 1)
+    def py(v): return h - pad - v / ymax * (h - 2 * pad)
+    colors = ["#1f77b4", "#ff7f0e", "#2ca02c", "#d62728"]
+    parts = [f'<svg width="{w}" height="{h}" xmlns="http://www.w3.org/2000/svg">',
+             f'<text x="{pad}" y="20" font-size="13">{title} ({unit}, max {ymax / 1.1:.3g})</text>',
+             f'<line x1="{pad}" y1="{h - pad}" x2="{w - pad}" y2="{h - pad}" stroke="#999"/>']
+    for i, x in enumerate(xs):
+        parts.append(f'<text x="{px(i)}" y="{h - pad + 15}" font-size="11">{x}</text>')
+    for (name, vs), color in zip(series.items(), colors):
+        pts = " ".join(f"{px(i)},{py(v)}" for i, v in enumerate(vs) if v is not None)
+        parts.append(f'<polyline fill="none" stroke="{color}" stroke-width="2" points="{pts}"/>')
+        parts.append(f'<text x="{w - pad}" y="{30 + 14 * list(series).index(name)}" '
+                     f'font-size="11" fill="{color}" text-anchor="end">{name}</text>')
+    return "".join(parts) + "</svg>"
+
+
+def write_report(levels: list[dict], out: Path):
+    """Write ``out.json`` and a self-contained ``out.html``."""
+    out.parent.mkdir(parents=True, exist_ok=True)
+    out.with_suffix(".json").write_text(json.dumps(levels, indent=2))
+
+    xs = [l["concurrency"] for l in levels]
+    rows = "".join(
+        f"<tr><td>{l['concurrency']}</td><td>{l['requests']}</td>"
+        f"<td>{l['throughput_rps']:.2f}</td><td>{100 * l['error_rate']:.1f}%</td>"
+        + "".join(f"<td>{l['latency'][ep]['p50'] or 0:.3f} / {l['latency'][ep]['p95'] or 0:.3f}"
+                  f" / {l['latency'][ep]['p99'] or 0:.3f}</td>" for ep in ENDPOINTS)
+        + f"<td>{l['ttft']['p50'] or 0:.3f} / {l['ttft']['p95'] or 0:.3f}</td>"
+        + f"<td>{l['upstream'].get('chat', 0)} / {l['upstream'].get('chat_stream', 0)}"
+          f" / {l['upstream'].get('embeddings', 0)}</td></tr>"
+        for l in levels)
+    charts = [
+        _svg_chart("Throughput", xs, {"req/s": [l["throughput_rps"] for l in levels]}, "req/s"),
+        _svg_chart("p95 latency", xs, {ep: [l["latency"][ep]["p95"] for l in levels]
+                                       for ep in ENDPOINTS}, "s"),
+        _svg_chart("TTFT", xs, {q: [l["ttft"][q] for l in levels] for q in ("p50", "p95", "p99")}, "s"),
+        _svg_chart("Error rate", xs, {"errors": [l["error_rate"] for l in levels]}, "ratio"),
+    ]
+    out.with_suffix(".html").write_text(f"""<!doctype html>
+<html><head><meta charset="utf-8"><title>Load test</title>
+<style>body{{font-family:system-ui,sans-serif;margin:2rem}}td,th{{padding:.3rem .6rem;border:1px solid #ddd}}table{{border-collapse:collapse}}</style>
+</head><body><h1>Load test report</h1>
+<table><tr><th>concurrency</th><th>requests</th><th>req/s</th><th>errors</th>
+{''.join(f'<th>{ep} p50/p95/p99 (s)</th>' for ep in ENDPOINTS)}<th>TTFT p50/p95 (s)</th><th>upstream chat / stream / embeddings</th></tr>
+{rows}</table>
+<div>{''.join(charts)}</div></body></html>""")
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--base-url", default="http://127.0.0.1:8000")
+    ap.add_argument("--spawn", action="store_true", help="start stub OpenAI + app locally")
+    ap.add_argument("--app-port", type=int, default=8765)
+    ap.add_argument("--stub-port", type=int, default=9010)
+    ap.add_argument("--stub-url", default=None,
+                    help="running stub_openai.py to read upstream call counts from")
+    ap.add_argument("--stub-args", nargs=argparse.REMAINDER, default=[],
+                    help="extra flags for stub_openai.py (must come last)")
+    ap.add_argument("--traffic", nargs="*", default=[], help="extra JSONL traffic files")
+    ap.add_argument("--levels", type=int, nargs="+", default=[1, 4, 16, 32])
+    ap.add_argument("--duration", type=float, default=30.0, help="seconds per level")
+    ap.add_argument("--think", type=float, default=1.0, help="mean think time (s)")
+    ap.add_argument("--out", default="dashboards/loadtest")
+    args = ap.parse_args()
+
+    sessions = load_sessions(args.traffic)
+    procs = []
+    base_url, stub_url = args.base_url, args.stub_url
+    if args.spawn:
+        procs = spawn(args.app_port, args.stub_port, args.stub_args)
+        base_url = f"http://127.0.0.1:{args.app_port}"
+        stub_url = f"http://127.0.0.1:{args.stub_port}"
+
+    try:
+        levels = []
+        for c in args.levels:
+            before = stub_stats(stub_url)
+            level = asyncio.run(run_level(base_url, sessions, c, args.duration, args.think))
+            after = stub_stats(stub_url)
+            level["upstream"] = {k: v - before.get(k, 0) for k, v in after.items()}
+            levels.append(level)
+            print(f"c={c:4d}  {level['throughput_rps']:7.2f} req/s  "
+                  f"errors {100 * level['error_rate']:5.1f}%  "
+                  f"ask p95 {level['latency']['ask']['p95'] or 0:.3f}s  "
+                  f"TTFT p95 {level['ttft']['p95'] or 0:.3f}s  "
+                  f"LLM calls {level['upstream'].get('chat', 0) + level['upstream'].get('chat_stream', 0)}")
+    finally:
+        for p in procs:
+            p.terminate()
+
+    write_report(levels, Path(args.out))
+    print(f"✅ Report: {args.out}.json / {args.out}.html")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+"""
+profiles_io
+===========
+
+Bulk import / export of recommender profiles
+(:py:meth:`RecommendationService.import_events` /
+:py:meth:`~RecommendationService.export_profiles`).
+
+Workflow
+--------
+* ``import FILE`` replays a JSONL stream of historical interactions,
+  one per line::
+
+      {"user_id": "u1", "query": "¿Cuánto cobra la plataforma?", "sources": ["docs/fees.md"]}
+
+  Queries are embedded in batches of ``--batch-size`` distinct texts,
+  ``--workers`` batches at a time; memory stays bounded by those two
+  numbers. Lines produced by ``export`` are accepted too and restore
+  the profile as-is (no embedding). ``-`` reads stdin.
+* ``export FILE`` streams every profile as JSONL (``-`` = stdout), e.g.
+  to migrate between hosts or codec settings.
+
+Stop the API (or the tenant) first: a running server keeps its own copy
+of the profiles and would overwrite the import on its next flush.
+
+Running
+-------
+>>> python scripts/profiles_io.py import history.jsonl --batch-size 2000
+>>> python scripts/profiles_io.py export - --tenant acme | gzip > acme.jsonl.gz
+"""
+import argparse
+import sys
+import time
+
+from app.deps import DEFAULT_TENANT, get_rec
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("command", choices=["import", "export"])
+    ap.add_argument("path", help="JSONL file, '-' for stdin / stdout")
+    ap.add_argument("--tenant", default=DEFAULT_TENANT)
+    ap.add_argument("--batch-size", type=int, default=1000)
+    ap.add_argument("--workers", type=int, default=4)
+    args = ap.parse_args()
+
+    rec = get_rec(args.tenant)
+    t0 = time.perf_counter()
+    if args.command == "import":
+        f = sys.stdin if args.path == "-" else open(args.path, encoding="utf-8")
+        with f:
+            stats = rec.import_events(f, batch_size=args.batch_size, workers=args.workers)
+        elapsed = time.perf_counter() - t0
+        print(f"{stats['events']} events ({stats['queries']} queries, "
+              f"{stats['embedded']} embedded) and {stats['profiles']} profile records "
+              f"in {elapsed:.1f} s ({stats['events'] / max(elapsed, 1e-9):.0f} events/s)"
+              + (f"; {stats['invalid']} invalid lines skipped" if stats["invalid"] else ""),
+              file=sys.stderr)
+    else:
+        f = sys.stdout if args.path == "-" else open(args.path, "w", encoding="utf-8")
+        with f:
+            n = rec.export_profiles(f)
+        print(f"{n} profiles exported in {time.perf_counter() - t0:.1f} s", file=sys.stderr)
+    rec.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+"""
+route_report
+============
+
+Accuracy and cost of the routing gate (:py:meth:`RAGService.route`).
+
+Workflow
+--------
+1. Route every question of ``tests/qa_eval.jsonl`` (in scope) and a
+   built-in list of off-scope questions (``--off-scope FILE`` for your
+   own, one per line).
+2. Report false rejections / false acceptances for a sweep of
+   ``route_threshold`` values, so the threshold can be tuned.
+3. For ``--gate`` (default: the configured ``ROUTE_THRESHOLD``, else
+   0.25) report the reject latency (keyword vs embedding path), what a
+   rejected question cost *without* the gate (mood detection +
+   embedding + vector search) and the share of the collection that
+   narrowed retrieval still searches.
+
+The embedding API is called once per question (cached afterwards); no
+LLM call is made.
+
+Running
+-------
+>>> python scripts/route_report.py --thresholds 0.15 0.2 0.25 0.3 0.35
+"""
+import argparse
+import time
+
+import numpy as np
+
+from eval_runner import load_jsonl, latency_summary
+from app.deps import get_rag
+
+OFF_SCOPE = [
+    "Escríbeme un poema sobre el mar",
+    "¿Qué tiempo hará mañana en Madrid?",
+    "Dame una receta de paella",
+    "¿Quién ganó el mundial de 2010?",
+    "Explícame la teoría de la relatividad",
+    "¿Cuál es la capital de Australia?",
+    "Cuéntame un chiste de programadores",
+    "Hazme una página web con javascript",
+    "¿Cómo cambio el aceite de mi coche?",
+    "Recomiéndame una película de terror",
+]
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--dataset", default="tests/qa_eval.jsonl")
+    ap.add_argument("--off-scope", help="file with one off-scope question per line")
+    ap.add_argument("--thresholds", type=float, nargs="+",
+                    default=[0.15, 0.2, 0.25, 0.3, 0.35])
+    ap.add_argument("--gate", type=float, help="threshold for the latency / narrowing report")
+    args = ap.parse_args()
+
+    rag = get_rag()
+    in_scope = [ex["user_input"] for ex in load_jsonl(args.dataset)]
+    off_scope = OFF_SCOPE
+    if args.off_scope:
+        with open(args.off_scope, encoding="utf-8") as f:
+            off_scope = [line.strip() for line in f if line.strip()]
+    for q in in_scope + off_scope:
+        rag._embed(q)                                       # fill the query cache
+
+    print(f"{'threshold':>9s} {'false rejects':>14s} {'false accepts':>14s}")
+    configured = rag.route_threshold
+    for threshold in args.thresholds:
+        rag.route_threshold = threshold
+        fr = sum(not rag.route(q).in_scope for q in in_scope)
+        fa = sum(rag.route(q).in_scope for q in off_scope)
+        print(f"{threshold:9.2f} {fr:6d} / {len(in_scope):<6d} {fa:6d} / {len(off_scope):<6d}")
+    rag.route_threshold = gate = args.gate or configured or 0.25
+
+    reject_ms, ungated_ms = {"keyword": [], "embedding": []}, []
+    for q in off_scope:
+        t0 = time.perf_counter()
+        verdict = rag.route(q)
+        if verdict.in_scope:
+            continue
+        reject_ms[verdict.reason].append((time.perf_counter() - t0) * 1000)
+
+        t0 = time.perf_counter()                            # what the gate saved
+        rag._update_mood("route-report", q)
+        rag.vectordb.similarity_search_by_vector_with_relevance_scores(rag._embed(q), k=1)
+        ungated_ms.append((time.perf_counter() - t0) * 1000)
+
+    print(f"\nReject latency at threshold {gate:.2f} (embedding cached):")
+    for reason, values in reject_ms.items():
+        if values:
+            lat = latency_summary(values)
+            print(f"  {reason:9s} n={len(values):3d}  p50 {lat['p50']:.3f} ms  p95 {lat['p95']:.3f} ms")
+    if ungated_ms:
+        print(f"  without gate (mood + search): mean {np.mean(ungated_ms):.1f} ms per rejected question")
+
+    rag.metrics["retrieval_docs_searched"] = rag.metrics["retrieval_docs_total"] = 0
+    for q in in_scope:
+        rag._topic_filter(rag._embed(q))
+    searched, total = rag.metrics["retrieval_docs_searched"], rag.metrics["retrieval_docs_total"]
+    print(f"\nNarrowed retrieval searches {searched / max(1, total):.0%} of the collection "
+          f"on average ({len(rag._kb.topics[0])} topics).")
+    rag.route_threshold = configured
+
+
+if __name__ == "__main__":
+    main()
@@ -8,20 +8,34 @@ Workflow
 --------
 1. Load the JSONL dataset in ``tests/qa_eval.jsonl`` into a
    :class:`ragas.EvaluationDataset`.
-2. For every sample:
-   - Invoke the **RAG** chain once (no streaming).
-   - Record per-query latency, generated answer and retrieved contexts.
+2. Replay every sample **concurrently** (bounded by ``--concurrency``):
+   - Invoke the **RAG** chain once (no streaming), each sample with its
+     own empty conversation memory. Calls go through the service's LLM
+     scheduler as *batch* work, so a shared deployment keeps priority
+     for interactive users.
+   - Record per-query latency (``perf_counter``), prompt tokens,
+     generated answer and retrieved contexts in
+     ``dashboards/ragas_eval_results.jsonl``.
+     Samples already stored there are skipped, so an interrupted run
+     resumes instead of starting over (``--fresh`` to discard).
 3. Compute the RAGAS metrics
    * *response_relevancy*
    * *faithfulness*
-   * *context_precision*.
-4. Print aggregated scores and latency statistics.
-5. Build a three-panel dashboard and save it to
+   * *context_precision*
+   and store them in ``dashboards/ragas_eval_scores.json``.
+4. Print aggregated scores and latency percentiles.
+5. Build a three-panel dashboard from the stored results and save it to
    ``dashboards/ragas_eval_dashboard.png``.
 
 Running
 -------
->>> python scripts/run_ragas_eval.py
+>>> python scripts/run_ragas_eval.py [--concurrency 8] [--fresh]
+>>> python scripts/run_ragas_eval.py --dashboard-only
+
+``--context-budget N`` overrides the context-compression budget of the
+service (``0`` disables compression); results, scores and dashboard of
+such runs get a ``_budgetN`` suffix so that prompt tokens, latency and
+faithfulness can be compared side by side.
 
 Requirements
 ------------
@@ -35,100 +49,156 @@ The script is self-contained and **does not mutate** the shared Chroma
 collection; it reuses the singleton :class:`~app.services.rag.RAGService`
 from :pymod:`app.deps`.
 """
-
-from ragas import evaluate, EvaluationDataset
-from ragas.metrics import ResponseRelevancy, Faithfulness, ContextPrecision
-from app.deps import get_rag
-import pandas as pd
+import argparse
+import asyncio
 import time
+from pathlib import Path
+
 import matplotlib.pyplot as plt
 import numpy as np
-from pathlib import Path
+import pandas as pd
 
-dataset = EvaluationDataset.from_jsonl("tests/qa_eval.jsonl")
-
-rag = get_rag()
-chain = rag._get_chain("eval")
-
-total_latency = 0
-total_queries = 0
-latencies = []
-inputs = []
-
-# Procesar dataset
-for s in dataset:
-    start_time = time.time()
-    
-    out = chain.invoke({
-        "question": s.user_input,
-        "style": "profesional",
-        "emoji": "🙂",
-    })
-    
-    elapsed = time.time() - start_time
-    total_latency += elapsed
-    total_queries += 1
-
-    # Guardar latencia individual e input
-    latencies.append(elapsed)
-    inputs.append(s.user_input[:50])  # Recorta el input para que el gráfico no sea ilegible
-
-    s.response = out["answer"]
-    s.retrieved_contexts = [d.page_content for d in out["source_documents"]]
-
-# Evaluación RAGAS
-result = evaluate(
-    dataset,
-    metrics=[ResponseRelevancy(), Faithfulness(), ContextPrecision()],
-)
-
-df = result.to_pandas()
-
-# Mostrar métricas numéricas
-print("\n=== RAGAS scores ===")
-for metric in ['response_relevancy', 'faithfulness', 'context_precision']:
-    if metric in df.columns:
-        score = df[metric].mean()
-        print(f"{metric:22s}: {score:.3f}")
+from eval_runner import ResultStore, load_jsonl, replay, latency_summary, print_latency
+
+DATASET      = "tests/qa_eval.jsonl"
+OUTPUT_DIR   = Path("dashboards")
+METRICS      = ["response_relevancy", "faithfulness", "context_precision"]
+
+
+def output_paths(suffix: str) -> tuple[Path, Path, Path]:
+    """Results, scores and dashboard paths for one run variant."""
+    return (OUTPUT_DIR / f"ragas_eval_results{suffix}.jsonl",
+            OUTPUT_DIR / f"ragas_eval_scores{suffix}.json",
+            OUTPUT_DIR / f"ragas_eval_dashboard{suffix}.png")
+
+
+def run_samples(examples: list[dict], concurrency: int, fresh: bool,
+                results_path: Path, context_budget: int | None = None) -> list[dict]:
+    """Replay every sample through the RAG chain, resuming from stored results."""
+    from langchain_community.callbacks import get_openai_callback
+    from app.deps import get_rag
+    from app.services.scheduler import Priority
+    rag = get_rag()
+    if context_budget is not None:
+        rag.context_budget = context_budget or None
+
+    async def worker(idx, example):
+        chain = rag._get_chain(f"eval-{idx}")        # isolated memory per sample
+        start = time.perf_counter()
+        async with rag.scheduler.aslot(Priority.BATCH,
+                                       rag._estimate_tokens(example["user_input"])):
+            with get_openai_callback() as usage:
+                out = await chain.ainvoke({
+                    "question": example["user_input"],
+                    "style": "profesional",
+                    "emoji": "🙂",
+                })
+        return {
+            "user_input": example["user_input"],
+            "latency": time.perf_counter() - start,
+            "prompt_tokens": usage.prompt_tokens,
+            "response": out["answer"],
+            "retrieved_contexts": [d.page_content for d in out["source_documents"]],
+        }
+
+    store = ResultStore(results_path, fresh=fresh)
+    return asyncio.run(replay(examples, worker, store, concurrency))
+
+
+def score(examples: list[dict], results: list[dict], scores_path: Path) -> pd.DataFrame:
+    """Run the RAGAS metrics over the stored answers and persist the scores."""
+    from ragas import evaluate, EvaluationDataset
+    from ragas.metrics import ResponseRelevancy, Faithfulness, ContextPrecision
+
+    dataset = EvaluationDataset.from_list([
+        {**ex, "response": r["response"], "retrieved_contexts": r["retrieved_contexts"]}
+        for ex, r in zip(examples, results)
+    ])
+    result = evaluate(
+        dataset,
+        metrics=[ResponseRelevancy(), Faithfulness(), ContextPrecision()],
+    )
+    df = result.to_pandas()
+    df.to_json(scores_path, orient="records", force_ascii=False)
+    return df
+
+
+def build_dashboard(results: list[dict], df: pd.DataFrame, output_path: Path) -> Path:
+    """Three-panel dashboard (latency percentiles, RAGAS scores, latency per input)."""
+    latencies = [r["latency"] for r in results]
+    inputs    = [r["user_input"][:50] for r in results]  # recorta para que sea legible
+    lat       = latency_summary(latencies)
+
+    fig, axs = plt.subplots(1, 3, figsize=(18, 4))
+
+    # 1. Latencia: media y percentiles
+    axs[0].bar(["mean", "p50", "p95", "p99"],
+               [lat["mean"], lat["p50"], lat["p95"], lat["p99"]], color='blue')
+    axs[0].set_title('Latency per Query')
+    axs[0].set_ylabel('Seconds')
+
+    # 2. Distribución de métricas RAGAS
+    metrics = ['faithfulness', 'context_precision']
+    data = [df[m].mean() if m in df.columns else 0 for m in metrics]
+
+    axs[1].bar(metrics, data, color=['green', 'orange', 'purple'])
+    axs[1].set_ylim(0, 1)
+    axs[1].set_title('Average RAGAS Scores')
+    axs[1].set_ylabel('Score (0-1)')
+
+    # 3. Latencia por input
+    axs[2].bar(range(len(latencies)), latencies, color='red')
+    axs[2].set_title('Latency per Input')
+    axs[2].set_xlabel('Query Index')
+    axs[2].set_ylabel('Latency (s)')
+    axs[2].set_xticks(range(len(inputs)))
+    axs[2].set_xticklabels(inputs, rotation=90, fontsize=7)
+
+    plt.tight_layout()
+    plt.savefig(output_path, dpi=150)
+    return output_path
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--concurrency", type=int, default=8)
+    ap.add_argument("--fresh", action="store_true", help="ignore stored results")
+    ap.add_argument("--dashboard-only", action="store_true",
+                    help="rebuild the dashboard from stored results and scores")
+    ap.add_argument("--context-budget", type=int, default=None,
+                    help="override the context-compression token budget (0 = off)")
+    args = ap.parse_args()
+
+    suffix = "" if args.context_budget is None else f"_budget{args.context_budget}"
+    results_path, scores_path, dashboard_path = output_paths(suffix)
+
+    examples = load_jsonl(DATASET)
+    if args.dashboard_only:
+        results = ResultStore(results_path).ordered(examples)
+        df = pd.read_json(scores_path)
     else:
-        print(f"{metric:22s}: Metric not found in the results.")
-
-# Mostrar latencia
-print("\n=== Latency Metrics ===")
-print(f"Total queries: {total_queries}")
-print(f"Total time (s): {total_latency:.2f}")
-print(f"Average latency per query (s): {total_latency / total_queries:.3f}")
-
-# ---- Dashboard visual ----
-fig, axs = plt.subplots(1, 3, figsize=(18, 4))
-
-# 1. Latencia promedio
-axs[0].bar(['Avg Latency per Query'], [total_latency / total_queries], color='blue')
-axs[0].set_title('Average Latency per Query')
-axs[0].set_ylabel('Seconds')
-
-# 2. Distribución de métricas RAGAS
-metrics = ['faithfulness', 'context_precision']
-data = [df[m].mean() if m in df.columns else 0 for m in metrics]
-
-axs[1].bar(metrics, data, color=['green', 'orange', 'purple'])
-axs[1].set_ylim(0, 1)
-axs[1].set_title('Average RAGAS Scores')
-axs[1].set_ylabel('Score (0-1)')
-
-# 3. Latencia por input
-axs[2].bar(range(len(latencies)), latencies, color='red')
-axs[2].set_title('Latency per Input')
-axs[2].set_xlabel('Query Index')
-axs[2].set_ylabel('Latency (s)')
-axs[2].set_xticks(range(len(inputs)))
-axs[2].set_xticklabels(inputs, rotation=90, fontsize=7)
-
-plt.tight_layout()
-output_dir = Path("dashboards")
-output_dir.mkdir(parents=True, exist_ok=True)
-output_path = output_dir / "ragas_eval_dashboard.png"
-plt.savefig(output_path, dpi=150)
-print(f"✅ Dashboard guardado en: {output_path}")
-
-plt.show()
\ No newline at end of file
+        results = run_samples(examples, args.concurrency, args.fresh,
+                              results_path, args.context_budget)
+        df = score(examples, results, scores_path)
+
+    # Mostrar métricas numéricas
+    print("\n=== RAGAS scores ===")
+    for metric in METRICS:
+        if metric in df.columns:
+            print(f"{metric:22s}: {df[metric].mean():.3f}")
+        else:
+            print(f"{metric:22s}: Metric not found in the results.")
+
+    print_latency("RAG", [r["latency"] for r in results])
+    prompt_tokens = [r["prompt_tokens"] for r in results if "prompt_tokens" in r]
+    if prompt_tokens:
+        print(f"Prompt tokens per query: mean {np.mean(prompt_tokens):.0f}   "
+              f"total {sum(prompt_tokens)}")
+
+    output_path = build_dashboard(results, df, dashboard_path)
+    print(f"✅ Dashboard guardado en: {output_path}")
+    plt.show()
+
+
+if __name__ == "__main__":
+    main()
@@ -8,19 +8,29 @@ Workflow
 --------
 1. Replay synthetic user histories from ``tests/profile_eval.jsonl``:
    every prior query is sent to RAG and logged into the recommender.
+   Users are replayed **concurrently** (``--concurrency``) while each
+   user's own history stays strictly ordered. Answers run at
+   ``Priority.BATCH``, behind live traffic; a user whose answer was
+   rejected as busy is not stored and is retried on the next run.
 2. Submit the **current** user question, again logging sources & query.
 3. Ask the recommender for *k=3* unseen suggestions.
-4. Collect latency for both RAG and recommender layers.
+4. Collect ``perf_counter`` latency for both RAG and recommender layers
+   and store every finished user in
+   ``dashboards/recommender_eval_results.jsonl`` (re-runs resume from
+   there; ``--fresh`` to discard). Profiles are logged into a scratch
+   recommender store, never into the service's ``.profiles.json``, so a
+   user interrupted half-way is replayed from an empty profile.
 5. Compute Precision@k against the expected document set.
 6. Save a three-panel dashboard to
    ``dashboards/recommender_eval_dashboard.png`` showing:
-      • average latency per component  
-      • Precision@k distribution  
+      • latency percentiles per component
+      • Precision@k distribution
       • call volume (RAG vs recommender).
 
 Running
 -------
->>> python scripts/run_ragas_eval_profiles.py
+>>> python scripts/run_ragas_eval_profiles.py [--concurrency 8] [--fresh]
+>>> python scripts/run_ragas_eval_profiles.py --dashboard-only
 
 Output
 ------
@@ -32,73 +42,70 @@ Environment
 Requires the same ``OPENAI_API_KEY`` and runtime dependencies as the
 main RAG service.
 """
-
-
-from app.deps import get_rag, get_rec
-import pandas as pd
-import json
-from pathlib import Path
+import argparse
+import asyncio
+import tempfile
 import time
+from pathlib import Path
+
 import matplotlib.pyplot as plt
 import numpy as np
+import pandas as pd
 
-total_rag_latency = 0
-total_rec_latency = 0
-total_rag_queries = 0
-total_rec_calls = 0
-
-examples = []
-with open("tests/profile_eval.jsonl", encoding="utf-8") as f:
-    for line in f:
-        examples.append(json.loads(line))
-
-rag = get_rag()
-rec = get_rec()
-
-dataset_rows = []
-
-for idx, example in enumerate(examples):
-    uid = f"user_{idx}"
-
-    # Historial previo
-    for prev_query in example["history"]:
-        start_time = time.time()
-        answer, sources = rag.ask(prev_query, uid=uid)
-        elapsed = time.time() - start_time
-
-        total_rag_latency += elapsed
-        total_rag_queries += 1
-
+from eval_runner import ResultStore, load_jsonl, replay, latency_summary, print_latency
+
+DATASET      = "tests/profile_eval.jsonl"
+OUTPUT_DIR   = Path("dashboards")
+RESULTS_PATH = OUTPUT_DIR / "recommender_eval_results.jsonl"
+
+
+def run_users(examples: list[dict], concurrency: int, fresh: bool) -> list[dict]:
+    """Replay every synthetic user (history in order), resuming from stored results."""
+    from app.deps import get_rag, get_rec
+    from app.services.rag import BUSY_REPLY
+    from app.services.recommender import RecommendationService
+    from app.services.scheduler import Priority
+    rag = get_rag()
+    scratch = Path(tempfile.mkdtemp(prefix="profiles-eval-")) / "profiles.json"
+    rec = RecommendationService(rag.vectordb, persist_path=str(scratch),
+                                kb_version=rag.kb_version, codec=get_rec().codec,
+                                provider=rag.provider)
+
+    def timed_ask(query: str, uid: str):
+        start = time.perf_counter()
+        answer, sources = rag.ask(query, uid=uid, priority=Priority.BATCH)
+        elapsed = time.perf_counter() - start
+        if answer == BUSY_REPLY:                    # never store a rejected answer
+            raise RuntimeError("LLM scheduler rejected the call")
         rec.log_sources(uid, sources)
-        rec.log_query(uid, prev_query)
-
-    # User input (también cuenta para latencia)
-    start_time = time.time()
-    answer, sources = rag.ask(example["user_input"], uid=uid)
-    elapsed = time.time() - start_time
-
-    total_rag_latency += elapsed
-    total_rag_queries += 1
-
-    rec.log_sources(uid, sources)
-    rec.log_query(uid, example["user_input"])
-
-    # Recommender timing
-    start_time = time.time()
-    recommendations = rec.recommend(uid, k=3)
-    elapsed = time.time() - start_time
-
-    total_rec_latency += elapsed
-    total_rec_calls += 1
-
-    retrieved_contexts = [r["title"].lower() for r in recommendations]
-
-    dataset_rows.append({
-        "user_input": example["user_input"],
-        "reference": example["reference"],
-        "retrieved_contexts": retrieved_contexts,
-        "expected_sources": example["expected_sources"],
-    })
+        rec.log_query(uid, query)
+        return elapsed
+
+    def timed_recommend(uid: str):
+        start = time.perf_counter()
+        recommendations = rec.recommend(uid, k=3, fresh=True)
+        return time.perf_counter() - start, recommendations
+
+    async def worker(idx, example):
+        uid = f"user_{idx}"
+        rag._chains.pop(uid, None)                   # no conversation from a failed attempt
+        rag_latencies = []
+        # Historial previo + user input, en orden
+        for query in [*example["history"], example["user_input"]]:
+            rag_latencies.append(await asyncio.to_thread(timed_ask, query, uid))
+
+        rec_latency, recommendations = await asyncio.to_thread(timed_recommend, uid)
+        return {
+            "user_input": example["user_input"],
+            "reference": example["reference"],
+            "retrieved_contexts": [r["title"].lower() for r in recommendations],
+            "expected_sources": example["expected_sources"],
+            "rag_latencies": rag_latencies,
+            "rec_latency": rec_latency,
+        }
+
+    store = ResultStore(RESULTS_PATH, fresh=fresh)
+    return asyncio.run(replay(examples, worker, store, concurrency))
 
 
 def precision_at_k(row):
@@ -119,51 +126,71 @@ def precision_at_k(row):
     hits = sum(1 for doc in row["retrieved_contexts"] if doc in row["expected_sources"])
     return hits / len(row["retrieved_contexts"]) if row["retrieved_contexts"] else 0
 
-df = pd.DataFrame(dataset_rows)
-df["precision_at_k"] = df.apply(precision_at_k, axis=1)
-
-print("\n=== Recommender Title-level Precision@k ===")
-print(df["precision_at_k"].mean())
-
-print("\n=== Latency and Call Metrics ===")
-print(f"Total RAG queries: {total_rag_queries}")
-print(f"Total RAG time (s): {total_rag_latency:.2f}")
-print(f"Average RAG latency per query (s): {total_rag_latency / total_rag_queries:.3f}")
-
-print(f"Total recommender calls: {total_rec_calls}")
-print(f"Total Recommender time (s): {total_rec_latency:.2f}")
-print(f"Average recommender latency (s): {total_rec_latency / total_rec_calls:.3f}")
-
-# ---- Dashboard gráfico ----
-fig, axs = plt.subplots(1, 3, figsize=(15, 4))
-
-# 1. Latencia promedio
-labels = ['RAG avg latency (s)', 'Recommender avg latency (s)']
-latencies = [
-    total_rag_latency / total_rag_queries if total_rag_queries else 0,
-    total_rec_latency / total_rec_calls if total_rec_calls else 0
-]
-axs[0].bar(labels, latencies, color=['blue', 'orange'])
-axs[0].set_title('Average Latency')
-axs[0].set_ylabel('Seconds')
-
-# 2. Distribución Precision@k
-axs[1].hist(df["precision_at_k"], bins=np.linspace(0, 1, 5), edgecolor="black")
-axs[1].set_title('Precision@k Distribution')
-axs[1].set_xlabel('Precision@k')
-axs[1].set_ylabel('Number of examples')
-
-# 3. Número de llamadas
-counts = [total_rag_queries, total_rec_calls]
-axs[2].bar(['RAG queries', 'Rec calls'], counts, color=['green', 'purple'])
-axs[2].set_title('Call Volume')
-
-plt.tight_layout()
-
-output_dir = Path("dashboards")
-output_dir.mkdir(parents=True, exist_ok=True)
-
-output_path = output_dir / "recommender_eval_dashboard.png"
-plt.savefig(output_path, dpi=150)
-print(f"✅ Dashboard guardado en: {output_path}")
-plt.show()
\ No newline at end of file
+
+def build_dashboard(df: pd.DataFrame, rag_latencies, rec_latencies) -> Path:
+    """Three-panel dashboard (latency percentiles, Precision@k, call volume)."""
+    fig, axs = plt.subplots(1, 3, figsize=(15, 4))
+
+    # 1. Latencia: media y percentiles por componente
+    stats = ["mean", "p50", "p95", "p99"]
+    rag_lat, rec_lat = latency_summary(rag_latencies), latency_summary(rec_latencies)
+    x = np.arange(len(stats))
+    axs[0].bar(x - 0.2, [rag_lat[s] for s in stats], 0.4, label='RAG', color='blue')
+    axs[0].bar(x + 0.2, [rec_lat[s] for s in stats], 0.4, label='Recommender', color='orange')
+    axs[0].set_xticks(x)
+    axs[0].set_xticklabels(stats)
+    axs[0].set_title('Latency')
+    axs[0].set_ylabel('Seconds')
+    axs[0].legend()
+
+    # 2. Distribución Precision@k
+    axs[1].hist(df["precision_at_k"], bins=np.linspace(0, 1, 5), edgecolor="black")
+    axs[1].set_title('Precision@k Distribution')
+    axs[1].set_xlabel('Precision@k')
+    axs[1].set_ylabel('Number of examples')
+
+    # 3. Número de llamadas
+    counts = [len(rag_latencies), len(rec_latencies)]
+    axs[2].bar(['RAG queries', 'Rec calls'], counts, color=['green', 'purple'])
+    axs[2].set_title('Call Volume')
+
+    plt.tight_layout()
+    output_dir = OUTPUT_DIR
+    output_dir.mkdir(parents=True, exist_ok=True)
+    output_path = output_dir / "recommender_eval_dashboard.png"
+    plt.savefig(output_path, dpi=150)
+    return output_path
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--concurrency", type=int, default=8)
+    ap.add_argument("--fresh", action="store_true", help="ignore stored results")
+    ap.add_argument("--dashboard-only", action="store_true",
+                    help="rebuild the dashboard from stored results")
+    args = ap.parse_args()
+
+    examples = load_jsonl(DATASET)
+    if args.dashboard_only:
+        results = ResultStore(RESULTS_PATH).ordered(examples)
+    else:
+        results = run_users(examples, args.concurrency, args.fresh)
+
+    df = pd.DataFrame(results)
+    df["precision_at_k"] = df.apply(precision_at_k, axis=1)
+
+    print("\n=== Recommender Title-level Precision@k ===")
+    print(df["precision_at_k"].mean())
+
+    rag_latencies = [lat for r in results for lat in r["rag_latencies"]]
+    rec_latencies = [r["rec_latency"] for r in results]
+    print_latency("RAG", rag_latencies)
+    print_latency("Recommender", rec_latencies)
+
+    output_path = build_dashboard(df, rag_latencies, rec_latencies)
+    print(f"✅ Dashboard guardado en: {output_path}")
+    plt.show()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,149 @@
+"""
+stub_openai
+===========
+
+Minimal OpenAI-compatible server for load tests and benchmarks.
+
+Endpoints
+---------
+POST /v1/embeddings
+    Deterministic hashed bag-of-words unit vectors: texts sharing words
+    (or token ids, when the SDK sends tokenised input) get a higher
+    cosine, so retrieval ranks documents by content. A constant shared
+    component puts unrelated texts at cosine ``--emb-baseline`` (0.7),
+    which keeps questions above the app's similarity guard (τ = 0.15)
+    and topic gate, so answers actually reach the chat endpoint.
+    Supports both float and ``base64`` encodings as used by the
+    ``openai`` SDK.
+
+POST /v1/chat/completions
+    Canned Spanish answer, either as one JSON body or, with
+    ``"stream": true``, as SSE chunks after ``--ttft`` seconds and at
+    ``--tps`` tokens per second.
+
+GET /stats
+    Calls per endpoint so far (``embeddings``, ``embedding_inputs``,
+    ``chat``, ``chat_stream``); :mod:`loadtest` reports them per level.
+
+Point the app at it with ``OPENAI_BASE_URL=http://127.0.0.1:9010/v1``
+(any ``OPENAI_API_KEY`` value is accepted).
+
+Running
+-------
+>>> python scripts/stub_openai.py --port 9010 --ttft 0.3 --tps 50
+"""
+import argparse
+import asyncio
+import base64
+import hashlib
+import json
+import re
+import time
+import uuid
+from collections import Counter
+
+import numpy as np
+from fastapi import FastAPI, Request
+from fastapi.responses import StreamingResponse
+
+ANSWER = ("Según la documentación de ClaraAI, la plataforma cobra una tarifa del 10 % "
+          "sobre cada hito, el pago se retiene en escrow hasta la entrega y puedes abrir "
+          "una disputa durante los 14 días siguientes si algo no encaja.")
+
+
+def create_stub(dim: int = 1536, ttft: float = 0.3, tps: float = 50.0,
+                emb_latency: float = 0.05, emb_baseline: float = 0.7) -> FastAPI:
+    """Build the stub app with the given latency profile."""
+    app = FastAPI(title="OpenAI stub")
+    tokens = [w + " " for w in ANSWER.split()]
+    calls = Counter()
+    shared = np.sqrt(emb_baseline / (1 - emb_baseline))   # cos(unrelated) = emb_baseline
+
+    def embed(item) -> np.ndarray:
+        words = re.findall(r"\w+", item.lower()) if isinstance(item, str) else item
+        vec = np.zeros(dim, np.float32)
+        for w in words:
+            h = int.from_bytes(hashlib.sha1(str(w).encode()).digest()[:8], "little")
+            vec[1 + h % (dim - 1)] += 1.0
+        norm = np.linalg.norm(vec)
+        if norm:
+            vec /= norm
+        vec[0] = shared
+        return vec / np.linalg.norm(vec)
+
+    @app.post("/v1/embeddings")
+    async def embeddings(request: Request):
+        body = await request.json()
+        inputs = body["input"]
+        # str | list[str] | list[int] (one tokenised text) | list[list[int]]
+        if isinstance(inputs, str) or (inputs and isinstance(inputs[0], int)):
+            inputs = [inputs]
+        calls["embeddings"] += 1
+        calls["embedding_inputs"] += len(inputs)
+        await asyncio.sleep(emb_latency)
+        data = []
+        for i, item in enumerate(inputs):
+            vec = embed(item)
+            emb = (base64.b64encode(vec.tobytes()).decode()
+                   if body.get("encoding_format") == "base64" else vec.tolist())
+            data.append({"object": "embedding", "index": i, "embedding": emb})
+        return {"object": "list", "data": data, "model": body.get("model", "stub"),
+                "usage": {"prompt_tokens": len(inputs), "total_tokens": len(inputs)}}
+
+    @app.post("/v1/chat/completions")
+    async def chat(request: Request):
+        body = await request.json()
+        cid, created, model = f"chatcmpl-{uuid.uuid4().hex}", int(time.time()), body.get("model", "stub")
+        usage = {"prompt_tokens": 500, "completion_tokens": len(tokens),
+                 "total_tokens": 500 + len(tokens)}
+
+        calls["chat_stream" if body.get("stream") else "chat"] += 1
+        if not body.get("stream"):
+            await asyncio.sleep(ttft + len(tokens) / tps)
+            return {"id": cid, "object": "chat.completion", "created": created, "model": model,
+                    "choices": [{"index": 0, "finish_reason": "stop",
+                                 "message": {"role": "assistant", "content": ANSWER}}],
+                    "usage": usage}
+
+        def chunk(delta: dict, finish=None) -> str:
+            payload = {"id": cid, "object": "chat.completion.chunk", "created": created,
+                       "model": model,
+                       "choices": [{"index": 0, "delta": delta, "finish_reason": finish}]}
+            return f"data: {json.dumps(payload)}\n\n"
+
+        async def stream():
+            await asyncio.sleep(ttft)
+            yield chunk({"role": "assistant", "content": ""})
+            for tok in tokens:
+                yield chunk({"content": tok})
+                await asyncio.sleep(1 / tps)
+            yield chunk({}, "stop")
+            yield "data: [DONE]\n\n"
+
+        return StreamingResponse(stream(), media_type="text/event-stream")
+
+    @app.get("/stats")
+    async def stats():
+        return dict(calls)
+
+    return app
+
+
+def main():
+    import uvicorn
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--port", type=int, default=9010)
+    ap.add_argument("--dim", type=int, default=1536)
+    ap.add_argument("--ttft", type=float, default=0.3, help="seconds before the first token")
+    ap.add_argument("--tps", type=float, default=50.0, help="streamed tokens per second")
+    ap.add_argument("--emb-latency", type=float, default=0.05)
+    ap.add_argument("--emb-baseline", type=float, default=0.7,
+                    help="cosine between embeddings of unrelated texts (0 ≤ x < 1)")
+    args = ap.parse_args()
+    uvicorn.run(create_stub(args.dim, args.ttft, args.tps, args.emb_latency, args.emb_baseline),
+                host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -10,6 +10,8 @@ Features
 - Mounts static files under `/static`.
 - Serves `index.html` at `/`.
 - Includes all v1 API routes under `/api/v1`.
+- Wraps every request in :class:`~app.profiling.ProfilingMiddleware`
+  (slow-request log, opt-in sampling profiler).
 
 Exports
 -------
@@ -21,6 +23,8 @@ from fastapi.responses import FileResponse
 from fastapi.staticfiles import StaticFiles     
 from pathlib import Path
 from .api.v1.routes import router as api_router
+from .deps import get_profiler
+from .profiling import ProfilingMiddleware
 
 def create_app() -> FastAPI:
     """
@@ -33,6 +37,7 @@ def create_app() -> FastAPI:
     """
     app = FastAPI(title="Shakers RAG Demo")
     app.include_router(api_router, prefix="/api")
+    app.add_middleware(ProfilingMiddleware, profiler=get_profiler())
 
     # localiza la carpeta donde está index.html
     static_dir = Path(__file__).resolve().parent / "static"
@@ -14,14 +14,41 @@ GET /api/v1/ask_stream
 
 POST /api/v1/recommend
     Return top-k unseen document recommendations.
+
+POST /api/v1/ask_recommend
+    Answer + sources + recommendations from one embedding and one search.
+
+GET /api/v1/ask_recommend_stream
+    Streaming variant of ``/ask_recommend`` (SSE).
+
+GET /api/v1/metrics
+    Operational counters of the running services and loaded tenants.
+
+GET / POST /api/v1/admin/profile
+    Inspect / arm the on-demand request profiler. Admin endpoints need
+    ``X-Admin-Token: $ADMIN_TOKEN`` and answer 404 when it is unset.
+
+POST /api/v1/admin/reindex
+    Re-embed changed knowledge-base files in the background.
+
+Every endpoint accepts an optional ``tenant`` query parameter selecting
+the knowledge base (and the recommender profiles) to use; unknown
+tenants get a 404.
 """
-from fastapi import APIRouter, Depends
-from ...services.rag import RAGService
+from fastapi import APIRouter, BackgroundTasks, Depends, Header, HTTPException, Request
+from ...services.rag import BUSY_REPLY, OFF_SCOPE_REPLY, RAGService
 from ...services.recommender import RecommendationService
-from ...deps import get_rag, get_rec      # ← import the real functions
+from ...services.tenants import TenantRegistry
+from ...services.scheduler import LLMScheduler
+from ...services.provider import OpenAIProvider
+from ...deps import get_rag, get_rec, get_profiler, get_provider, get_scheduler, get_tenants      # ← import the real functions
+from ...profiling import Profiler, stage, tag
+from .sse import encode_sse
 from pydantic import BaseModel
 from fastapi import APIRouter, Depends
 from fastapi.responses import StreamingResponse
+from starlette.concurrency import run_in_threadpool
+import asyncio
 
 router = APIRouter()
 
@@ -33,6 +60,15 @@ class RecReq(BaseModel):
     user_id: str = "anonymous"
     top_k: int = 3
 
+class AskRecReq(AskReq):
+    top_k: int = 3
+
+class ProfileReq(BaseModel):
+    requests: int = 0
+    fraction: float | None = None
+
+CONTEXT_K = 3                                     # hits used as answer context
+
 """ @router.post("/ask")
 def ask(
     req: AskReq,
@@ -47,26 +83,47 @@ def ask(
 def ask(req: AskReq,
         rag: RAGService         = Depends(get_rag),
         rec: RecommendationService = Depends(get_rec)):
-    answer, sources = rag.ask(req.question, req.user_id)
-    rec.log_sources(req.user_id, sources)             # keep as-is
-    rec.log_query  (req.user_id, req.question)        # 🆕
+    tag(req.user_id)
+    with stage("rag.ask"):
+        answer, sources = rag.ask(req.question, req.user_id)
+    if answer in (BUSY_REPLY, OFF_SCOPE_REPLY):          # shed / rejected: no profile update
+        return {"answer": answer, "sources": sources}
+    with stage("rec.log"):
+        rec.log_sources(req.user_id, sources)             # keep as-is
+        rec.log_query  (req.user_id, req.question)        # 🆕
     return {"answer": answer, "sources": sources}
 
 @router.get("/ask_stream")
-async def ask_stream(question: str,
+async def ask_stream(request: Request,
+                     question: str,
                      user_id: str = "anonymous",
                      rag: RAGService = Depends(get_rag)):
     """
     Serve Q&A token stream as an SSE (Server-Sent Event) stream.
 
+    Tokens are coalesced into ``token`` frames and followed by
+    ``sources`` and ``done`` events (see :py:mod:`.sse`). If the client
+    closes the ``EventSource`` the underlying generation is cancelled
+    instead of running to completion.
+
     Returns
     -------
     StreamingResponse
         Text/event-stream compatible generator.
     """
+    return _sse_response(request, rag.ask_stream(question, user_id), rag)
+
+def _sse_response(request: Request, events, rag: RAGService) -> StreamingResponse:
+    """Wrap typed *events* in an SSE response that stops them on client disconnect."""
     async def event_generator():
-        async for chunk in rag.ask_stream(question, user_id):
-             yield f"data: {chunk}\n\n"
+        frames = encode_sse(events, stats=rag.metrics)
+        try:
+            async for frame in frames:
+                if await request.is_disconnected():
+                    break
+                yield frame
+        finally:
+            await frames.aclose()             # cancels the LLM task if still running
     return StreamingResponse(event_generator(),
                               media_type="text/event-stream")
 
@@ -76,11 +133,160 @@ def recommend(req: RecReq,
     """
     Provide 2-3 unseen document recommendations personalized for the user.
 
+    Served from the user's materialised list, which is refreshed in the
+    background whenever ``/ask`` updates the profile.
+
     Returns
     -------
     dict
         Contains:
         - 'recommendations': list of recommendation dicts
     """
-    rec.log_query(req.user_id, "(recommend call)")
+    tag(req.user_id)
     return {"recommendations": rec.recommend(req.user_id, req.top_k)}
+
+
+@router.post("/ask_recommend")
+async def ask_recommend(req: AskRecReq,
+                        rag: RAGService = Depends(get_rag),
+                        rec: RecommendationService = Depends(get_rec)):
+    """
+    Answer a question and recommend follow-up reading in one call.
+
+    The question is routed first (off-scope questions cost no search).
+    It is then embedded once and one vector search is run; its top hits
+    are the answer context, the rest are recommendation candidates.
+    Recommendations are computed while the LLM is generating; only the
+    sources the answer actually cites are logged as read.
+
+    Returns
+    -------
+    dict
+        ``answer``, ``sources`` and ``recommendations``.
+    """
+    tag(req.user_id)
+    verdict = await run_in_threadpool(rag.route_for, req.question, req.user_id)
+    if not verdict.in_scope:
+        return {"answer": OFF_SCOPE_REPLY, "sources": [],
+                "recommendations": await run_in_threadpool(rec.recommend, req.user_id, req.top_k)}
+    qvec, hits = await run_in_threadpool(rag.retrieve, req.question,
+                                         CONTEXT_K + rec.cache_k)
+    context = hits[:CONTEXT_K]
+    (answer, sources), recs = await asyncio.gather(
+        run_in_threadpool(rag.ask, req.question, req.user_id, hits=context, verdict=verdict),
+        run_in_threadpool(rec.recommend_with_hits, req.user_id, qvec, [],
+                          [d.metadata["source"] for d, _ in hits], req.top_k,
+                          exclude=[d.metadata["source"] for d, _ in context]),
+    )
+    if sources:
+        await run_in_threadpool(rec.log_sources, req.user_id, sources)
+    return {"answer": answer, "sources": sources, "recommendations": recs}
+
+@router.get("/ask_recommend_stream")
+async def ask_recommend_stream(request: Request,
+                               question: str,
+                               user_id: str = "anonymous",
+                               top_k: int = 3,
+                               rag: RAGService = Depends(get_rag),
+                               rec: RecommendationService = Depends(get_rec)):
+    """
+    Streaming variant of ``/ask_recommend``.
+
+    Emits the usual ``token`` / ``sources`` events followed by one
+    ``recommendations`` event (JSON list) before ``done``.
+    """
+    async def events():
+        verdict = await run_in_threadpool(rag.route_for, question, user_id)
+        if not verdict.in_scope:
+            yield "token", OFF_SCOPE_REPLY
+            yield "recommendations", await run_in_threadpool(rec.recommend, user_id, top_k)
+            return
+        qvec, hits = await run_in_threadpool(rag.retrieve, question,
+                                             CONTEXT_K + rec.cache_k)
+        context = hits[:CONTEXT_K]
+        recs = asyncio.ensure_future(run_in_threadpool(
+            rec.recommend_with_hits, user_id, qvec, [],
+            [d.metadata["source"] for d, _ in hits], top_k,
+            exclude=[d.metadata["source"] for d, _ in context]))
+        stream = rag.ask_stream(question, user_id, hits=context, verdict=verdict)
+        try:
+            async for event, data in stream:
+                if event == "sources":
+                    await run_in_threadpool(rec.log_sources, user_id, data)
+                yield event, data
+            yield "recommendations", await recs
+        finally:
+            recs.cancel()                             # client gone: don't leave it orphaned
+            await stream.aclose()
+    return _sse_response(request, events(), rag)
+
+@router.get("/metrics")
+def metrics(rag: RAGService = Depends(get_rag),
+            rec: RecommendationService = Depends(get_rec),
+            tenants: TenantRegistry = Depends(get_tenants),
+            llm: LLMScheduler = Depends(get_scheduler),
+            openai: OpenAIProvider = Depends(get_provider)):
+    """
+    Expose service counters (aborted streams, SSE frames, …) for monitoring.
+
+    ``sse_frames / sse_streams`` gives the average frames per answer.
+
+    Returns
+    -------
+    dict
+        ``{"rag": {...}, "rec": {...}}`` mapping counter name to value
+        for the requested tenant, plus ``"tenants"``: resident tenants,
+        their estimated memory and load / eviction counters, and
+        ``"llm"``: scheduler queue depth, calls in flight, mean queue
+        wait and admitted / rejected counts per priority class, and
+        ``"openai"``: connection reuse rate and embedding batching /
+        throughput of the shared client pool.
+    """
+    return {"rag": dict(rag.metrics), "rec": dict(rec.metrics),
+            "tenants": tenants.status(), "llm": llm.status(),
+            "openai": openai.status()}
+
+def _admin(profiler: Profiler = Depends(get_profiler),
+           x_admin_token: str | None = Header(None)):
+    """Require ``X-Admin-Token``; without a configured ``ADMIN_TOKEN`` admin routes do not exist."""
+    if profiler.token is None:
+        raise HTTPException(status_code=404, detail="Not Found")
+    if not profiler.authorized(x_admin_token):
+        raise HTTPException(status_code=403, detail="invalid admin token")
+
+@router.get("/admin/profile", dependencies=[Depends(_admin)])
+def profile_status(profiler: Profiler = Depends(get_profiler)):
+    """Current profiler settings and the number of requests still to profile."""
+    return profiler.status()
+
+@router.post("/admin/profile", dependencies=[Depends(_admin)])
+def profile_arm(req: ProfileReq,
+                profiler: Profiler = Depends(get_profiler)):
+    """
+    Profile the next ``requests`` requests and/or a random ``fraction``
+    of all requests (``0`` switches sampling off).
+
+    Profiles are written to the profiler's ``out_dir`` as folded stacks
+    plus a JSON summary (see :py:mod:`app.profiling`).
+    """
+    profiler.arm(req.requests, req.fraction)
+    return profiler.status()
+
+@router.post("/admin/reindex", status_code=202, dependencies=[Depends(_admin)])
+def reindex(background: BackgroundTasks,
+            rag: RAGService = Depends(get_rag),
+            rec: RecommendationService = Depends(get_rec)):   # hooked into reload
+    """
+    Reload the knowledge base after the response is sent.
+
+    Only changed files are re-embedded and the new index is swapped in
+    atomically (see :py:meth:`RAGService.reload`); conversations and
+    profiles are kept. ``GET /metrics`` reports ``kb_reloads``.
+
+    Returns
+    -------
+    dict
+        The KB version currently served.
+    """
+    background.add_task(rag.reload)
+    return {"kb_version": rag.kb_version, "scheduled": True}
@@ -0,0 +1,137 @@
+# src/app/api/v1/sse.py
+"""
+sse
+===
+
+Server-Sent Events encoder for the streaming Q&A endpoint.
+
+The RAG service yields ``(event, data)`` tuples; this module turns them
+into well-formed SSE frames:
+
+* ``token``   – answer text. Consecutive tokens are **coalesced** into a
+  single frame until ``max_bytes`` characters are buffered or
+  ``max_delay`` seconds have passed since the first buffered token.
+* ``sources`` – JSON list of source files used for the answer.
+* ``error``   – generic message if the upstream stream fails; the
+  exception itself is only logged (``app.sse`` logger).
+* ``done``    – always the last frame of a stream.
+
+Multi-line payloads are split into several ``data:`` lines as required
+by the SSE spec, so embedded newlines never break the framing.  Idle
+connections receive a ``: ping`` comment every ``heartbeat`` seconds.
+"""
+from contextlib import suppress
+from collections import Counter
+import asyncio
+import json
+import logging
+
+log = logging.getLogger("app.sse")
+
+ERROR_MESSAGE = "Lo siento, ha ocurrido un error al generar la respuesta."
+
+_END = object()
+
+
+def format_event(event: str, data: str = "") -> str:
+    """Encode one SSE frame, one ``data:`` line per payload line."""
+    lines = "".join(f"data: {line}\n" for line in data.split("\n"))
+    return f"event: {event}\n{lines}\n"
+
+
+async def encode_sse(events,
+                     max_bytes: int = 512,
+                     max_delay: float = 0.05,
+                     heartbeat: float = 15.0,
+                     stats: Counter | None = None):
+    """
+    Turn an async iterator of ``(event, data)`` tuples into SSE frames.
+
+    Parameters
+    ----------
+    events : AsyncIterator[tuple[str, object]]
+        Upstream stream, e.g. :py:meth:`RAGService.ask_stream`.
+    max_bytes : int, default 512
+        Flush the token buffer once it holds this many characters.
+    max_delay : float, default 0.05
+        Flush the token buffer at most this many seconds after the
+        first buffered token.
+    heartbeat : float, default 15.0
+        Idle seconds before a ``: ping`` comment is sent.
+    stats : collections.Counter, optional
+        Receives ``sse_streams``, ``sse_frames``, ``sse_tokens`` and
+        ``sse_errors``.
+
+    Yields
+    ------
+    str
+        Complete SSE frames (terminated by a blank line).
+    """
+    stats = stats if stats is not None else Counter()
+    loop = asyncio.get_running_loop()
+    frames: asyncio.Queue = asyncio.Queue()
+    buf, buf_len = [], 0
+    flush_timer = heartbeat_timer = None
+
+    # Coalescing happens on the producer side with plain timer handles so
+    # that buffering a token costs a list append, not a task or a wakeup.
+    def ping():
+        nonlocal heartbeat_timer
+        frames.put_nowait(": ping\n\n")
+        heartbeat_timer = loop.call_later(heartbeat, ping)
+
+    def emit(frame: str):
+        nonlocal heartbeat_timer
+        stats["sse_frames"] += 1
+        frames.put_nowait(frame)
+        heartbeat_timer.cancel()
+        heartbeat_timer = loop.call_later(heartbeat, ping)
+
+    def flush():
+        nonlocal buf, buf_len, flush_timer
+        if flush_timer is not None:
+            flush_timer.cancel()
+            flush_timer = None
+        if buf:
+            emit(format_event("token", "".join(buf)))
+            buf, buf_len = [], 0
+
+    async def pump():
+        nonlocal buf_len, flush_timer
+        try:
+            async for event, data in events:
+                if event == "token":
+                    buf.append(data)
+                    buf_len += len(data)
+                    stats["sse_tokens"] += 1
+                    if buf_len >= max_bytes:
+                        flush()
+                    elif flush_timer is None:
+                        flush_timer = loop.call_later(max_delay, flush)
+                    continue
+                flush()
+                emit(format_event(event, data if isinstance(data, str) else json.dumps(data)))
+        except Exception:                        # details stay in the server log
+            log.exception("SSE stream failed")
+            stats["sse_errors"] += 1
+            flush()
+            emit(format_event("error", ERROR_MESSAGE))
+        flush()
+        emit(format_event("done"))
+        frames.put_nowait(_END)
+
+    stats["sse_streams"] += 1
+    heartbeat_timer = loop.call_later(heartbeat, ping)
+    pump_task = asyncio.create_task(pump())
+    try:
+        while (frame := await frames.get()) is not _END:
+            yield frame
+    finally:
+        heartbeat_timer.cancel()
+        if flush_timer is not None:
+            flush_timer.cancel()
+        pump_task.cancel()
+        with suppress(asyncio.CancelledError):
+            await pump_task
+        if hasattr(events, "aclose"):
+            await events.aclose()
@@ -3,28 +3,138 @@
 deps
 ====
 
-Singleton dependency providers for FastAPI routes.
+Dependency providers for FastAPI routes.
 
 Provides:
-- One persistent :class:`RAGService` instance.
-- One persistent :class:`RecommendationService` instance sharing
-  the same vector store.
+- Per-tenant :class:`RAGService` / :class:`RecommendationService`
+  pairs, loaded lazily from a :class:`~app.services.tenants.TenantRegistry`.
+  The tenant is chosen with the ``tenant`` query parameter (default
+  ``"default"``, served from ``docs/``). With ``TENANTS_DIR`` set,
+  every sub-folder ``TENANTS_DIR/<name>`` is a tenant knowledge base;
+  ``TENANTS_MAX_LOADED`` (default 8) and ``TENANTS_MAX_MB`` bound how
+  many stay resident.
+- The recommender shares its tenant's vector store (and follows it
+  across KB reloads); profiles live in ``.profiles.json`` for the
+  default tenant and ``.profiles.<tenant>.json`` otherwise. Setting
+  ``REC_VECTOR_DTYPE`` (``float16`` / ``int8``) and optionally
+  ``REC_VECTOR_DIM`` / ``REC_VECTOR_METHOD`` (``truncate`` / ``pca``;
+  PCA needs ``REC_VECTOR_DIM``) enables compact vector storage.
+- One :class:`~app.profiling.Profiler` configured from the environment.
+- One :class:`~app.services.scheduler.LLMScheduler` shared by every
+  tenant: ``LLM_MAX_CONCURRENCY`` (default 8), ``LLM_RPM`` /
+  ``LLM_TPM`` (unlimited) and ``LLM_MAX_WAIT`` (seconds an interactive
+  call may queue, default 5).
+- One :class:`~app.services.provider.OpenAIProvider` behind every
+  OpenAI client: ``OPENAI_BASE_URL`` (e.g. the benchmark stub),
+  ``OPENAI_TIMEOUT`` (seconds, default 30), ``OPENAI_MAX_RETRIES``
+  (default 3), ``OPENAI_MAX_CONNECTIONS`` (default 64) and
+  ``OPENAI_EMBED_WINDOW_MS`` (query batching window, default 5).
+
+``KB_WATCH_INTERVAL`` (seconds) makes every loaded tenant poll its
+folder and hot-reload changed files. ``ROUTE_THRESHOLD`` (a cosine
+calibrated with ``scripts/route_report.py``) turns on the embedding
+off-scope gate and topic-narrowed retrieval; unset, only the keyword
+gate runs.
 
 Usage
 -----
-Functions here are injected via ``Depends()`` at runtime.
+Functions here are injected via ``Depends()`` at runtime; scripts call
+``get_rag()`` / ``get_rec()`` directly for the default tenant.
 """
 from functools import lru_cache
+from pathlib import Path
+import os
+import re
+from dotenv import load_dotenv
+from fastapi import HTTPException
 from .services.rag import RAGService
 from .services.recommender import RecommendationService
+from .services.compact import VectorCodec
+from .services.tenants import Tenant, TenantRegistry
+from .services.scheduler import LLMScheduler, Priority
+from .services.provider import OpenAIProvider
+from .profiling import Profiler
+
+DEFAULT_TENANT = "default"
+_TENANT_NAME = re.compile(r"[A-Za-z0-9_-]{1,64}")
+
+def get_rag(tenant: str = DEFAULT_TENANT) -> RAGService:
+    """RAG service of *tenant* (loaded on first use)."""
+    return _tenant(tenant).rag
+
+def get_rec(tenant: str = DEFAULT_TENANT) -> RecommendationService:
+    """Recommendation service of *tenant* (shares the tenant's vectordb)."""
+    return _tenant(tenant).rec
 
-@lru_cache            
-def get_rag() -> RAGService:
-    """Singleton provider for the RAG service instance."""
-    return RAGService()
+@lru_cache
+def get_tenants() -> TenantRegistry:
+    """Singleton registry of loaded tenants."""
+    max_mb = os.getenv("TENANTS_MAX_MB")
+    return TenantRegistry(_load_tenant,
+                          max_loaded=int(os.getenv("TENANTS_MAX_LOADED", 8)),
+                          max_bytes=int(float(max_mb) * 2**20) if max_mb else None)
+
+@lru_cache
+def get_profiler() -> Profiler:
+    """Singleton request profiler (see :py:mod:`app.profiling`)."""
+    return Profiler.from_env()
 
 @lru_cache
-def get_rec() -> RecommendationService:
-    """Singleton provider for the recommendation service instance (shares RAG's vectordb)."""
-    rag = get_rag()
-    return RecommendationService(rag.vectordb)
+def get_scheduler() -> LLMScheduler:
+    """Singleton admission control for upstream LLM calls."""
+    rpm, tpm = os.getenv("LLM_RPM"), os.getenv("LLM_TPM")
+    return LLMScheduler(max_concurrency=int(os.getenv("LLM_MAX_CONCURRENCY", 8)),
+                        rpm=float(rpm) if rpm else None,
+                        tpm=float(tpm) if tpm else None,
+                        max_wait={Priority.INTERACTIVE: float(os.getenv("LLM_MAX_WAIT", 5))})
+
+@lru_cache
+def get_provider() -> OpenAIProvider:
+    """Singleton OpenAI client layer (one connection pool for every service)."""
+    load_dotenv()
+    return OpenAIProvider(base_url=os.getenv("OPENAI_BASE_URL"),
+                          timeout=float(os.getenv("OPENAI_TIMEOUT", 30)),
+                          max_retries=int(os.getenv("OPENAI_MAX_RETRIES", 3)),
+                          max_connections=int(os.getenv("OPENAI_MAX_CONNECTIONS", 64)),
+                          embed_window=float(os.getenv("OPENAI_EMBED_WINDOW_MS", 5)) / 1000)
+
+def _tenant(name: str) -> Tenant:
+    try:
+        return get_tenants().get(name)
+    except LookupError:
+        raise HTTPException(status_code=404, detail=f"unknown tenant {name!r}")
+
+def _tenant_docs(name: str) -> Path:
+    """Knowledge-base folder of tenant *name*; :class:`LookupError` if there is none."""
+    root = os.getenv("TENANTS_DIR")
+    if root and _TENANT_NAME.fullmatch(name) and (Path(root) / name).is_dir():
+        return Path(root) / name
+    if name == DEFAULT_TENANT:
+        return Path("docs")
+    raise LookupError(name)
+
+def _load_tenant(name: str) -> Tenant:
+    """Build the services of one tenant (registry factory)."""
+    docs_path = _tenant_docs(name)
+    suffix = "" if name == DEFAULT_TENANT else f".{name}"
+    route_threshold = os.getenv("ROUTE_THRESHOLD")
+    rag = RAGService(str(docs_path), collection_name=f"kb-{name}",
+                     scheduler=get_scheduler(), provider=get_provider(),
+                     route_threshold=float(route_threshold) if route_threshold else None)
+    rec = RecommendationService(rag.vectordb, persist_path=f".profiles{suffix}.json",
+                                kb_version=rag.kb_version, codec=_rec_codec(),
+                                provider=rag.provider)
+    rag.on_reload.append(rec.swap_kb)
+    interval = float(os.getenv("KB_WATCH_INTERVAL", 0))
+    if interval > 0:
+        rag.watch(interval)
+    return Tenant(name, rag, rec)
+
+def _rec_codec() -> VectorCodec | None:
+    """Compact vector settings from the environment (``None`` = full precision)."""
+    dtype = os.getenv("REC_VECTOR_DTYPE")
+    if not dtype:
+        return None
+    dim = os.getenv("REC_VECTOR_DIM")
+    return VectorCodec(int(dim) if dim else None, dtype,
+                       os.getenv("REC_VECTOR_METHOD", "truncate"))
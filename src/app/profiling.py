@@ -0,0 +1,263 @@
+# src/app/profiling.py
+"""
+profiling
+=========
+
+Opt-in request profiling and an always-on slow-request log.
+
+Stage timings
+    ``with stage("retrieve"): ...`` adds the wall time of the block to
+    the trace of the current request (a context variable, so it follows
+    the request into thread-pool workers). Outside a request it is a
+    no-op. Stages may nest (``chain`` contains ``retrieve`` and
+    ``llm``); the remainder of ``chain`` is LangChain overhead.
+
+Slow-request log
+    Every request slower than ``slow_ms`` is logged on the
+    ``app.slow`` logger with its per-stage timings.
+
+Sampling profiler
+    Requests selected by the ``X-Profile`` header, by a budget armed
+    through ``POST /api/v1/admin/profile`` or by a random fraction are
+    sampled: a background thread records the stacks of the threads
+    working for that request every ``interval`` seconds. The samples are
+    written in collapsed ("folded") format, ready for ``flamegraph.pl``
+    or speedscope, to ``<out_dir>/<time>-<route>-<uidhash>.folded``
+    together with a ``.json`` summary (stages, duration, sample count).
+
+Environment
+-----------
+``SLOW_REQUEST_MS`` (default 1500), ``PROFILE_DIR`` (``profiles``),
+``PROFILE_FRACTION`` (0), ``PROFILE_INTERVAL_MS`` (5) and
+``ADMIN_TOKEN`` (required as ``X-Admin-Token`` by the admin endpoints
+and as the value of ``X-Profile``; unset, both are disabled).
+"""
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from pathlib import Path
+from urllib.parse import parse_qs
+import hashlib
+import json
+import logging
+import os
+import random
+import secrets
+import sys
+import threading
+import time
+
+from langchain_core.callbacks import BaseCallbackHandler
+
+log = logging.getLogger("app.slow")
+
+
+class Trace:
+    """Per-request record of stage timings and the threads that worked on it."""
+    __slots__ = ("route", "uid", "start", "stages", "threads")
+
+    def __init__(self, route: str, uid: str = ""):
+        self.route, self.uid = route, uid
+        self.start   = time.perf_counter()
+        self.stages  = defaultdict(float)
+        self.threads = Counter({threading.get_ident(): 1})   # ident → open stages
+
+
+_trace: ContextVar[Trace | None] = ContextVar("trace", default=None)
+
+
+@contextmanager
+def stage(name: str):
+    """Time the enclosed block as stage *name* of the current request."""
+    trace = _trace.get()
+    if trace is None:
+        yield
+        return
+    ident = threading.get_ident()
+    trace.threads[ident] += 1
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        trace.stages[name] += time.perf_counter() - t0
+        trace.threads[ident] -= 1
+
+
+def tag(user_id: str):
+    """Attach the user of the current request (for the profile file name)."""
+    trace = _trace.get()
+    if trace is not None:
+        trace.uid = user_id
+
+
+class LLMStageCallback(BaseCallbackHandler):
+    """LangChain callback that records model calls as the ``llm`` stage."""
+    run_inline = True
+
+    def __init__(self):
+        self._start: dict = {}
+
+    def on_llm_start(self, serialized, prompts, *, run_id, **kwargs):
+        self._start[run_id] = time.perf_counter()
+
+    def on_chat_model_start(self, serialized, messages, *, run_id, **kwargs):
+        self._start[run_id] = time.perf_counter()
+
+    def on_llm_end(self, response, *, run_id, **kwargs):
+        self._record(run_id)
+
+    def on_llm_error(self, error, *, run_id, **kwargs):
+        self._record(run_id)
+
+    def _record(self, run_id):
+        t0, trace = self._start.pop(run_id, None), _trace.get()
+        if t0 is not None and trace is not None:
+            trace.stages["llm"] += time.perf_counter() - t0
+
+
+class _Sampler(threading.Thread):
+    """Background thread collecting folded stacks of the threads of one trace."""
+    def __init__(self, trace: Trace, interval: float):
+        super().__init__(name="profiler-sampler", daemon=True)
+        self.trace, self.interval = trace, interval
+        self.loop_ident = threading.get_ident()      # request's own (event loop) thread
+        self.stacks = Counter()
+        self._halt = threading.Event()
+
+    def run(self):
+        while not self._halt.wait(self.interval):
+            frames = sys._current_frames()
+            for ident, open_stages in list(self.trace.threads.items()):
+                if (open_stages > 0 or ident == self.loop_ident) and ident in frames:
+                    self.stacks[self._fold(frames[ident])] += 1
+
+    @staticmethod
+    def _fold(frame) -> str:
+        names = []
+        while frame is not None:
+            code = frame.f_code
+            names.append(f"{code.co_name} ({Path(code.co_filename).name}:{code.co_firstlineno})")
+            frame = frame.f_back
+        return ";".join(reversed(names))
+
+    def stop(self) -> Counter:
+        self._halt.set()
+        self.join()
+        return self.stacks
+
+
+class Profiler:
+    """
+    Request selection, sampling and slow-request logging.
+
+    Parameters
+    ----------
+    out_dir : str, default ``"profiles"``
+        Where profile files are written.
+    slow_ms : float, default 1500
+        Requests slower than this are logged with their stage timings.
+    fraction : float, default 0
+        Probability of profiling any request.
+    interval : float, default 0.005
+        Sampling period in seconds.
+    token : str, optional
+        Required value of the ``X-Profile`` header and of the admin
+        endpoints' ``X-Admin-Token``; ``None`` disables both.
+    """
+    def __init__(self, out_dir: str = "profiles", slow_ms: float = 1500,
+                 fraction: float = 0.0, interval: float = 0.005,
+                 token: str | None = None):
+        self.out_dir  = Path(out_dir)
+        self.slow_ms  = slow_ms
+        self.fraction = fraction
+        self.interval = interval
+        self.token    = token
+        self.remaining = 0
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls) -> "Profiler":
+        return cls(out_dir=os.getenv("PROFILE_DIR", "profiles"),
+                   slow_ms=float(os.getenv("SLOW_REQUEST_MS", 1500)),
+                   fraction=float(os.getenv("PROFILE_FRACTION", 0)),
+                   interval=float(os.getenv("PROFILE_INTERVAL_MS", 5)) / 1000,
+                   token=os.getenv("ADMIN_TOKEN") or None)
+
+    def arm(self, requests: int = 0, fraction: float | None = None):
+        """Profile the next *requests* requests and/or set the sampled *fraction*."""
+        with self._lock:
+            self.remaining = requests
+            if fraction is not None:
+                self.fraction = fraction
+
+    def status(self) -> dict:
+        return {"remaining": self.remaining, "fraction": self.fraction,
+                "slow_ms": self.slow_ms, "out_dir": str(self.out_dir)}
+
+    def authorized(self, value: str | None) -> bool:
+        """Whether *value* is the configured token (never when none is configured)."""
+        return (self.token is not None and value is not None
+                and secrets.compare_digest(value.encode(), self.token.encode()))
+
+    def _selected(self, headers: dict) -> bool:
+        if self.authorized(headers.get("x-profile")):
+            return True
+        if self.remaining:
+            with self._lock:
+                if self.remaining:
+                    self.remaining -= 1
+                    return True
+        return self.fraction > 0 and random.random() < self.fraction
+
+    def _write(self, trace: Trace, stacks: Counter, elapsed: float):
+        self.out_dir.mkdir(parents=True, exist_ok=True)
+        uid_hash = hashlib.sha1(trace.uid.encode()).hexdigest()[:10]
+        route = trace.route.strip("/").replace("/", "_") or "root"
+        now = time.time()
+        stem = f"{time.strftime('%Y%m%d-%H%M%S', time.localtime(now))}" \
+               f"{int(now % 1 * 1000):03d}-{route}-{uid_hash}"
+        (self.out_dir / f"{stem}.folded").write_text(
+            "".join(f"{s} {n}\n" for s, n in stacks.items()))
+        (self.out_dir / f"{stem}.json").write_text(json.dumps({
+            "route": trace.route, "uid_hash": uid_hash, "ms": elapsed * 1000,
+            "samples": sum(stacks.values()), "interval_ms": self.interval * 1000,
+            "stages_ms": {k: v * 1000 for k, v in trace.stages.items()},
+        }, indent=2))
+
+    def _finish(self, trace: Trace, sampler: _Sampler | None):
+        elapsed = time.perf_counter() - trace.start
+        if sampler is not None:
+            self._write(trace, sampler.stop(), elapsed)
+        if elapsed * 1000 >= self.slow_ms:
+            log.warning("slow request %s %.0f ms uid=%s stages=%s", trace.route,
+                        elapsed * 1000, trace.uid or "-",
+                        {k: round(v * 1000) for k, v in trace.stages.items()})
+
+
+class ProfilingMiddleware:
+    """
+    ASGI middleware opening a :class:`Trace` per HTTP request.
+
+    The trace ends when the last body chunk has been sent, so streamed
+    (SSE) responses are measured in full.
+    """
+    def __init__(self, app, profiler: Profiler):
+        self.app, self.profiler = app, profiler
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        query = parse_qs(scope.get("query_string", b"").decode("latin-1"))
+        trace = Trace(scope["path"], query.get("user_id", [""])[0])
+        token = _trace.set(trace)
+        headers = {k.decode("latin-1"): v.decode("latin-1") for k, v in scope["headers"]}
+        sampler = None
+        if self.profiler._selected(headers):
+            sampler = _Sampler(trace, self.profiler.interval)
+            sampler.start()
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            _trace.reset(token)
+            self.profiler._finish(trace, sampler)
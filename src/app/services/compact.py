@@ -0,0 +1,166 @@
+# src/app/services/compact.py
+"""
+compact
+=======
+
+Optional compact representation of embeddings for the recommender.
+
+A :class:`VectorCodec` reduces every embedding to ``dim`` components –
+either by **truncation** (valid for OpenAI ``text-embedding-3-*``
+models, whose leading dimensions carry most of the signal) or by a
+**PCA** projection fitted on the document matrix – re-normalises it and
+stores it as ``float16`` or ``int8`` codes with one float32 scale per
+vector. A PCA projection is part of the stored codes' meaning, so it is
+saved (:py:meth:`VectorCodec.save`) next to the profiles that use it.
+
+:class:`CompactVectors` is the resulting matrix. Indexing it returns
+de-quantised float32 rows, so code written for ``np.ndarray`` keeps
+working, while :func:`cosine_rows` scores many rows against one vector
+straight from the codes.
+"""
+import numpy as np
+
+_DTYPES = {"float32": np.float32, "float16": np.float16, "int8": np.int8}
+
+
+class VectorCodec:
+    """
+    Dimension reduction + quantisation settings.
+
+    Parameters
+    ----------
+    dim : int | None, default None
+        Target dimension (``None`` keeps the input dimension; required
+        for PCA).
+    dtype : {"float32", "float16", "int8"}, default ``"float16"``
+        Storage type of the codes.
+    method : {"truncate", "pca"}, default ``"truncate"``
+        How to reduce the dimension. PCA has to be :py:meth:`fit` (on at
+        least ``dim`` vectors) or :py:meth:`load` -ed first.
+    """
+    def __init__(self, dim: int | None = None, dtype: str = "float16",
+                 method: str = "truncate"):
+        if dtype not in _DTYPES:
+            raise ValueError(f"dtype must be one of {sorted(_DTYPES)}")
+        if method not in ("truncate", "pca"):
+            raise ValueError("method must be 'truncate' or 'pca'")
+        if method == "pca" and not dim:
+            raise ValueError("PCA needs an explicit dim")
+        self.dim, self.dtype, self.method = dim, dtype, method
+        self.mean = self.components = None
+
+    @property
+    def fitted(self) -> bool:
+        return self.method == "truncate" or self.components is not None
+
+    def fit(self, X: np.ndarray) -> "VectorCodec":
+        """Fit the PCA projection on *X* (no-op for truncation)."""
+        if self.method == "pca":
+            X = np.asarray(X, dtype=np.float32)
+            if min(X.shape) < self.dim:
+                raise ValueError(f"PCA to {self.dim} dims needs at least {self.dim} "
+                                 f"vectors of {self.dim}+ dims, got {X.shape}")
+            self.mean = X.mean(axis=0)
+            _, _, vt = np.linalg.svd(X - self.mean, full_matrices=False)
+            self.components = vt[: self.dim]
+        return self
+
+    def save(self, path):
+        """Write the fitted PCA projection to *path* (``.npz``)."""
+        with open(path, "wb") as f:
+            np.savez(f, mean=self.mean, components=self.components)
+
+    def load(self, path) -> "VectorCodec":
+        """Restore a projection written by :py:meth:`save`; its dimension must match."""
+        with np.load(path) as z:
+            mean, components = z["mean"], z["components"]
+        if len(components) != self.dim:
+            raise ValueError(f"{path} holds a {len(components)}-dim projection, not {self.dim}")
+        self.mean, self.components = mean, components
+        return self
+
+    def project(self, X) -> np.ndarray:
+        """Reduce and L2-normalise *X* (1-D or 2-D) to float32."""
+        X = np.atleast_2d(np.asarray(X, dtype=np.float32))
+        if self.method == "pca":
+            X = (X - self.mean) @ self.components.T
+        elif self.dim:
+            X = X[:, : self.dim]
+        norms = np.linalg.norm(X, axis=1, keepdims=True)
+        return X / np.where(norms == 0, 1, norms)
+
+    def encode(self, X) -> "CompactVectors":
+        """Project and quantise *X* into a :class:`CompactVectors` matrix."""
+        return CompactVectors(self, *self.quantise(self.project(X)))
+
+    def empty(self) -> "CompactVectors":
+        """An empty growable matrix using this codec."""
+        return CompactVectors(self, np.empty((0, 0), dtype=_DTYPES[self.dtype]),
+                              np.empty(0, dtype=np.float32))
+
+    def quantise(self, P: np.ndarray):
+        """Codes and per-row scales for already projected rows *P*."""
+        if self.dtype == "int8":
+            scales = np.abs(P).max(axis=1) / 127
+            scales[scales == 0] = 1
+            codes = np.round(P / scales[:, None]).astype(np.int8)
+            return codes, scales.astype(np.float32)
+        return P.astype(_DTYPES[self.dtype]), np.ones(len(P), dtype=np.float32)
+
+
+class CompactVectors:
+    """
+    Growable matrix of quantised vectors (codes + per-row scales).
+
+    ``vecs[i]`` / ``vecs[[i, j]]`` / ``vecs[:]`` return de-quantised
+    float32 rows; ``len`` and ``shape`` behave like an ``np.ndarray``.
+    """
+    def __init__(self, codec: VectorCodec, codes: np.ndarray, scales: np.ndarray):
+        self.codec, self.codes, self.scales = codec, codes, scales
+
+    def append(self, X):
+        """Project, quantise and append one vector or a stack of vectors."""
+        codes, scales = self.codec.quantise(self.codec.project(X))
+        if not len(self.codes):                   # first rows fix the width
+            self.codes, self.scales = codes, scales
+            return
+        self.codes  = np.concatenate([self.codes, codes])
+        self.scales = np.concatenate([self.scales, scales])
+
+    def __len__(self):
+        return len(self.codes)
+
+    @property
+    def shape(self):
+        return self.codes.shape
+
+    @property
+    def nbytes(self) -> int:
+        return self.codes.nbytes + self.scales.nbytes
+
+    def __getitem__(self, idx) -> np.ndarray:
+        scales = self.scales[idx]
+        if np.ndim(scales):
+            scales = scales[..., None]
+        return self.codes[idx].astype(np.float32) * scales
+
+
+def cosine_rows(vec, emb, idx) -> np.ndarray:
+    """
+    Cosine similarity between *vec* and rows *idx* of *emb*.
+
+    *emb* may be a plain ``np.ndarray`` or :class:`CompactVectors`; in
+    the latter case the dot products are taken on the codes and the
+    per-row scales are applied afterwards.
+    """
+    if isinstance(emb, CompactVectors):
+        vec    = np.asarray(vec, dtype=np.float32)
+        codes  = emb.codes[idx].astype(np.float32)
+        dots   = codes @ vec * emb.scales[idx]
+        norms  = np.linalg.norm(codes, axis=1) * emb.scales[idx]
+    else:
+        vec    = np.asarray(vec)
+        rows   = emb[idx]
+        dots   = rows @ vec
+        norms  = np.linalg.norm(rows, axis=1)
+    return dots / (norms * np.linalg.norm(vec))
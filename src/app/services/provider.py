@@ -0,0 +1,205 @@
+# src/app/services/provider.py
+"""
+provider
+========
+
+One shared client layer for the OpenAI API, used by every
+:class:`~app.services.rag.RAGService` and
+:class:`~app.services.recommender.RecommendationService` of the process.
+
+* A single keep-alive connection pool (HTTP/2 when ``h2`` is installed)
+  backs every LangChain client, blocking and async, instead of one
+  untuned pool per client.
+* Timeouts and retries are set once: the ``openai`` SDK retries
+  connection errors, 408/409/429 and 5xx with exponential backoff and
+  jitter, up to ``max_retries`` times.
+* :class:`BatchingEmbeddings` collects ``embed_query`` calls made within
+  ``embed_window`` seconds of each other into one ``embed_documents``
+  request.
+* ``base_url`` (``OPENAI_BASE_URL``) points everything at another
+  OpenAI-compatible server, e.g. ``scripts/stub_openai.py``.
+
+:py:meth:`OpenAIProvider.status` reports HTTP requests vs new
+connections (reuse rate) and embedding throughput.
+"""
+from collections import Counter
+from concurrent.futures import Future, wait
+import importlib.util
+import threading
+import time
+
+import httpx
+from langchain_core.embeddings import Embeddings
+from langchain_openai import ChatOpenAI, OpenAIEmbeddings
+
+
+class BatchingEmbeddings(Embeddings):
+    """
+    Embeddings wrapper that coalesces concurrent single-text calls.
+
+    The first ``embed_query`` of a window waits ``window`` seconds and
+    then sends every text queued meanwhile as one ``embed_documents``
+    request; a full batch (``max_batch``) is sent at once by the call
+    that filled it. ``embed_documents`` is passed through unchanged.
+
+    Parameters
+    ----------
+    inner : langchain_core.embeddings.Embeddings
+        Client that performs the requests.
+    window : float, default 0.005
+        Seconds to collect queries (0 only merges calls that overlap).
+    max_batch : int, default 256
+        Texts per coalesced request.
+    metrics : collections.Counter, optional
+        Shared counter for ``embed_*`` statistics.
+    """
+    def __init__(self, inner: Embeddings, window: float = 0.005, max_batch: int = 256,
+                 metrics: Counter | None = None):
+        self.inner, self.window, self.max_batch = inner, window, max_batch
+        self.metrics  = metrics if metrics is not None else Counter()
+        self._pending: list[tuple[str, Future]] = []
+        self._lock    = threading.Lock()
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        t0 = time.perf_counter()
+        vectors = self.inner.embed_documents(texts)
+        self.metrics["embed_requests"] += 1
+        self.metrics["embed_texts"] += len(texts)
+        self.metrics["embed_ms"] += int((time.perf_counter() - t0) * 1000)
+        return vectors
+
+    def embed_query(self, text: str) -> list[float]:
+        future = Future()
+        with self._lock:
+            self._pending.append((text, future))
+            leader = len(self._pending) == 1
+            batch  = self._take() if len(self._pending) >= self.max_batch else None
+        self.metrics["embed_queries"] += 1
+        if batch:
+            self._flush(batch)
+        elif leader:
+            wait([future], timeout=self.window)       # a full batch may have taken it
+            with self._lock:
+                batch = None if future.done() else self._take()
+            if batch:
+                self._flush(batch)
+        return future.result()
+
+    def _take(self) -> list[tuple[str, Future]]:
+        batch, self._pending = self._pending, []
+        return batch
+
+    def _flush(self, batch: list[tuple[str, Future]]):
+        """One request for the distinct texts of *batch*; every caller gets its row."""
+        texts = list(dict.fromkeys(text for text, _ in batch))
+        try:
+            rows = dict(zip(texts, self.embed_documents(texts)))
+        except BaseException as e:
+            for _, future in batch:
+                future.set_exception(e)
+            return
+        self.metrics["embed_coalesced"] += len(batch) - 1
+        for text, future in batch:
+            future.set_result(rows[text])
+
+
+class OpenAIProvider:
+    """
+    Factory for LangChain OpenAI clients sharing one connection pool.
+
+    Parameters
+    ----------
+    base_url : str, optional
+        API root (e.g. ``http://127.0.0.1:9010/v1``); ``None`` uses the
+        SDK default / ``OPENAI_BASE_URL``.
+    timeout : float, default 30
+        Read / write timeout per request in seconds (connect: 5 s).
+    max_retries : int, default 3
+        Retries with jittered exponential backoff per request.
+    max_connections : int, default 64
+        Pool size, shared by all clients (keep-alive: the same number).
+    embed_window : float, default 0.005
+        Batching window of :py:meth:`embeddings` (seconds).
+    embed_batch : int, default 256
+        Maximum texts per coalesced embedding request.
+
+    Attributes
+    ----------
+    metrics : collections.Counter
+        ``http_requests`` / ``http_connections`` and ``embed_*``
+        counters; see :py:meth:`status`.
+    """
+    def __init__(self, base_url: str | None = None, timeout: float = 30.0,
+                 max_retries: int = 3, max_connections: int = 64,
+                 embed_window: float = 0.005, embed_batch: int = 256):
+        self.base_url     = base_url
+        self.max_retries  = max_retries
+        self.embed_window = embed_window
+        self.embed_batch  = embed_batch
+        self.metrics      = Counter()
+        self.timeout      = httpx.Timeout(timeout, connect=5.0)
+        self.http2        = importlib.util.find_spec("h2") is not None
+        pool = dict(
+            timeout=self.timeout,
+            limits=httpx.Limits(max_connections=max_connections,
+                                max_keepalive_connections=max_connections,
+                                keepalive_expiry=60),
+            http2=self.http2,
+        )
+        self._http  = httpx.Client(event_hooks={"request": [self._on_request]}, **pool)
+        self._ahttp = httpx.AsyncClient(event_hooks={"request": [self._aon_request]}, **pool)
+        self._embeddings: dict[str, BatchingEmbeddings] = {}
+        self._lock = threading.Lock()
+
+    # ---------- public API -------------------------------------------------
+    def chat(self, model: str = "gpt-4.1-mini", **kwargs) -> ChatOpenAI:
+        """``ChatOpenAI`` on the shared pool (extra kwargs: temperature, streaming, callbacks…)."""
+        return ChatOpenAI(model_name=model, **self._client_kwargs(), **kwargs)
+
+    def embeddings(self, model: str = "text-embedding-3-small") -> BatchingEmbeddings:
+        """The process-wide batching embedder for *model*."""
+        with self._lock:
+            if model not in self._embeddings:
+                inner = OpenAIEmbeddings(model=model, **self._client_kwargs())
+                self._embeddings[model] = BatchingEmbeddings(
+                    inner, self.embed_window, self.embed_batch, self.metrics)
+            return self._embeddings[model]
+
+    def status(self) -> dict:
+        """Connection reuse rate, embedding throughput and raw counters."""
+        m = self.metrics
+        return {
+            "http2": self.http2,
+            "connection_reuse": 1 - m["http_connections"] / max(1, m["http_requests"]),
+            "embed_texts_per_s": m["embed_texts"] / max(1e-3, m["embed_ms"] / 1000),
+            "embed_mean_batch": m["embed_texts"] / max(1, m["embed_requests"]),
+            **m,
+        }
+
+    def close(self):
+        """Close the blocking pool (the async one closes with its event loop)."""
+        self._http.close()
+
+    # ---------- internals --------------------------------------------------
+    def _client_kwargs(self) -> dict:
+        kwargs = dict(http_client=self._http, http_async_client=self._ahttp,
+                      max_retries=self.max_retries, timeout=self.timeout)
+        if self.base_url:
+            kwargs["base_url"] = self.base_url
+        return kwargs
+
+    def _on_request(self, request: httpx.Request):
+        self.metrics["http_requests"] += 1
+        request.extensions["trace"] = self._trace
+
+    async def _aon_request(self, request: httpx.Request):
+        self.metrics["http_requests"] += 1
+        request.extensions["trace"] = self._atrace
+
+    def _trace(self, event: str, info: dict):
+        """httpcore trace hook: a TCP connect means the pool had no idle connection."""
+        if event == "connection.connect_tcp.complete":
+            self.metrics["http_connections"] += 1
+
+    async def _atrace(self, event: str, info: dict):
+        self._trace(event, info)
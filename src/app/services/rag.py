@@ -9,12 +9,22 @@ used by ClaraAI:
 * Embedding model  – ``OpenAIEmbeddings`` (text-embedding-3-small).
 * Vector store     – local **Chroma** collection (persistent).
 * LLM              – ``ChatOpenAI`` (gpt-4.1-mini) combined via
-  LangChain’s ``ConversationalRetrievalChain``.
+  LangChain’s ``ConversationalRetrievalChain``. All OpenAI clients come
+  from a shared :class:`~app.services.provider.OpenAIProvider`.
 * Streaming        – token-level SSE through :py:meth:`ask_stream`.
+* Compression      – retrieved documents are cut down to their most
+  relevant passages (pre-embedded at index time) under a token budget
+  before they reach the prompt.
+* Hot reload       – :py:meth:`RAGService.reload` re-embeds only the
+  changed files of ``docs/`` into a new collection and swaps it in
+  without touching conversations (optionally driven by
+  :py:meth:`RAGService.watch`).
 
 The class also tracks per-user short-term memory, mood detection and
-offers a basic off-scope filter to reject requests that are not related
-to ClaraAI’s product/knowledge base.
+routes every question first (:py:meth:`RAGService.route`): a keyword
+pattern and per-topic embedding centroids reject requests that are not
+related to ClaraAI’s product/knowledge base before any search or LLM
+call, and narrow retrieval to the predicted topics otherwise.
 
 Environment
 -----------
@@ -25,7 +35,6 @@ from pathlib import Path
 from chromadb.config import Settings
 from langchain_community.document_loaders import DirectoryLoader
 from langchain_community.vectorstores import Chroma
-from langchain_openai import OpenAIEmbeddings, ChatOpenAI
 #from langchain.chains import RetrievalQA
 from langchain.chains import ConversationalRetrievalChain
 from langchain.memory import ConversationBufferMemory
@@ -33,13 +42,95 @@ from langchain.prompts import PromptTemplate
 from langchain.schema.runnable import RunnablePassthrough
 from langchain.callbacks.streaming_aiter import AsyncIteratorCallbackHandler
 from langchain_core.tools import Tool
+from langchain_core.retrievers import BaseRetriever
+from langchain_core.documents import Document
 from app.tools.mood import detect_mood
-from collections import defaultdict
+from app.profiling import LLMStageCallback, stage
+from app.services.scheduler import LLMScheduler, Priority, SchedulerTimeout
+from app.services.provider import OpenAIProvider
+from collections import defaultdict, Counter
+from concurrent.futures import Future
+from contextlib import AsyncExitStack, suppress
+from functools import lru_cache
+from typing import Any, NamedTuple
+import numpy as np
 from pprint import pprint
 import asyncio
+import hashlib
 import re
+import threading
+import time
+import uuid
 from dotenv import load_dotenv
 
+_LLM_STAGE = {"callbacks": [LLMStageCallback()]}     # times model calls per request
+BUSY_REPLY = "Lo siento, ahora mismo hay demasiadas consultas; inténtalo de nuevo en unos segundos."
+OFF_SCOPE_REPLY = "Lo siento, no puedo ayudar con eso."
+
+# one compiled alternation instead of one regex scan per pattern
+OFF_SCOPE = re.compile("|".join([r"<html", r"código html", r"javascript", r"css", r"poema",
+                                 r"chiste", r"receta", r"meme"]), re.I)
+
+
+class Route(NamedTuple):
+    """Verdict of :py:meth:`RAGService.route`."""
+    in_scope: bool
+    topics: tuple[str, ...] = ()     # best topic first; empty = search everything
+    reason: str = ""                 # "keyword" | "embedding" when rejected
+
+
+class _KB(NamedTuple):
+    """One knowledge-base version; :py:meth:`RAGService.reload` replaces it as a whole."""
+    version: str
+    vectordb: Any                    # Chroma
+    passages: dict                   # source -> (passage texts, unit vectors)
+    topics: tuple                    # see RAGService._topic_centroids
+    files: dict                      # source -> content hash
+
+
+class _StaticRetriever(BaseRetriever):
+    """Retriever that returns documents fetched beforehand (see :py:meth:`RAGService.retrieve`)."""
+    docs: list[Document]
+
+    def _get_relevant_documents(self, query, *, run_manager=None):
+        return self.docs
+
+
+class _CompressingRetriever(BaseRetriever):
+    """Similarity retriever that embeds the query once and compresses the hits."""
+    rag: Any
+    kb: Any = None                   # pinned _KB; None = current version at call time
+    k: int = 3
+
+    def _get_relevant_documents(self, query, *, run_manager=None):
+        kb = self.kb or self.rag._kb
+        with stage("retrieve"):
+            qvec = self.rag._embed(query)
+            docs = kb.vectordb.similarity_search_by_vector(
+                qvec, k=self.k, filter=self.rag._topic_filter(qvec, kb, self.k, record=False))
+        return self.rag._compress(qvec, docs, kb)
+
+
+def _split_passages(text: str, min_chars: int = 80) -> list[str]:
+    """Split on blank lines, gluing short blocks (headings, table rows) to the next one."""
+    passages, pending = [], ""
+    for block in (b.strip() for b in text.split("\n\n")):
+        if not block:
+            continue
+        pending = f"{pending}\n{block}" if pending else block
+        if len(pending) >= min_chars:
+            passages.append(pending)
+            pending = ""
+    if pending:
+        passages.append(pending)
+    return passages
+
+
+def _approx_tokens(text: str) -> int:
+    """Cheap token estimate (~4 characters per token)."""
+    return max(1, len(text) // 4)
+
+
 class RAGService:
     """
     Retrieval-Augmented Q&A service for ClaraAI.
@@ -50,43 +141,103 @@ class RAGService:
         Folder containing knowledge-base Markdown files.
     persist_dir : str, default ``".chroma"``
         Disk location of the Chroma collection (created if missing).
+    collection_name : str, default ``"langchain"``
+        Prefix of the Chroma collections of this knowledge base; every
+        build (start-up, :py:meth:`reload`) appends a unique suffix, so
+        two instances of the same tenant never share a collection (see
+        :py:mod:`app.services.tenants`).
+    scheduler : LLMScheduler, optional
+        Admission control for answer generation, shared across services
+        (see :py:mod:`app.services.scheduler`). A private unlimited-rate
+        scheduler is created if omitted.
+    provider : OpenAIProvider, optional
+        Shared OpenAI connection pool / client factory (see
+        :py:mod:`app.services.provider`). A private one is created if
+        omitted.
+    route_threshold : float | None, default None
+        Minimum cosine similarity between a question and the nearest
+        topic centroid; below it the question is rejected as off-scope
+        before mood detection, vector search or LLM call. ``None``
+        disables the embedding gate and topic narrowing (only the
+        keyword check runs); calibrate a value for your embedding model
+        with ``scripts/route_report.py`` first.
+    route_margin : float, default 0.05
+        Topics scoring within this margin of the best one are searched
+        (widened until they hold enough documents for the search); the
+        others are filtered out of the vector search.
     max_history : int, default 8
         Maximum number of past user/assistant messages kept in the
         :class:`langchain.memory.ConversationBufferMemory`.
+    context_budget : int | None, default 300
+        Approximate token budget for the ``{context}`` of the answer
+        prompt. Only the passages most similar to the question are kept;
+        ``None`` passes the retrieved documents unchanged.
 
     Attributes
     ----------
     vectordb : chromadb.api.models.Collection
-        Shared vector store with embedded KB chunks.
-    emb : langchain_openai.OpenAIEmbeddings
-        Embedding client initialised with the active OpenAI key.
+        Shared vector store with embedded KB chunks (of the current
+        version, see ``_kb``).
+    emb : app.services.provider.BatchingEmbeddings
+        Embedding client; concurrent question embeddings are batched.
     llm : langchain_openai.ChatOpenAI
         LLM used for question re-phrasing and answer generation.
     _reply_template : langchain.prompts.PromptTemplate
         Prompt enforcing brevity (≤ 4 Spanish sentences) and including
         hidden chain-of-thought instructions.
+    kb_version : str
+        Short content hash of the loaded knowledge base; part of every
+        cache / coalescing key so that answers never outlive the KB.
+    _kb : _KB
+        Current version: collection, passages, topic centroids and file
+        hashes in one immutable tuple. A request reads it once and
+        passes it down, so it never mixes two versions.
+    on_reload : list[Callable[[Chroma, str], None]]
+        Called with the new collection and KB version after every
+        successful :py:meth:`reload` (e.g. the recommender's ``swap_kb``).
+    metrics : collections.Counter
+        Operational counters (e.g. ``streams_aborted``,
+        ``ask_coalesced``) exposed through ``GET /api/v1/metrics``.
     """
-    def __init__(self, docs_path: str = "docs", persist_dir: str = ".chroma", max_history: int = 8):
+    def __init__(self, docs_path: str = "docs", persist_dir: str = ".chroma", max_history: int = 8,
+                 context_budget: int | None = 300, collection_name: str = "langchain",
+                 scheduler: LLMScheduler | None = None,
+                 provider: OpenAIProvider | None = None,
+                 route_threshold: float | None = None, route_margin: float = 0.05):
         load_dotenv()
-        self.emb = OpenAIEmbeddings()                          
-        self.llm = ChatOpenAI(model_name="gpt-4.1-mini", temperature=0.2)
+        self.provider = provider or OpenAIProvider()
+        self.emb = self.provider.embeddings()
+        self._embed = lru_cache(maxsize=1024)(self.emb.embed_query)   # one call per question
+        self.context_budget = context_budget
+        self.scheduler = scheduler or LLMScheduler()
+        self.route_threshold, self.route_margin = route_threshold, route_margin
+        self.llm = self.provider.chat("gpt-4.1-mini", temperature=0.2)
         self.llm_tools = self.llm.bind_tools([detect_mood])
         
-        loader = DirectoryLoader(Path(docs_path), glob="**/*.md")
-        docs = loader.load()  
+        self.docs_path = Path(docs_path)
+        docs = self._load_docs()
 
-        for doc in docs:                           # doc = langchain.schema.Document
-            # docs/payments/fees.md  →  "payments"
-            doc.metadata["topic"] = Path(doc.metadata["source"]).parts[1]                                   
+        passages = self._index_passages(docs)
 
-        settings = Settings(anonymized_telemetry=False,          
-                            persist_directory=persist_dir)
-        self.vectordb = Chroma.from_documents(
-            docs, self.emb, client_settings=settings
+        self._settings = Settings(anonymized_telemetry=False,          
+                                  persist_directory=persist_dir)
+        self.collection_name = collection_name
+        vectordb = Chroma.from_documents(
+            docs, self.emb, client_settings=self._settings,
+            collection_name=self._new_collection_name(),
         )                                                       
+        self._kb = _KB(self._kb_version(docs), vectordb, passages,
+                       self._topic_centroids(docs, passages), self._file_hashes(docs))
+        self.on_reload = []
+        self._reload_lock = threading.Lock()
+        self._closed = threading.Event()
+        self._retired = None                       # previous collection, dropped on next reload
 
         self._chains = {}
         self._max_history = max_history
+        self.metrics = Counter()
+        self._inflight: dict[tuple, Future] = {}
+        self._inflight_lock = threading.Lock()
         self._user_mood = defaultdict(lambda:{"style": "profesional", "emoji": "🙂"}
         )
 
@@ -106,6 +257,149 @@ class RAGService:
         )
 
 
+    # ---------- knowledge base ---------------------------------------------
+    @property
+    def vectordb(self) -> Chroma:
+        return self._kb.vectordb
+
+    @property
+    def kb_version(self) -> str:
+        return self._kb.version
+
+    def _load_docs(self) -> list[Document]:
+        """Load every Markdown file of ``docs_path`` and tag it with its topic."""
+        docs = self._read_docs()
+        for doc in docs:                           # doc = langchain.schema.Document
+            # docs/payments/fees.md  →  "payments"
+            doc.metadata["topic"] = Path(doc.metadata["source"]).relative_to(self.docs_path).parts[0]
+        return docs
+
+    def _read_docs(self) -> list[Document]:
+        return DirectoryLoader(self.docs_path, glob="**/*.md").load()
+
+    @staticmethod
+    def _kb_version(docs) -> str:
+        return hashlib.sha1(
+            "".join(sorted(d.metadata["source"] + d.page_content for d in docs)).encode()
+        ).hexdigest()[:12]
+
+    @staticmethod
+    def _file_hashes(docs) -> dict[str, str]:
+        """Content hash per source file (a file may load as several documents)."""
+        hashes = defaultdict(hashlib.sha1)
+        for doc in docs:
+            hashes[doc.metadata["source"]].update(doc.page_content.encode())
+        return {src: h.hexdigest() for src, h in hashes.items()}
+
+    def reload(self) -> bool:
+        """
+        Re-read ``docs_path`` and swap in a new index if anything changed.
+
+        Only new or edited files are embedded; vectors and passages of
+        unchanged files are copied from the current version. The new
+        collection is built off to the side and then swapped in, so
+        in-flight requests finish on the version they started with.
+        Conversations (``_chains``) are kept; caches keyed on
+        :py:attr:`kb_version` stop matching by themselves.
+
+        Returns
+        -------
+        bool
+            ``True`` if a new version was swapped in.
+        """
+        with self._reload_lock:
+            old     = self._kb
+            docs    = self._load_docs()
+            version = self._kb_version(docs)
+            if version == old.version:
+                return False
+
+            files   = self._file_hashes(docs)
+            changed = {src for src, h in files.items() if old.files.get(src) != h}
+            vectordb = self._build_collection(old, docs, files, changed)
+            passages = {src: p for src, p in old.passages.items()
+                        if src in files and src not in changed}
+            passages.update(self._index_passages(
+                [d for d in docs if d.metadata["source"] in changed]))
+
+            self._kb = _KB(version, vectordb, passages,              # the swap
+                           self._topic_centroids(docs, passages), files)
+            self.metrics["kb_reloads"] += 1
+            self.metrics["kb_files_reembedded"] += len(changed)
+            print(f"[kb] {version}: {len(changed)} file(s) re-embedded, {len(files)} total")
+
+            for hook in self.on_reload:
+                hook(vectordb, version)
+            self._drop(self._retired)               # two versions back: no reader left
+            self._retired = old.vectordb
+            return True
+
+    def _new_collection_name(self) -> str:
+        """Unique per build, so no build ever reopens (and appends to) a retired collection."""
+        return f"{self.collection_name}-{uuid.uuid4().hex[:12]}"
+
+    def _drop(self, vectordb):
+        """Delete *vectordb* unless it is (by name) the live collection."""
+        if vectordb is not None and vectordb._collection.name != self._kb.vectordb._collection.name:
+            vectordb.delete_collection()
+
+    def _build_collection(self, kb: _KB, docs, files, changed) -> Chroma:
+        """New collection with the stored vectors of unchanged files plus the *changed* docs."""
+        vectordb = Chroma(collection_name=self._new_collection_name(),
+                          embedding_function=self.emb,
+                          client_settings=self._settings)
+        keep = [src for src in files if src not in changed]
+        if keep:
+            old = kb.vectordb._collection.get(
+                where={"source": {"$in": keep}},
+                include=["embeddings", "metadatas", "documents"])
+            if len(old["ids"]):
+                vectordb._collection.add(ids=old["ids"], embeddings=old["embeddings"],
+                                         metadatas=old["metadatas"], documents=old["documents"])
+        fresh = [d for d in docs if d.metadata["source"] in changed]
+        if fresh:
+            vectordb.add_documents(fresh)
+        return vectordb
+
+    def watch(self, interval: float = 5.0) -> threading.Thread:
+        """Poll ``docs_path`` every *interval* seconds and :py:meth:`reload` on changes."""
+        def scan():
+            return {str(p): p.stat().st_mtime_ns for p in self.docs_path.glob("**/*.md")}
+
+        def loop():
+            seen = scan()
+            while not self._closed.wait(interval):
+                now = scan()
+                if now == seen:
+                    continue
+                seen = now
+                try:
+                    self.reload()
+                except Exception as exc:           # keep serving the current version
+                    print(f"[kb] reload failed: {exc!r}")
+
+        thread = threading.Thread(target=loop, name="kb-watch", daemon=True)
+        thread.start()
+        return thread
+
+    def memory_bytes(self) -> int:
+        """Approximate resident size: document vectors (float32), passage vectors and texts."""
+        kb = self._kb
+        count = kb.vectordb._collection.count()
+        dim = next((v.shape[1] for _, v in kb.passages.values()), 0)
+        texts = sum(len(p) for t, _ in kb.passages.values() for p in t)
+        passages = sum(v.nbytes for _, v in kb.passages.values())
+        return count * dim * 4 + passages + 2 * texts     # texts: passages + documents
+
+    def close(self):
+        """Stop the watcher and drop the collections of this knowledge base."""
+        self._closed.set()
+        with self._reload_lock:
+            self._drop(self._retired)
+            self._kb.vectordb.delete_collection()
+            self._retired = None
+
+    # ---------- chains -----------------------------------------------------
     def _get_chain(self, uid: str):
         if uid not in self._chains:
             mem = ConversationBufferMemory(
@@ -128,12 +422,92 @@ class RAGService:
             self._chains[uid] = chain
         return self._chains[uid]
 
-    def ask(self, question: str, uid: str, τ: float = 0.15):
+    def retrieve(self, question: str, k: int = 3):
+        """
+        Embed *question* once and run one vector search.
+
+        Returns
+        -------
+        tuple[list[float], list[tuple[Document, float]]]
+            The query embedding and the top-*k* ``(document, distance)``
+            hits, ready to be passed as ``hits=`` to :py:meth:`ask` /
+            :py:meth:`ask_stream` and reused by the recommender.
+        """
+        with stage("retrieve"):
+            qvec = self._embed(question)
+            return qvec, self._kb.vectordb.similarity_search_by_vector_with_relevance_scores(qvec, k=k)
+
+    def ask(self, question: str, uid: str, τ: float = 0.15, hits=None,
+            priority: Priority = Priority.INTERACTIVE, verdict: Route | None = None):
         """
         Sequential approach
+
+        Off-scope questions are rejected by :py:meth:`route` before any
+        other work.
+
+        Users without conversation history share one upstream
+        computation per (normalised question, KB version, mood style):
+        concurrent identical questions wait for the first one instead
+        of each paying for embedding, vector search and LLM call.
+
+        If *hits* (from :py:meth:`retrieve`) are given they are used as
+        the answer context and no further embedding or search is done.
+        Callers that routed the question before retrieving pass the
+        :py:meth:`route_for` *verdict* so it is not routed twice.
+
+        *priority* is the scheduler class of the LLM call: offline
+        callers (evaluation, backfills) pass ``Priority.BATCH`` so they
+        queue behind live traffic instead of receiving ``BUSY_REPLY``.
         """
+        kb = self._kb                                # one KB version per request
+        history = bool(self._get_chain(uid).memory.chat_memory.messages)
+        verdict = verdict or self.route(question, follow_up=history, kb=kb)
+        if not verdict.in_scope:
+            return OFF_SCOPE_REPLY, []
+
         self._update_mood(uid, question)
-        top_hit = self.vectordb.similarity_search_with_score(question, k=1)
+        if history:
+            return self._answer(question, uid, τ, hits, kb, priority)
+
+        key = (self._normalize(question), kb.version, self._user_mood[uid]["style"], priority)
+        with self._inflight_lock:
+            fut = self._inflight.get(key)
+            leader = fut is None
+            if leader:
+                fut = self._inflight[key] = Future()
+            else:
+                self.metrics["ask_coalesced"] += 1
+
+        if leader:
+            try:
+                fut.set_result(self._answer(question, uid, τ, hits, kb, priority))
+            except BaseException as exc:
+                fut.set_exception(exc)
+            finally:
+                with self._inflight_lock:
+                    del self._inflight[key]
+            return fut.result()
+
+        answer, sources = fut.result()
+        if sources:                          # the leader's chain wrote its own turn
+            self._get_chain(uid).memory.save_context(
+                {"question": question}, {"answer": answer})
+        return answer, sources
+
+    def _answer(self, question: str, uid: str, τ: float, hits=None, kb: _KB | None = None,
+                priority: Priority = Priority.INTERACTIVE):
+        """Run the similarity guard and the conversational chain for one user on *kb*."""
+        kb = kb or self._kb
+        if hits is None:
+            with stage("retrieve"):
+                qvec    = self._embed(question)
+                top_hit = kb.vectordb.similarity_search_by_vector_with_relevance_scores(
+                    qvec, k=1, filter=self._topic_filter(qvec, kb))
+            chain   = self._build_chain(uid, self.llm, self._smart_retriever(kb=kb))
+        else:
+            top_hit = hits[:1]
+            docs    = self._compress(self._embed(question), [d for d, _ in hits], kb)
+            chain   = self._build_chain(uid, self.llm, _StaticRetriever(docs=docs))
         if not top_hit:                                  
             return "Lo siento, no tengo información sobre eso.", []
 
@@ -148,88 +522,303 @@ class RAGService:
             "style":   self._user_mood[uid]["style"],
             "emoji":   self._user_mood[uid]["emoji"],
         }
-        result = self._get_chain(uid).invoke(vars_in)
+        try:
+            with self.scheduler.slot(priority, self._estimate_tokens(question)):
+                with stage("chain"):
+                    result = chain.invoke(vars_in, config=_LLM_STAGE)
+        except SchedulerTimeout:                      # queue too long: fail fast
+            self.metrics["llm_rejected"] += 1
+            return BUSY_REPLY, []
 
         answer  = result["answer"]
         sources = [d.metadata["source"] for d in result["source_documents"]]
         return answer, sources
+
+    def _estimate_tokens(self, question: str) -> int:
+        """Rough prompt + completion size of one answer, for the scheduler's token bucket."""
+        return (self.context_budget or 1500) + _approx_tokens(question) + 500
+
+    @staticmethod
+    def _normalize(question: str) -> str:
+        """Case-fold, drop surrounding ¿?¡! and collapse whitespace."""
+        return " ".join(question.casefold().strip(" ¿?¡!.").split())
     
     
 
-    def _is_off_scope(self, text: str) -> bool:
-        OFF_SCOPE_PATTERNS = [r"<html", r"código html", r"javascript", r"css",r"poema", r"chiste", r"receta", r"meme",]
-        return any(re.search(p, text, re.I) for p in OFF_SCOPE_PATTERNS)
-
-    async def ask_stream(self, question: str, uid: str, τ: float = 0.15):
+    def route(self, question: str, follow_up: bool = False, kb: _KB | None = None) -> Route:
         """
-        Server-Sent Events generator that yields answer tokens.
+        Classify *question* as off-scope or in-scope (with its likely topics).
+
+        A compiled keyword pattern rejects obvious requests without any
+        API call; otherwise, if ``route_threshold`` is set, the (cached)
+        question embedding is compared with the per-topic centroids.
+        Follow-up questions (*follow_up*, the user has history) only go
+        through the keyword check, since "¿y cuánto cuesta?" means
+        nothing without the conversation.
+
+        Metrics: ``route_accepted``, ``route_rejected_keyword`` /
+        ``route_rejected_embedding`` and ``route_reject_us`` (summed
+        latency of rejections).
+        """
+        kb = kb or self._kb
+        t0 = time.perf_counter()
+        with stage("route"):
+            if OFF_SCOPE.search(question):
+                verdict = Route(False, reason="keyword")
+            elif follow_up or not kb.topics[0] or self.route_threshold is None:
+                verdict = Route(True)
+            else:
+                verdict = self._route_vector(self._embed(question), kb)
+        if verdict.in_scope:
+            self.metrics["route_accepted"] += 1
+        else:
+            self.metrics[f"route_rejected_{verdict.reason}"] += 1
+            self.metrics["route_reject_us"] += int((time.perf_counter() - t0) * 1e6)
+        return verdict
+
+    def route_for(self, question: str, uid: str) -> Route:
+        """:py:meth:`route` for *uid*: once the user has history, questions are follow-ups."""
+        return self.route(question, follow_up=bool(self._get_chain(uid).memory.chat_memory.messages))
+
+    def _route_vector(self, qvec, kb: _KB | None = None) -> Route:
+        """Score *qvec* against the topic centroids of *kb*."""
+        names, centroids, _ = (kb or self._kb).topics
+        if not names:
+            return Route(True)
+        sims, order = self._topic_scores(qvec, centroids)
+        best = sims[order[0]]
+        if self.route_threshold is not None and best < self.route_threshold:
+            return Route(False, reason="embedding")
+        return Route(True, tuple(names[i] for i in order if sims[i] >= best - self.route_margin))
+
+    @staticmethod
+    def _topic_scores(qvec, centroids) -> tuple[np.ndarray, np.ndarray]:
+        """Cosine of *qvec* with every centroid and the topic indices, best first."""
+        q = np.asarray(qvec, dtype=np.float32)
+        sims = centroids @ (q / np.linalg.norm(q))
+        return sims, np.argsort(-sims)
+
+    def _topic_filter(self, qvec, kb: _KB | None = None, k: int = 3,
+                      record: bool = True) -> dict | None:
+        """
+        Chroma ``filter`` restricting a search to the topics routed for
+        *qvec* (``None`` = whole collection, always when routing is off).
+
+        Topics within ``route_margin`` of the best one are taken, then
+        further topics in order of similarity until they hold at least
+        *k* documents, so narrowing never leaves a top-*k* search short.
+        ``retrieval_docs_searched`` / ``retrieval_docs_total`` measure
+        how much the narrowing saves; a second search of the same
+        request passes ``record=False`` so it is counted once.
+        """
+        kb = kb or self._kb
+        names, centroids, counts = kb.topics
+        topics = names
+        if names and self.route_threshold is not None:
+            sims, order = self._topic_scores(qvec, centroids)
+            floor, topics, docs = sims[order[0]] - self.route_margin, [], 0
+            for i in order:
+                if sims[i] < floor and docs >= k:
+                    break
+                topics.append(names[i])
+                docs += counts[names[i]]
+        if record:
+            self.metrics["retrieval_docs_searched"] += sum(counts[t] for t in topics)
+            self.metrics["retrieval_docs_total"] += sum(counts.values())
+        if len(topics) == len(names):
+            return None
+        return {"topic": topics[0]} if len(topics) == 1 else {"topic": {"$in": list(topics)}}
+
+    @staticmethod
+    def _topic_centroids(docs, passages) -> tuple[list[str], np.ndarray, dict[str, int]]:
+        """Normalised mean passage embedding and document count per ``topic``."""
+        vecs, counts = defaultdict(list), Counter()
+        for doc in docs:
+            topic = doc.metadata["topic"]
+            counts[topic] += 1
+            if doc.metadata["source"] in passages:
+                vecs[topic].append(passages[doc.metadata["source"]][1])
+        names = sorted(vecs)
+        if not names:
+            return [], np.empty((0, 0), dtype=np.float32), dict(counts)
+        centroids = np.vstack([np.vstack(vecs[t]).mean(0) for t in names])
+        centroids /= np.linalg.norm(centroids, axis=1, keepdims=True)
+        return names, centroids, dict(counts)
+
+    async def ask_stream(self, question: str, uid: str, τ: float = 0.15, hits=None,
+                         verdict: Route | None = None):
+        """
+        Async generator that yields typed answer events for SSE.
 
         The same similarity guard and off-scope filter are applied as
-        in :pymeth:`ask`.
+        in :pymeth:`ask`, including the optional precomputed *hits* and
+        *verdict*.
 
         Yields
         ------
-        str
-            Token or partial chunk emitted by the streaming LLM.
+        tuple[str, object]
+            ``("token", str)`` for every chunk emitted by the streaming
+            LLM, followed by one ``("sources", list[str])`` if the answer
+            used any documents. Framing is left to
+            :py:func:`app.api.v1.sse.encode_sse`.
         """
         print(">> ask_stream called:", question)
-        if self._is_off_scope(question):
-            yield "Lo siento, no puedo ayudar con eso."
+        kb = self._kb                                # one KB version per request
+        history = self._get_chain(uid).memory.load_memory_variables({})["chat_history"]
+        verdict = verdict or self.route(question, follow_up=bool(history), kb=kb)
+        if not verdict.in_scope:
+            yield "token", OFF_SCOPE_REPLY
             return
 
         self._update_mood(uid, question)
-        history = self._get_chain(uid).memory.load_memory_variables({})["chat_history"]
         print("📝 chat_history:", history or "(empty)")
-        top_hit = self.vectordb.similarity_search_with_score(question, k=1)
+        with stage("retrieve"):
+            if hits is not None:
+                top_hit = hits[:1]
+            else:
+                qvec    = self._embed(question)
+                top_hit = kb.vectordb.similarity_search_by_vector_with_relevance_scores(
+                    qvec, k=1, filter=self._topic_filter(qvec, kb))
         if not top_hit or 1 - top_hit[0][1] < τ:
-            yield "Lo siento, no tengo información sobre eso."
+            yield "token", "Lo siento, no tengo información sobre eso."
             return
 
-        cb_answer = AsyncIteratorCallbackHandler()          
+        cb_answer = AsyncIteratorCallbackHandler()
+        docs  = None if hits is None else \
+                self._compress(self._embed(question), [d for d, _ in hits], kb)
+        chain = self._stream_chain(uid, cb_answer, docs=docs, kb=kb)
+
+        async with AsyncExitStack() as admitted:
+            try:
+                await admitted.enter_async_context(self.scheduler.aslot(
+                    Priority.INTERACTIVE, self._estimate_tokens(question)))
+            except SchedulerTimeout:
+                self.metrics["llm_rejected"] += 1
+                yield "token", BUSY_REPLY
+                return
+
+            task = asyncio.create_task(
+                chain.ainvoke({
+                    "question": question,
+                    "style":   self._user_mood[uid]["style"],
+                    "emoji":   self._user_mood[uid]["emoji"],
+                }, config=_LLM_STAGE)
+            )
 
-        llm_stream = ChatOpenAI(                            
-            model_name="gpt-4.1-mini",
+            try:
+                async for token in cb_answer.aiter():
+                    yield "token", token
+
+                result  = await task
+            finally:
+                # Client went away (generator closed / cancelled) before the
+                # chain finished: abort the LLM call and its HTTP request.
+                # Memory is only written by the chain on completion, so the
+                # partial answer is never committed to the conversation.
+                if not task.done():
+                    task.cancel()
+                    self.metrics["streams_aborted"] += 1
+                    with suppress(asyncio.CancelledError):
+                        await task
+
+        sources = [d.metadata["source"] for d in result["source_documents"]]
+        print("SOURCES",sources)
+        if sources:
+            yield "sources", sources
+
+    def _stream_chain(self, uid: str, callback, docs=None, kb: _KB | None = None):
+        """Build a streaming chain that shares the user's memory and pushes tokens to *callback*."""
+        llm_stream = self.provider.chat(
+            "gpt-4.1-mini",
             temperature=0.2,
             streaming=True,
-            callbacks=[cb_answer],
+            callbacks=[callback],
         )
-        chain = ConversationalRetrievalChain.from_llm(
-            llm=llm_stream,                
-            condense_question_llm=self.llm, 
-            retriever=self._smart_retriever(),
+        retriever = _StaticRetriever(docs=docs) if docs is not None else self._smart_retriever(kb=kb)
+        return self._build_chain(uid, llm_stream, retriever)
+
+    def _build_chain(self, uid: str, llm, retriever):
+        """One-off chain around *llm* / *retriever* that reads and writes the user's memory."""
+        return ConversationalRetrievalChain.from_llm(
+            llm=llm,
+            condense_question_llm=self.llm,
+            retriever=retriever,
             memory=self._get_chain(uid).memory,
-            combine_docs_chain_kwargs={     
+            combine_docs_chain_kwargs={
                 "prompt": self._reply_template,
             },
             return_source_documents=True,
         )
 
-        task = asyncio.create_task(
-            chain.ainvoke({
-                "question": question,
-                "style":   self._user_mood[uid]["style"],
-                "emoji":   self._user_mood[uid]["emoji"],
-            })
-        )
-
-        async for token in cb_answer.aiter():
-            yield token                     
+    def _smart_retriever(self, k: int = 3, kb: _KB | None = None):
+        return _CompressingRetriever(rag=self, kb=kb, k=k)
+
+    def _index_passages(self, docs) -> dict[str, tuple[list[str], np.ndarray]]:
+        """Split every document into passages and embed them in one batched call."""
+        texts, owners = [], []
+        for doc in docs:
+            for passage in _split_passages(doc.page_content):
+                texts.append(passage)
+                owners.append(doc.metadata["source"])
+        if not texts:
+            return {}
+        vecs = np.asarray(self.emb.embed_documents(texts), dtype=np.float32)
+        vecs /= np.linalg.norm(vecs, axis=1, keepdims=True)
+
+        index = defaultdict(lambda: ([], []))
+        for text, src, vec in zip(texts, owners, vecs):
+            index[src][0].append(text)
+            index[src][1].append(vec)
+        return {src: (t, np.vstack(v)) for src, (t, v) in index.items()}
+
+    def _compress(self, qvec, docs: list[Document], kb: _KB | None = None) -> list[Document]:
+        """
+        Keep the passages of *docs* most similar to *qvec* within
+        ``context_budget`` tokens.
 
-        result  = await task                
-        sources = [d.metadata["source"] for d in result["source_documents"]]
-        print("SOURCES",sources)
-        if sources:
-            payload = ", ".join(sources)
-            yield f"\n Sources \ndata: {payload}\n\n"
+        Passages keep their original order and each returned document
+        keeps its metadata, so citations stay correct; documents with no
+        selected passage are dropped.
+        """
+        if self.context_budget is None or not docs:
+            return docs
+        with stage("compress"):
+            return self._select_passages(qvec, docs, (kb or self._kb).passages)
+
+    def _select_passages(self, qvec, docs: list[Document], passages: dict) -> list[Document]:
+        """Rank the *passages* of *docs* against *qvec* and pack them into the budget."""
+        q = np.asarray(qvec, dtype=np.float32)
+        q = q / np.linalg.norm(q)
+
+        scored = []                                   # (score, doc idx, passage idx)
+        for d_i, doc in enumerate(docs):
+            texts, vecs = passages.get(doc.metadata["source"], ([], None))
+            if texts:
+                scored += [(s, d_i, p_i) for p_i, s in enumerate(vecs @ q)]
+
+        keep, used = set(), 0
+        for _, d_i, p_i in sorted(scored, reverse=True):
+            cost = _approx_tokens(passages[docs[d_i].metadata["source"]][0][p_i])
+            if keep and used + cost > self.context_budget:
+                continue
+            keep.add((d_i, p_i))
+            used += cost
+
+        out = []
+        for d_i, doc in enumerate(docs):
+            texts = passages.get(doc.metadata["source"], ([], None))[0]
+            parts = [t for p_i, t in enumerate(texts) if (d_i, p_i) in keep]
+            if parts:
+                out.append(Document(page_content="\n\n".join(parts), metadata=doc.metadata))
+            elif not texts:                           # not indexed: pass through
+                out.append(doc)
+        self.metrics["context_tokens_retrieved"] += sum(_approx_tokens(d.page_content) for d in docs)
+        self.metrics["context_tokens_kept"] += sum(_approx_tokens(d.page_content) for d in out)
+        return out
 
-    def _smart_retriever(self, k: int = 3):
-        return self.vectordb.as_retriever(
-            search_type="similarity",               
-            search_kwargs={"k": k}
-        )
-        
     def _update_mood(self, uid: str, text: str):
-        mood = detect_mood.run(text)            # ejecuta la tool aquí mismo
+        with stage("mood"):
+            mood = detect_mood.run(text)        # ejecuta la tool aquí mismo
         self._user_mood[uid] = {
             "style": mood["style"],
             "emoji": mood["emoji"],
@@ -13,19 +13,37 @@ For every user it stores:
 At recommendation time the centroid of read-docs + query vectors is
 computed and Maximum-Marginal-Relevance (MMR) is applied to select *k*
 unseen documents while promoting topical diversity.
+
+Recommendations are **materialised** per user: every profile change
+schedules a background refresh, so ``recommend`` only has to look up a
+precomputed list. Users without query history get a shared
+popularity / topic-balanced fallback list.
+
+Passing a :class:`~app.services.compact.VectorCodec` keeps document
+and query vectors in a reduced, quantised form (RAM and
+``.profiles.json``); MMR and centroid scoring then run on that form.
+
+Profiles are stored one user per line, so they can be loaded, written
+and exported (:py:meth:`RecommendationService.export_profiles`) without
+holding the whole file in memory; :py:meth:`~RecommendationService.import_events`
+backfills them from a stream of historical interactions.
 """
 from dataclasses import dataclass, field
-from typing import Tuple
-from collections import defaultdict
+from typing import Iterable, Tuple
+from collections import defaultdict, deque, Counter
+from itertools import islice
+from concurrent.futures import ThreadPoolExecutor
 import numpy as np, math, textwrap
 from pathlib import Path
-import json, uuid, time 
-from langchain_openai import OpenAIEmbeddings, ChatOpenAI
+import json, uuid, time, threading
+from .compact import VectorCodec, CompactVectors, cosine_rows
+from .provider import OpenAIProvider
+from ..profiling import stage
 
 @dataclass
 class UserProfile:
     docs: set[str]                 = field(default_factory=set)
-    qvecs: list[np.ndarray]        = field(default_factory=list)
+    qvecs: list[np.ndarray] | CompactVectors = field(default_factory=list)
     
 class RecommendationService:
     """
@@ -39,28 +57,75 @@ class RecommendationService:
         JSON file used to persist user profiles across restarts.
     flush_every : int, default 10
         Number of write operations after which the JSON is flushed.
+    kb_version : str, default ``""``
+        Version of the knowledge base behind *vectordb*; changing it via
+        :py:meth:`set_kb_version` invalidates every materialised list.
+    cache_k : int, default 5
+        Length of the materialised recommendation list per user.
+    codec : VectorCodec, optional
+        Store document and query vectors in compact form (see
+        :py:mod:`app.services.compact`). ``None`` keeps full precision.
+        The same codec settings must be used for an existing
+        ``.profiles.json``. A PCA projection is fitted once and kept in
+        ``<persist_path stem>.pca.npz``, so stored query codes keep
+        their meaning across restarts and KB reloads.
+    provider : OpenAIProvider, optional
+        Shared OpenAI client layer (see :py:mod:`app.services.provider`);
+        a private one is created if omitted.
 
     Attributes
     ----------
-    emb : langchain_openai.OpenAIEmbeddings
+    emb : app.services.provider.BatchingEmbeddings
         Embedding client to vectorise new queries on the fly.
     _profiles : dict[str, UserProfile]
         In-memory store of per-user document sets and query vectors.
+    _recs : dict[str, list[tuple[str, dict]]]
+        Materialised ``(source, payload)`` lists, refreshed in background.
+    metrics : collections.Counter
+        ``rec_hits`` / ``rec_misses`` / ``rec_refreshes`` counters.
     """
     def __init__(self,
                  vectordb,
                  persist_path: str = ".profiles.json",
-                 flush_every: int = 10):
+                 flush_every: int = 10,
+                 kb_version: str = "",
+                 cache_k: int = 5,
+                 codec: VectorCodec | None = None,
+                 provider: OpenAIProvider | None = None):
         self.vectordb   = vectordb
-        self.emb        = OpenAIEmbeddings()         
+        self.emb        = (provider or OpenAIProvider()).embeddings()
         self.persist    = Path(persist_path)
         self.flush_every= flush_every
         self._writes    = 0                           # counter
+        self.kb_version = kb_version
+        self.cache_k    = cache_k
+        self.codec      = codec
+        self.metrics    = Counter()
 
+        self._vectors   = None                        # cached collection snapshot
+        self._recs: dict[str, list[tuple[str, dict]]] = {}
+        self._fallback: list[int] = []
+        self._dirty: set[str] = set()
+        self._lock      = threading.Lock()
+        self._refresher = ThreadPoolExecutor(max_workers=1,
+                                             thread_name_prefix="rec-refresh")
+        self._closed    = False
+
+        self._projection = self.persist.with_suffix(".pca.npz")
+        self._new_basis  = False
+        if codec is not None and codec.method == "pca":
+            if not codec.fitted and self._projection.exists():
+                codec.load(self._projection)          # basis of the stored qcodes
+            elif not codec.fitted:
+                self._new_basis = self.persist.exists()
+                self._get_vectors()                   # PCA is fitted on the docs
+            if not self._projection.exists():
+                codec.save(self._projection)
         self._profiles: dict[str, UserProfile] = self._load_profiles()
         self._user_mood = defaultdict(lambda: {"mood":"neutral",
                                        "style":"profesional",
                                        "emoji":"🙂"})
+        self._submit(self._refresh_fallback)
 
     def log_sources(self, uid: str, sources: list[str]):
         """
@@ -75,6 +140,7 @@ class RecommendationService:
         """
         self._profiles[uid].docs.update(sources)
         self._maybe_flush()
+        self._schedule_refresh(uid)
 
     def log_query(self, uid: str, query: str):
         """
@@ -88,11 +154,14 @@ class RecommendationService:
             Raw query string (in any language supported by the embedding
             model).
         """
-        vec = np.array(self.emb.embed_query(query), dtype=np.float32)
+        with stage("embed"):
+            vec = np.array(self.emb.embed_query(query), dtype=np.float32)
         self._profiles[uid].qvecs.append(vec)
         self._maybe_flush()
+        self._schedule_refresh(uid)
 
-    def recommend(self, uid: str, k: int = 3, lambda_: float = 0.5):
+    def recommend(self, uid: str, k: int = 3, lambda_: float = 0.5,
+                  fresh: bool = False):
         """
         Return *k* unseen, diversified recommendations.
 
@@ -105,6 +174,9 @@ class RecommendationService:
         lambda_ : float, default 0.5
             Relevance/diversity trade-off for MMR (``1 = purely
             relevance``, ``0 = purely diversity``).
+        fresh : bool, default False
+            Bypass the materialised list and recompute synchronously
+            (used by the offline evaluation).
 
         Returns
         -------
@@ -116,36 +188,355 @@ class RecommendationService:
 
         Notes
         -----
-        * Cold-start: if the user has no query vectors yet, *k* random
-          unseen documents are returned.
+        * Served from the per-user materialised list when possible; a
+          miss (new user, ``k > cache_k`` or custom ``lambda_``)
+          computes and stores it on the spot.
+        * Cold-start: if the user has no query vectors yet, the shared
+          popularity / topic-balanced fallback list is used. Fewer than
+          *k* items are returned if the user has seen almost everything.
         * Diversity boost: consecutive documents with identical
           ``topic`` receive an extra penalty.
         """
+        cacheable = k <= self.cache_k and lambda_ == 0.5
+        recs = self._recs.get(uid) if cacheable and not fresh else None
+        if recs is None:
+            self.metrics["rec_misses"] += 1
+            version = self.kb_version
+            recs = self._compute(uid, max(k, self.cache_k), lambda_)
+            if cacheable:
+                self._store(uid, recs, version)
+        else:
+            self.metrics["rec_hits"] += 1
+
+        # a refresh may still be pending: never re-suggest what was just read
+        seen = self._profiles[uid].docs
+        return [payload for src, payload in recs if src not in seen][:k]
+
+    def recommend_with_hits(self, uid: str, qvec, sources: list[str],
+                            candidates: list[str], k: int = 3,
+                            lambda_: float = 0.5, exclude=()):
+        """
+        Log an already-embedded question and recommend from its hits.
+
+        Used by the fused ask+recommend endpoints: the question embedding
+        and the vector search of :py:meth:`RAGService.retrieve` are
+        reused, so no extra embedding call or collection scan is needed.
+
+        Parameters
+        ----------
+        uid : str
+            Target user.
+        qvec : list[float]
+            Embedding of the user's question.
+        sources : list[str]
+            Files cited by the answer (marked as read). When the answer
+            is still being generated pass ``[]`` and call
+            :py:meth:`log_sources` with the sources it returned.
+        candidates : list[str]
+            Files of the retrieval hits; MMR ranks the unseen ones. If
+            fewer than *k* remain the whole collection is used.
+        k, lambda_
+            As in :py:meth:`recommend`.
+        exclude : Iterable[str], optional
+            Files not to recommend this time (e.g. the answer context),
+            without marking them as read.
+
+        Returns
+        -------
+        list of dict
+            Same payload as :py:meth:`recommend`. The list is specific
+            to this question and is not materialised; the user's own
+            list is refreshed in the background instead.
+        """
         profile = self._profiles[uid]
-        seen    = profile.docs
+        profile.docs.update(sources)
+        profile.qvecs.append(np.asarray(qvec, dtype=np.float32))
+        self._maybe_flush()
+
+        ids, emb, meta, txt = self._get_vectors()
+        seen = set(profile.docs) | set(exclude)
+        pool = set(candidates) - seen
+        cand_idx = [i for i, m in enumerate(meta) if m["source"] in pool]
+        if len(cand_idx) < k:                         # neighbourhood exhausted
+            cand_idx = [i for i, m in enumerate(meta) if m["source"] not in seen]
+
+        centroid = self._centroid(emb, meta, profile)
+        ranked = self._mmr(centroid, emb, meta, cand_idx, k, lambda_)
+        self._schedule_refresh(uid)                   # profile changed; list is per-question
+        return [self._build_payload(i, meta, txt, centroid, emb) for i in ranked][:k]
+
+    def set_kb_version(self, kb_version: str):
+        """Drop every materialised list and the collection snapshot after a KB change."""
+        with self._lock:
+            self.kb_version = kb_version
+            self._vectors   = None
+            self._fallback  = []
+            active = list(self._recs)
+            self._recs.clear()
+        self._after_kb_change(active)
+
+    def swap_kb(self, vectordb, kb_version: str):
+        """
+        Switch to a rebuilt collection (hook for :py:meth:`RAGService.reload`).
+
+        The new vector snapshot is loaded before the swap, so concurrent
+        recommendations keep using the old one until it is ready.
+        Profiles are kept; materialised lists are dropped and rebuilt in
+        the background for every user who had one.
+        """
+        vectors = self._load_vectors(vectordb)
+        with self._lock:
+            self.vectordb   = vectordb
+            self.kb_version = kb_version
+            self._vectors   = vectors
+            self._fallback  = []
+            active = list(self._recs)
+            self._recs.clear()
+        self._after_kb_change(active)
+
+    def _after_kb_change(self, active: list[str]):
+        """Rebuild the fallback and the lists of *active* users against the new KB."""
+        self._submit(self._refresh_fallback)
+        for uid in active:
+            self._schedule_refresh(uid)
+
+    def memory_bytes(self) -> int:
+        """Approximate resident size: document matrix and texts plus stored query vectors."""
+        ids, emb, meta, txt = self._get_vectors()
+        qvecs = sum(p.qvecs.nbytes if isinstance(p.qvecs, CompactVectors)
+                    else sum(v.nbytes for v in p.qvecs)
+                    for p in list(self._profiles.values()))
+        return emb.nbytes + sum(map(len, txt)) + qvecs
+
+    def close(self):
+        """
+        Flush profiles and stop the background refresher.
+
+        Calls made afterwards (a request that outlived its evicted
+        tenant) still answer from memory but no longer schedule refreshes
+        or write the profiles file, which may already belong to a newly
+        loaded instance.
+        """
+        self._closed = True
+        self._refresher.shutdown(wait=True, cancel_futures=True)
+        self._save_profiles()
+
+    # ---------- bulk import / export ---------------------------------------
+    def import_events(self, events: Iterable, batch_size: int = 1000,
+                      workers: int = 4) -> Counter:
+        """
+        Replay a stream of interactions into the profiles in bulk.
+
+        Parameters
+        ----------
+        events : iterable of str or dict
+            JSON lines (or parsed dicts). An *event* has ``user_id`` and
+            ``query`` and/or ``sources``, like one ``log_query`` +
+            ``log_sources`` call. A *profile record* as written by
+            :py:meth:`export_profiles` (``docs`` + ``qvecs`` or
+            ``qcodes``/``qscales``) replaces that user's profile without
+            embedding anything.
+        batch_size : int, default 1000
+            Events per ``embed_documents`` call (distinct queries only).
+        workers : int, default 4
+            Batches embedded concurrently. At most ``workers + 1``
+            batches are held in memory; they are applied in input order.
+
+        Returns
+        -------
+        collections.Counter
+            ``events`` / ``queries`` / ``embedded`` / ``profiles`` counts
+            and ``invalid``: lines skipped because they are not JSON or
+            lack a ``user_id`` / have fields of the wrong type.
+
+        Notes
+        -----
+        Profiles are written once at the end (one atomic file swap) and
+        the affected materialised lists are dropped rather than
+        recomputed. Meant for offline backfills: concurrent
+        ``log_*`` calls on the same users may interleave with the import.
+        """
+        stats = Counter()
+        touched: set[str] = set()
+
+        def embed(batch):
+            queries = list(dict.fromkeys(e["query"] for e in batch if e.get("query")))
+            vectors = self.emb.embed_documents(queries) if queries else []
+            return batch, dict(zip(queries, vectors))
+
+        records = self._valid_records(events, stats)
+        with ThreadPoolExecutor(max_workers=workers,
+                                thread_name_prefix="rec-import") as pool:
+            pending = deque()
+            while batch := list(islice(records, batch_size)):
+                pending.append(pool.submit(embed, batch))
+                if len(pending) > workers:
+                    self._apply_events(*pending.popleft().result(), stats, touched)
+            while pending:
+                self._apply_events(*pending.popleft().result(), stats, touched)
+
+        self._save_profiles()
+        with self._lock:
+            for uid in touched:
+                self._recs.pop(uid, None)
+        self._submit(self._refresh_fallback)
+        return stats
+
+    def export_profiles(self, fp) -> int:
+        """
+        Stream every profile to *fp* as JSON lines.
+
+        Each line holds ``user_id``, ``docs`` and the stored query
+        vectors in the codec's form; feeding the lines back to
+        :py:meth:`import_events` restores the profiles. Returns the
+        number of users written.
+        """
+        n = 0
+        for uid, p in list(self._profiles.items()):
+            fp.write(json.dumps({"user_id": uid, **self._dump_profile(p)}) + "\n")
+            n += 1
+        return n
+
+    @staticmethod
+    def _valid_records(events: Iterable, stats: Counter):
+        """Parse *events*, skipping (and counting as ``invalid``) malformed ones."""
+        for e in events:
+            if isinstance(e, str):
+                if not e.strip():
+                    continue
+                try:
+                    e = json.loads(e)
+                except json.JSONDecodeError:
+                    stats["invalid"] += 1
+                    continue
+            if (not isinstance(e, dict) or not isinstance(e.get("user_id"), str)
+                    or not isinstance(e.get("query") or "", str)
+                    or not isinstance(e.get("sources", []), list)
+                    or not isinstance(e.get("docs", []), list)):
+                stats["invalid"] += 1
+                continue
+            yield e
+
+    def _apply_events(self, batch: list[dict], vectors: dict, stats: Counter,
+                      touched: set[str]):
+        """Fold one embedded batch into the profiles (query stacks grow once per user)."""
+        new_q = defaultdict(list)
+        stats["embedded"] += len(vectors)
+        for e in batch:
+            uid = e["user_id"]
+            touched.add(uid)
+            profile = self._profiles[uid]
+            if "qvecs" in e or "qcodes" in e:        # exported profile record
+                profile.docs  = set(e.get("docs", ()))
+                profile.qvecs = self._load_qvecs(e)
+                new_q.pop(uid, None)
+                stats["profiles"] += 1
+                continue
+            profile.docs.update(e.get("sources", ()))
+            if e.get("query"):
+                new_q[uid].append(vectors[e["query"]])
+            stats["events"] += 1
+        for uid, vecs in new_q.items():
+            qvecs = self._profiles[uid].qvecs
+            if isinstance(qvecs, CompactVectors):
+                qvecs.append(np.array(vecs, dtype=np.float32))
+            else:
+                qvecs.extend(np.array(vecs, dtype=np.float32))
+            stats["queries"] += len(vecs)
+
+    def _compute(self, uid: str, k: int, lambda_: float = 0.5):
+        """Run centroid + MMR (or the cold-start fallback) and return ``(source, payload)`` pairs."""
+        profile = self._profiles[uid]
+        seen    = set(profile.docs)
 
         ids, emb, meta, txt = self._get_vectors()
-        unseen_idx = [i for i, m in enumerate(meta) if m["source"] not in seen]
 
         # --- COLD START --------------------------------------------------
         if not profile.qvecs:                         # no history yet
-            picks = np.random.choice(unseen_idx, k, replace=False)
-            return [self._build_payload(i, meta, txt, emb[picks].mean(0), emb)
+            if not self._fallback:
+                self._refresh_fallback()
+            picks = [i for i in self._fallback if meta[i]["source"] not in seen][:k]
+            if not picks:
+                return []
+            centroid = emb[picks].mean(0)
+            return [(meta[i]["source"], self._build_payload(i, meta, txt, centroid, emb))
                     for i in picks]
 
         # ----------------------------------------------------------------
+        unseen_idx = [i for i, m in enumerate(meta) if m["source"] not in seen]
         centroid = self._centroid(emb, meta, profile)
         ranked = self._mmr(centroid, emb, meta, unseen_idx, k, lambda_)
-        return   [self._build_payload(i, meta, txt, centroid, emb) for i in ranked]
+        return [(meta[i]["source"], self._build_payload(i, meta, txt, centroid, emb))
+                for i in ranked]
+
+    # ---------- background refresh ------------------------------------------
+    def _schedule_refresh(self, uid: str):
+        """Queue one background recomputation for *uid* (deduplicated while pending)."""
+        with self._lock:
+            if uid in self._dirty:
+                return
+            self._dirty.add(uid)
+        self._submit(self._refresh, uid)
+
+    def _submit(self, fn, *args):
+        """Queue background work; skipped once the service is closed."""
+        try:
+            self._refresher.submit(fn, *args)
+        except RuntimeError:                          # executor shut down by close()
+            self.metrics["rec_after_close"] += 1
+
+    def _refresh(self, uid: str):
+        """Recompute and store the materialised list of one user."""
+        with self._lock:
+            self._dirty.discard(uid)
+            version = self.kb_version                 # the list is tagged with this KB
+        self._store(uid, self._compute(uid, self.cache_k), version)
+        self.metrics["rec_refreshes"] += 1
+
+    def _store(self, uid: str, recs, version: str):
+        """Materialise *recs* unless the KB changed since they were computed from *version*."""
+        with self._lock:
+            if version == self.kb_version:            # KB changed meanwhile: drop
+                self._recs[uid] = recs
+
+    def _refresh_fallback(self):
+        """
+        Rebuild the cold-start list: documents ordered by how many users
+        have read them, interleaved round-robin across topics.
+        """
+        ids, emb, meta, txt = self._get_vectors()
+        popularity = Counter(src for p in list(self._profiles.values()) for src in p.docs)
+
+        by_topic = defaultdict(list)
+        for i in sorted(range(len(meta)),
+                        key=lambda i: (-popularity[meta[i]["source"]], meta[i]["source"])):
+            by_topic[meta[i].get("topic")].append(i)
 
+        queues = sorted(by_topic.values(),
+                        key=lambda q: -popularity[meta[q[0]]["source"]])
+        fallback = []
+        while queues:
+            fallback.extend(q.pop(0) for q in queues)
+            queues = [q for q in queues if q]
+        self._fallback = fallback
 
     # ---------- helpers ----------------------------------------------------
     def _get_vectors(self):
-        """Fetch all document embeddings, metadata, and raw text from the vector store."""
-        data = self.vectordb._collection.get(
+        """Fetch all document embeddings, metadata, and raw text from the vector store (cached per KB version)."""
+        if self._vectors is None:
+            self._vectors = self._load_vectors(self.vectordb)
+        return self._vectors
+
+    def _load_vectors(self, vectordb):
+        """Read ``(ids, emb, meta, txt)`` from *vectordb*, encoded with the codec if any."""
+        data = vectordb._collection.get(
             include=["embeddings", "metadatas", "documents"])
-        return data["ids"], np.array(data["embeddings"]), \
-               data["metadatas"], data["documents"]
+        emb = np.array(data["embeddings"])
+        if self.codec is not None:
+            if not self.codec.fitted:                 # PCA stays fitted on the first KB
+                self.codec.fit(emb)
+            emb = self.codec.encode(emb)
+        return data["ids"], emb, data["metadatas"], data["documents"]
 
     @staticmethod
     def _cos(a, b):        # cosine similarity
@@ -156,7 +547,10 @@ class RecommendationService:
         """Calculate the user profile centroid from seen documents and past query vectors."""
         doc_vecs = emb[[i for i,m in enumerate(meta) if m["source"] in profile.docs]]
 
-        q_vecs  = np.vstack(profile.qvecs) if profile.qvecs else np.empty((0, emb.shape[1]))
+        if isinstance(profile.qvecs, CompactVectors):
+            q_vecs = profile.qvecs[:]
+        else:
+            q_vecs = np.vstack(profile.qvecs) if profile.qvecs else np.empty((0, emb.shape[1]))
 
         if doc_vecs.size and q_vecs.size:
             return np.vstack([doc_vecs, q_vecs]).mean(axis=0)
@@ -168,19 +562,28 @@ class RecommendationService:
 
     def _mmr(self, query_vec, emb, meta, candidates, k, λ):
         """Select k diverse documents from candidates using MMR with topic penalization."""
-        selected = []
+        selected   = []
+        candidates = list(candidates)
+        if not candidates:
+            return selected
+        # relevance once for all candidates; max-similarity to the selected
+        # set is updated incrementally instead of recomputed pairwise
+        rel     = dict(zip(candidates, cosine_rows(query_vec, emb, candidates)))
+        max_div = dict.fromkeys(candidates, -math.inf)
         while candidates and len(selected) < k:
-            mmr_score, pick = -1, None
+            mmr_score, pick = -math.inf, None
             for idx in candidates:
-                rel = self._cos(query_vec, emb[idx])
-                div = max(self._cos(emb[idx], emb[s]) for s in selected) if selected else 0
+                div = max_div[idx] if selected else 0
                 if selected and meta[idx]["topic"] == meta[selected[-1]]["topic"]:
                     div += 0.15
-                score = λ * rel - (1 - λ) * div
+                score = λ * rel[idx] - (1 - λ) * div
                 if score > mmr_score:
                     mmr_score, pick = score, idx
             selected.append(pick)
             candidates.remove(pick)
+            if candidates:
+                for idx, sim in zip(candidates, cosine_rows(emb[pick], emb, candidates)):
+                    max_div[idx] = max(max_div[idx], sim)
         return selected
     
     def _build_payload(self, idx, meta, txt, centroid, emb) -> dict:
@@ -204,28 +607,73 @@ class RecommendationService:
     def _maybe_flush(self):
         """Flush user profiles to disk after every N writes (atomic swap for safety)."""
         self._writes += 1
+        if self._closed:
+            self.metrics["rec_after_close"] += 1
+            return
         if self._writes % self.flush_every == 0:
-            self._save_profiles()
+            with stage("profile_flush"):
+                self._save_profiles()
+            self._submit(self._refresh_fallback)
 
     def _save_profiles(self):
-        """Persist all user profiles to JSON file on disk (overwrites previous version)."""
-        data = {
-            uid: {
-                "docs":  list(p.docs),
-                "qvecs": [v.tolist() for v in p.qvecs],
-            } for uid, p in self._profiles.items()
-        }
+        """
+        Persist all user profiles (atomic swap of a temporary file).
+
+        The file is one JSON object with one user per line, so it is
+        written and read back incrementally.
+        """
         tmp = self.persist.with_suffix(f".{uuid.uuid4().hex}.tmp")
-        tmp.write_text(json.dumps(data))
+        with tmp.open("w", encoding="utf-8") as f:
+            f.write("{\n")
+            sep = ""
+            for uid, p in list(self._profiles.items()):
+                f.write(f"{sep}{json.dumps(uid)}: {json.dumps(self._dump_profile(p))}")
+                sep = ",\n"
+            f.write("\n}\n")
         tmp.replace(self.persist)    # atomic swap
 
     def _load_profiles(self) -> dict[str, UserProfile]:
-        """Load user profiles from disk into memory, or initialize empty if none found."""
+        """Load user profiles from disk line by line, or initialize empty if none found."""
+        profs = defaultdict(self._new_profile)
         if not self.persist.exists():
-            return defaultdict(UserProfile)
-        raw = json.loads(self.persist.read_text())
-        profs = defaultdict(UserProfile)
-        for uid, p in raw.items():
-            profs[uid].docs  = set(p["docs"])
-            profs[uid].qvecs = [np.array(v, dtype=np.float32) for v in p["qvecs"]]
-        return profs
\ No newline at end of file
+            return profs
+        with self.persist.open(encoding="utf-8") as f:
+            first = f.readline()
+            if first.strip() != "{":                  # older single-line file
+                raw = json.loads(first + f.read()).items()
+            else:
+                raw = (next(iter(json.loads("{" + line.rstrip().rstrip(",") + "}").items()))
+                       for line in f if line.strip() not in ("", "}"))
+            for uid, p in raw:
+                profs[uid].docs  = set(p["docs"])
+                profs[uid].qvecs = self._load_qvecs(p)
+        return profs
+
+    def _dump_profile(self, p: UserProfile) -> dict:
+        """JSON fields of one profile: ``docs`` plus its query stack."""
+        return {"docs": list(p.docs), **self._dump_qvecs(p.qvecs)}
+
+    def _new_profile(self) -> UserProfile:
+        """Empty profile whose query stack matches the configured codec."""
+        return UserProfile(qvecs=self.codec.empty() if self.codec else [])
+
+    def _dump_qvecs(self, qvecs) -> dict:
+        """JSON fields for one query stack: ``qvecs`` or compact ``qcodes`` + ``qscales``."""
+        if isinstance(qvecs, CompactVectors):
+            return {"qcodes": qvecs.codes.tolist(), "qscales": qvecs.scales.tolist()}
+        return {"qvecs": [v.tolist() for v in qvecs]}
+
+    def _load_qvecs(self, p: dict):
+        """Inverse of :py:meth:`_dump_qvecs`; full-precision files are compacted on load."""
+        if self.codec is None:
+            return [np.array(v, dtype=np.float32) for v in p["qvecs"]]
+        qvecs = self.codec.empty()
+        if "qcodes" in p and self._new_basis:
+            raise ValueError(f"{self.persist} holds PCA codes but {self._projection} is "
+                             "missing; export/re-import the profiles at full precision")
+        if "qcodes" in p:
+            qvecs.codes  = np.array(p["qcodes"], dtype=qvecs.codes.dtype)
+            qvecs.scales = np.array(p["qscales"], dtype=np.float32)
+        elif p["qvecs"]:
+            qvecs.append(p["qvecs"])
+        return qvecs
\ No newline at end of file
@@ -0,0 +1,229 @@
+# src/app/services/scheduler.py
+"""
+scheduler
+=========
+
+Admission control for upstream LLM calls, shared by every
+:class:`~app.services.rag.RAGService` of the process.
+
+A call has to obtain a *slot* before it talks to the provider:
+
+* at most ``max_concurrency`` slots are held at any time;
+* token buckets cap requests per minute (``rpm``) and estimated tokens
+  per minute (``tpm``);
+* waiting calls are served by :class:`Priority` (interactive before
+  batch / evaluation), FIFO within a class;
+* a call that would wait longer than its ``max_wait`` fails with
+  :class:`SchedulerTimeout` – immediately if the expected queue wait
+  already exceeds it, otherwise when the deadline passes – so the
+  caller can answer with a canned reply instead of piling up.
+
+Both blocking (``with scheduler.slot(...)``, thread-pool endpoints) and
+async (``async with scheduler.aslot(...)``, streaming) callers share the
+same queue.
+"""
+from collections import Counter
+from contextlib import asynccontextmanager, contextmanager
+from enum import IntEnum
+import asyncio
+import heapq
+import itertools
+import threading
+import time
+
+
+class Priority(IntEnum):
+    INTERACTIVE = 0
+    BATCH = 1
+
+
+class SchedulerTimeout(TimeoutError):
+    """The call could not be admitted within its wait budget."""
+
+
+class _Bucket:
+    """Token bucket refilled continuously at ``per_minute / 60`` per second."""
+    def __init__(self, per_minute: float):
+        self.capacity = per_minute
+        self.rate     = per_minute / 60
+        self.level    = per_minute
+        self.stamp    = time.monotonic()
+
+    def delay(self, amount: float, now: float) -> float:
+        """Seconds until *amount* (capped at capacity) is available."""
+        self.level = min(self.capacity, self.level + (now - self.stamp) * self.rate)
+        self.stamp = now
+        missing = min(amount, self.capacity) - self.level
+        return max(0.0, missing / self.rate)
+
+    def take(self, amount: float):
+        self.level -= min(amount, self.capacity)
+
+
+class _Waiter:
+    __slots__ = ("priority", "tokens", "enqueued", "state", "wake")
+
+    def __init__(self, priority, tokens, wake):
+        self.priority, self.tokens, self.wake = priority, tokens, wake
+        self.enqueued = time.monotonic()
+        self.state    = "waiting"                 # → granted | cancelled
+
+
+class LLMScheduler:
+    """
+    Concurrency cap + rate limits + priority queue for LLM calls.
+
+    Parameters
+    ----------
+    max_concurrency : int, default 8
+        Maximum simultaneous upstream calls.
+    rpm, tpm : float, optional
+        Requests / estimated tokens per minute (``None`` = unlimited).
+    max_wait : dict[Priority, float | None], optional
+        Queue-wait budget per class in seconds. Defaults to 5 s for
+        interactive calls and no limit for batch calls.
+
+    Attributes
+    ----------
+    metrics : collections.Counter
+        ``llm_admitted`` / ``llm_rejected`` / ``llm_wait_ms`` (sum) per
+        class, see :py:meth:`status` for gauges.
+    """
+    def __init__(self, max_concurrency: int = 8, rpm: float | None = None,
+                 tpm: float | None = None, max_wait: dict | None = None):
+        self.max_concurrency = max_concurrency
+        self.max_wait = {Priority.INTERACTIVE: 5.0, Priority.BATCH: None, **(max_wait or {})}
+        self.metrics  = Counter()
+        self._buckets = [(_Bucket(per_min), unit)
+                         for per_min, unit in ((rpm, "requests"), (tpm, "tokens")) if per_min]
+        self._queue: list = []                     # (priority, seq, waiter)
+        self._seq = itertools.count()
+        self._in_flight = 0
+        self._hold = 1.0                           # EWMA of slot hold time (s)
+        self._lock = threading.Lock()
+        self._timer: threading.Timer | None = None
+
+    # ---------- public API -------------------------------------------------
+    @contextmanager
+    def slot(self, priority: Priority = Priority.INTERACTIVE, tokens: int = 1000):
+        """Blocking acquisition; raises :class:`SchedulerTimeout`."""
+        event = threading.Event()
+        waiter = self._enqueue(priority, tokens, event.set)
+        if waiter.state != "granted":
+            budget = self.max_wait[priority]
+            event.wait(None if budget is None else max(0.0, waiter.enqueued + budget
+                                                       - time.monotonic()))
+            if not self._settle(waiter):
+                raise SchedulerTimeout("LLM queue wait budget exceeded")
+        start = time.monotonic()
+        try:
+            yield
+        finally:
+            self._release(start)
+
+    @asynccontextmanager
+    async def aslot(self, priority: Priority = Priority.INTERACTIVE, tokens: int = 1000):
+        """Async acquisition; raises :class:`SchedulerTimeout`."""
+        loop = asyncio.get_running_loop()
+        granted = loop.create_future()
+        wake = lambda: loop.call_soon_threadsafe(
+            lambda: granted.done() or granted.set_result(None))
+        waiter = self._enqueue(priority, tokens, wake)
+        if waiter.state != "granted":
+            budget = self.max_wait[priority]
+            try:
+                await asyncio.wait_for(asyncio.shield(granted), budget and max(
+                    0.0, waiter.enqueued + budget - time.monotonic()))
+            except asyncio.TimeoutError:
+                pass
+            except asyncio.CancelledError:        # client went away while queued
+                if self._settle(waiter, count=False):
+                    self._release(None)
+                raise
+            if not self._settle(waiter):
+                raise SchedulerTimeout("LLM queue wait budget exceeded")
+        start = time.monotonic()
+        try:
+            yield
+        finally:
+            self._release(start)
+
+    def status(self) -> dict:
+        """Queue depth per class, calls in flight and mean wait per class."""
+        with self._lock:
+            depth = Counter(p.name.lower() for p, _, w in self._queue if w.state == "waiting")
+            in_flight = self._in_flight
+        waits = {p.name.lower(): self.metrics[f"llm_wait_ms_{p.name.lower()}"]
+                 / max(1, self.metrics[f"llm_admitted_{p.name.lower()}"]) for p in Priority}
+        return {"in_flight": in_flight, "queue_depth": dict(depth),
+                "mean_wait_ms": waits, **self.metrics}
+
+    # ---------- internals --------------------------------------------------
+    def _enqueue(self, priority, tokens, wake) -> _Waiter:
+        waiter = _Waiter(Priority(priority), tokens, wake)
+        with self._lock:
+            budget = self.max_wait[waiter.priority]
+            ahead = sum(1 for p, _, w in self._queue if p <= waiter.priority and w.state == "waiting")
+            if budget is not None and ahead and \
+                    ahead * self._hold / self.max_concurrency > budget:
+                self._reject(waiter)
+                raise SchedulerTimeout(f"expected queue wait over {budget:.1f}s")
+            heapq.heappush(self._queue, (waiter.priority, next(self._seq), waiter))
+            self._dispatch()
+        return waiter
+
+    def _settle(self, waiter: _Waiter, count: bool = True) -> bool:
+        """After waking up or timing out: keep the slot (``True``) or leave the queue."""
+        with self._lock:
+            if waiter.state == "granted":
+                return True
+            waiter.state = "cancelled"
+            if count:
+                self._reject(waiter)
+            return False
+
+    def _reject(self, waiter: _Waiter):
+        self.metrics["llm_rejected"] += 1
+        self.metrics[f"llm_rejected_{waiter.priority.name.lower()}"] += 1
+
+    def _release(self, start: float | None):
+        with self._lock:
+            self._in_flight -= 1
+            if start is not None:
+                self._hold = 0.8 * self._hold + 0.2 * (time.monotonic() - start)
+            self._dispatch()
+
+    def _dispatch(self):
+        """Grant slots to the head of the queue while capacity and rate allow (lock held)."""
+        while self._queue and self._in_flight < self.max_concurrency:
+            _, _, waiter = self._queue[0]
+            if waiter.state != "waiting":
+                heapq.heappop(self._queue)
+                continue
+            now = time.monotonic()
+            delay = max((b.delay(1 if unit == "requests" else waiter.tokens, now)
+                         for b, unit in self._buckets), default=0.0)
+            if delay > 0:                          # head waits for refill; keep priority order
+                self._schedule(delay)
+                return
+            heapq.heappop(self._queue)
+            for b, unit in self._buckets:
+                b.take(1 if unit == "requests" else waiter.tokens)
+            waiter.state = "granted"
+            self._in_flight += 1
+            name = waiter.priority.name.lower()
+            self.metrics["llm_admitted"] += 1
+            self.metrics[f"llm_admitted_{name}"] += 1
+            self.metrics[f"llm_wait_ms_{name}"] += int((now - waiter.enqueued) * 1000)
+            waiter.wake()
+
+    def _schedule(self, delay: float):
+        if self._timer is not None and self._timer.is_alive():
+            return
+        self._timer = threading.Timer(delay, self._on_timer)
+        self._timer.daemon = True
+        self._timer.start()
+
+    def _on_timer(self):
+        with self._lock:
+            self._dispatch()
@@ -0,0 +1,162 @@
+# src/app/services/tenants.py
+"""
+tenants
+=======
+
+Lazy, memory-bounded registry of per-tenant knowledge bases.
+
+Every tenant (product line) has its own :class:`RAGService` (collection,
+passages, conversations) and :class:`RecommendationService` (profiles
+file). A tenant is loaded on first use and kept in an LRU; when more
+than ``max_loaded`` tenants are resident, or their estimated memory
+exceeds ``max_bytes``, the least recently used ones are evicted. An
+evicted tenant is only closed (profiles flushed, collection dropped)
+after a grace period, so in-flight requests can finish; if it is
+requested again meanwhile it is revived instead of being loaded a
+second time next to itself.
+"""
+from collections import OrderedDict, Counter
+from concurrent.futures import Future
+from dataclasses import dataclass
+from typing import Any, Callable
+import threading
+
+
+@dataclass
+class Tenant:
+    name: str
+    rag: Any                 # RAGService
+    rec: Any                 # RecommendationService
+
+    def memory_bytes(self) -> int:
+        return self.rag.memory_bytes() + self.rec.memory_bytes()
+
+
+class TenantRegistry:
+    """
+    LRU of loaded tenants with single-flight loading.
+
+    Parameters
+    ----------
+    factory : Callable[[str], Tenant]
+        Builds a tenant; raises :class:`LookupError` for unknown names.
+    max_loaded : int, default 8
+        Maximum number of resident tenants.
+    max_bytes : int, optional
+        Memory budget over all resident tenants (see
+        :py:meth:`Tenant.memory_bytes`). The most recently used tenant
+        is never evicted, even if it alone exceeds the budget.
+    grace : float, default 60
+        Seconds between eviction and closing the tenant's services.
+
+    Attributes
+    ----------
+    metrics : collections.Counter
+        ``tenant_loads`` / ``tenant_evictions`` / ``tenant_hits`` /
+        ``tenant_revived``.
+    """
+    def __init__(self, factory: Callable[[str], Tenant], max_loaded: int = 8,
+                 max_bytes: int | None = None, grace: float = 60.0):
+        self.factory    = factory
+        self.max_loaded = max_loaded
+        self.max_bytes  = max_bytes
+        self.grace      = grace
+        self.metrics    = Counter()
+        self._loaded: OrderedDict[str, Tenant] = OrderedDict()
+        self._bytes: dict[str, int] = {}
+        self._loading: dict[str, Future] = {}
+        self._retiring: dict[str, tuple[Tenant, threading.Timer, int]] = {}
+        self._closing: dict[str, Future] = {}    # set once the old instance has flushed
+        self._lock = threading.Lock()
+
+    def get(self, name: str) -> Tenant:
+        """Return tenant *name*, loading it (once, even under concurrency) if needed."""
+        with self._lock:
+            tenant = self._loaded.get(name)
+            if tenant is not None:
+                self._loaded.move_to_end(name)
+                self.metrics["tenant_hits"] += 1
+                return tenant
+            if name in self._retiring:                # evicted, still in its grace period
+                tenant, timer, size = self._retiring.pop(name)
+                timer.cancel()
+                self._loaded[name], self._bytes[name] = tenant, size
+                self.metrics["tenant_revived"] += 1
+                evicted = self._evict()
+            else:
+                evicted = None
+                fut = self._loading.get(name)
+                leader = fut is None
+                if leader:
+                    fut = self._loading[name] = Future()
+                closing = self._closing.get(name)
+        if evicted is not None:
+            self._retire(evicted)
+            return tenant
+        if not leader:
+            return fut.result()
+
+        try:
+            if closing is not None:                   # let the old instance save its profiles
+                closing.result()
+            tenant = self.factory(name)
+            size = tenant.memory_bytes()
+        except BaseException as exc:
+            with self._lock:
+                del self._loading[name]
+            fut.set_exception(exc)
+            raise
+        with self._lock:
+            del self._loading[name]
+            self._loaded[name], self._bytes[name] = tenant, size
+            self.metrics["tenant_loads"] += 1
+            evicted = self._evict()
+        fut.set_result(tenant)
+        self._retire(evicted)
+        return tenant
+
+    def _evict(self) -> list[tuple[Tenant, int]]:
+        """Pop least recently used tenants (with their size) until both limits hold (lock held)."""
+        evicted = []
+        while len(self._loaded) > 1 and (
+                len(self._loaded) > self.max_loaded
+                or (self.max_bytes is not None
+                    and sum(self._bytes.values()) > self.max_bytes)):
+            name, tenant = self._loaded.popitem(last=False)
+            evicted.append((tenant, self._bytes.pop(name, 0)))
+            self.metrics["tenant_evictions"] += 1
+        return evicted
+
+    def _retire(self, tenants: list[tuple[Tenant, int]]):
+        """Schedule :py:meth:`_close` of evicted *tenants* after the grace period."""
+        for tenant, size in tenants:
+            timer = threading.Timer(self.grace, self._close, args=(tenant,))
+            timer.daemon = True
+            with self._lock:
+                self._retiring[tenant.name] = (tenant, timer, size)
+            timer.start()
+
+    def _close(self, tenant: Tenant):
+        with self._lock:
+            if self._retiring.get(tenant.name, (None,))[0] is not tenant:
+                return                                # revived meanwhile
+            del self._retiring[tenant.name]
+            done = self._closing[tenant.name] = Future()
+        try:
+            tenant.rec.close()                        # flush profiles before a reload reads them
+            tenant.rag.close()
+        finally:
+            with self._lock:
+                del self._closing[tenant.name]
+            done.set_result(None)
+
+    def status(self) -> dict:
+        """Resident tenants (most recent last) with their estimated memory."""
+        with self._lock:
+            loaded = list(self._loaded.items())
+        sizes = {name: t.memory_bytes() for name, t in loaded}
+        with self._lock:
+            self._bytes.update((n, s) for n, s in sizes.items() if n in self._bytes)
+        return {"loaded": sizes, "total_bytes": sum(sizes.values()),
+                "max_loaded": self.max_loaded, "max_bytes": self.max_bytes,
+                **self.metrics}
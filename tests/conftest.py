@@ -1,11 +1,173 @@
 import sys, pathlib
-ROOT_DIR = pathlib.Path(__file__).resolve().parents[1]   
+ROOT_DIR = pathlib.Path(__file__).resolve().parents[1]
 SRC_DIR  = ROOT_DIR / "src"
-sys.path.insert(0, str(SRC_DIR))    
+sys.path.insert(0, str(SRC_DIR))
+sys.path.insert(0, str(ROOT_DIR / "scripts"))
 
-from app.deps import get_rag, get_rec    
+from app.deps import get_rag, get_rec
 
+import asyncio
+import time
+import uuid
+
+import numpy as np
 import pytest
+from langchain_core.documents import Document
+from langchain_core.language_models.chat_models import SimpleChatModel
+from langchain_core.messages import AIMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+from types import SimpleNamespace
+from app.services.rag import RAGService
+from app.services.recommender import RecommendationService
+
+WORDS = ["fee", "dispute", "escrow", "refund", "team", "weather"]
+
+DOCS = {
+    "fees.md": "# Fees\n\n" + "The platform fee is 10 %, every fee is listed. " * 3
+               + "\n\nOur team is spread across Europe and the team grows every year.",
+    "disputes.md": "Disputes are opened within 14 days; a dispute is reviewed fast.\n\n"
+                   + "Escrow keeps the escrow funds until the dispute is solved. " * 2,
+    "escrow.md": "Escrow releases funds on delivery; escrow is free.",
+}
+
+TOPICS = ["fees", "payments", "disputes", "contracts", "onboarding"]
+
+
+class StubEmbeddings:
+    """Bag-of-keywords vectors; records embedded documents and query calls."""
+    def __init__(self):
+        self.embedded, self.batches, self.queries = [], [], 0
+
+    def vec(self, text):
+        v = np.array([text.lower().count(w) for w in WORDS], dtype=float) + 0.01
+        return (v / np.linalg.norm(v)).tolist()
+
+    def embed_documents(self, texts):
+        self.embedded += texts
+        self.batches.append(list(texts))
+        return [self.vec(t) for t in texts]
+
+    def embed_query(self, text):
+        self.queries += 1
+        return self.vec(text)
+
+
+class TopicEmbeddings(StubEmbeddings):
+    """One-hot vectors over :data:`TOPICS`, picked by text length."""
+    def vec(self, text):
+        return np.eye(len(TOPICS))[len(text) % len(TOPICS)].tolist()
+
+
+class StubChat(SimpleChatModel):
+    """Canned answer; streams it word by word (every *delay* s) when ``streaming``."""
+    answer: str = "La tarifa de plataforma es el 10 %."
+    delay: float = 0.0
+    streaming: bool = False
+    calls: int = 0
+    emitted: int = 0
+
+    @property
+    def _llm_type(self) -> str:
+        return "stub"
+
+    def bind_tools(self, tools, **kwargs):
+        return self
+
+    def _call(self, messages, stop=None, run_manager=None, **kwargs):
+        self.calls += 1
+        if self.delay:
+            time.sleep(self.delay)
+        return self.answer
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs):
+        if not self.streaming:
+            return await super()._agenerate(messages, stop, run_manager, **kwargs)
+        self.calls += 1
+        for word in self.answer.split():
+            await asyncio.sleep(self.delay)
+            self.emitted += 1
+            if run_manager:
+                await run_manager.on_llm_new_token(word + " ")
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=self.answer))])
+
+
+class StubProvider:
+    """Stands in for :class:`~app.services.provider.OpenAIProvider` (no network)."""
+    def __init__(self):
+        self.emb, self.chats = StubEmbeddings(), []
+        self.answer, self.delay = StubChat().answer, 0.0
+
+    def embeddings(self, model: str = "text-embedding-3-small"):
+        return self.emb
+
+    def chat(self, model: str = "gpt-4.1-mini", streaming=False, callbacks=None, **kwargs):
+        llm = StubChat(answer=self.answer, delay=self.delay, streaming=streaming,
+                       callbacks=callbacks)
+        self.chats.append(llm)
+        return llm
+
+
+def _read_plain(self):
+    """``DirectoryLoader`` without the unstructured parsers: one document per file."""
+    return [Document(page_content=p.read_text(), metadata={"source": str(p)})
+            for p in sorted(self.docs_path.glob("**/*.md"))]
+
+
+@pytest.fixture
+def make_rag(tmp_path, monkeypatch):
+    """Build real :class:`RAGService` instances over *files* with stub OpenAI clients."""
+    monkeypatch.setattr(RAGService, "_read_docs", _read_plain)
+    monkeypatch.setattr(RAGService, "_update_mood", lambda self, uid, text: None)
+
+    def make(files: dict[str, str] = DOCS, **kwargs) -> RAGService:
+        docs_dir = tmp_path / f"kb-{uuid.uuid4().hex[:8]}"
+        for name, text in files.items():
+            (docs_dir / name).parent.mkdir(parents=True, exist_ok=True)
+            (docs_dir / name).write_text(text)
+        kwargs.setdefault("collection_name", f"test-{uuid.uuid4().hex}")
+        return RAGService(str(docs_dir), provider=StubProvider(), **kwargs)
+    return make
+
+
+@pytest.fixture
+def rag(make_rag):
+    return make_rag()
+
+
+@pytest.fixture
+def topics():
+    return TOPICS
+
+
+@pytest.fixture
+def topic_kb():
+    """Chroma stand-in holding one document per topic, with one-hot embeddings."""
+    data = {
+        "ids": TOPICS,
+        "embeddings": np.eye(len(TOPICS)).tolist(),
+        "metadatas": [{"source": f"docs/{t}.md", "topic": t} for t in TOPICS],
+        "documents": [f"{t} body" for t in TOPICS],
+    }
+    return SimpleNamespace(_collection=SimpleNamespace(get=lambda include: data))
+
+
+@pytest.fixture
+def make_rec(tmp_path, monkeypatch, topic_kb):
+    """Build real :class:`RecommendationService` instances over *topic_kb*."""
+    monkeypatch.setenv("OPENAI_API_KEY", "sk-test")
+
+    def make(path=None, codec=None) -> RecommendationService:
+        svc = RecommendationService(topic_kb, persist_path=str(path or tmp_path / "p.json"),
+                                    codec=codec)
+        svc.emb = TopicEmbeddings()
+        return svc
+    return make
+
+
+@pytest.fixture
+def rec(make_rec):
+    return make_rec()
+
 
 @pytest.fixture(scope="session")
 def rag_service():
@@ -13,4 +175,4 @@ def rag_service():
 
 @pytest.fixture(scope="session")
 def rec_service():
-    return get_rec()
\ No newline at end of file
+    return get_rec()
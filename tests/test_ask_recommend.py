@@ -0,0 +1,80 @@
+# tests/test_ask_recommend.py
+import threading
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.api.v1.routes import router
+from app.deps import get_rag, get_rec
+from app.services.rag import BUSY_REPLY, OFF_SCOPE_REPLY
+from app.services.recommender import RecommendationService
+from app.services.scheduler import LLMScheduler, Priority
+
+
+@pytest.fixture
+def fused(make_rag, tmp_path):
+    rag = make_rag(scheduler=LLMScheduler(max_concurrency=1,
+                                          max_wait={Priority.INTERACTIVE: 0.05}))
+    rec = RecommendationService(rag.vectordb, persist_path=str(tmp_path / "p.json"),
+                                provider=rag.provider)
+    app = FastAPI()
+    app.include_router(router)
+    app.dependency_overrides[get_rag] = lambda: rag
+    app.dependency_overrides[get_rec] = lambda: rec
+    return TestClient(app), rag, rec
+
+
+def _ask(client, question, uid="u1"):
+    r = client.post("/ask_recommend", json={"question": question, "user_id": uid})
+    r.raise_for_status()
+    return r.json()
+
+
+def test_off_scope_question_is_rejected_before_retrieval(fused):
+    client, rag, rec = fused
+    rag.retrieve = lambda *a, **kw: pytest.fail("off-scope question was embedded / searched")
+    body = _ask(client, "Escríbeme un poema sobre el mar")
+    assert body["answer"] == OFF_SCOPE_REPLY and body["sources"] == []
+    assert rec._profiles["u1"].docs == set()
+
+
+def test_only_the_answers_sources_are_logged(fused):
+    client, rag, rec = fused
+    body = _ask(client, "How much is the platform fee?")
+    assert body["sources"] and rec._profiles["u1"].docs == set(body["sources"])
+
+
+def _saturated(rag):
+    """Hold the only LLM slot until the returned event is set."""
+    release, taken = threading.Event(), threading.Event()
+
+    def hold():
+        with rag.scheduler.slot():
+            taken.set()
+            release.wait()
+    threading.Thread(target=hold, daemon=True).start()
+    taken.wait()
+    return release
+
+
+def test_busy_answer_marks_nothing_as_read(fused):
+    client, rag, rec = fused
+    release = _saturated(rag)
+    try:
+        body = _ask(client, "How much is the platform fee?")
+    finally:
+        release.set()
+    assert body["answer"] == BUSY_REPLY and body["sources"] == []
+    assert rec._profiles["u1"].docs == set()
+
+
+def test_shed_ask_does_not_touch_the_profile(fused):
+    client, rag, rec = fused
+    rec.log_query = rec.log_sources = lambda *a: pytest.fail("shed request updated the profile")
+    release = _saturated(rag)
+    try:
+        r = client.post("/ask", json={"question": "How much is the platform fee?", "user_id": "u1"})
+    finally:
+        release.set()
+    assert r.status_code == 200 and r.json()["answer"] == BUSY_REPLY
@@ -0,0 +1,76 @@
+# tests/test_compact.py
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+from app.services.compact import VectorCodec, cosine_rows
+from app.services.recommender import RecommendationService
+
+
+def _random_kb(n=12, dim=64, seed=0):
+    emb = np.random.default_rng(seed).standard_normal((n, dim))
+    emb /= np.linalg.norm(emb, axis=1, keepdims=True)
+    data = {
+        "ids": [str(i) for i in range(n)],
+        "embeddings": emb.tolist(),
+        "metadatas": [{"source": f"docs/doc{i}.md", "topic": f"t{i % 4}"} for i in range(n)],
+        "documents": [f"doc {i}" for i in range(n)],
+    }
+    return emb, SimpleNamespace(_collection=SimpleNamespace(get=lambda include: data))
+
+
+@pytest.mark.parametrize("dtype", ["float16", "int8"])
+def test_quantised_cosines_close_to_full_precision(dtype):
+    emb, _ = _random_kb()
+    compact = VectorCodec(dtype=dtype).encode(emb)
+    idx = list(range(len(emb)))
+    full = emb @ emb[0]
+    assert np.allclose(cosine_rows(emb[0], compact, idx), full, atol=0.02)
+    assert compact.nbytes < emb.nbytes / 3
+
+
+def test_compact_recommender_matches_and_persists(tmp_path, monkeypatch):
+    monkeypatch.setenv("OPENAI_API_KEY", "sk-test")
+    emb, vectordb = _random_kb()
+    path = tmp_path / "p.json"
+    full = RecommendationService(vectordb, persist_path=str(tmp_path / "full.json"))
+    small = RecommendationService(vectordb, persist_path=str(path),
+                                  codec=VectorCodec(dtype="int8"), flush_every=1)
+    qvec = (emb[3] + emb[5]) / np.linalg.norm(emb[3] + emb[5])
+    for svc in (full, small):
+        svc.recommend_with_hits("u1", qvec, ["docs/doc3.md"], [], k=3)
+
+    titles = lambda svc: [r["title"] for r in svc.recommend("u1", fresh=True)]
+    assert titles(full) == titles(small) != []
+
+    reloaded = RecommendationService(vectordb, persist_path=str(path),
+                                     codec=VectorCodec(dtype="int8"))
+    assert reloaded._profiles["u1"].qvecs.codes.dtype == np.int8
+    assert reloaded.recommend("u1", fresh=True) == small.recommend("u1", fresh=True)
+
+
+def test_pca_projection_is_persisted_with_the_profiles(tmp_path, monkeypatch):
+    monkeypatch.setenv("OPENAI_API_KEY", "sk-test")
+    emb, vectordb = _random_kb()
+    path = str(tmp_path / "p.json")
+    svc = RecommendationService(vectordb, persist_path=path, flush_every=1,
+                                codec=VectorCodec(8, "int8", "pca"))
+    svc.recommend_with_hits("u1", emb[3], ["docs/doc3.md"], [], k=3)
+
+    _, other = _random_kb(seed=1)                  # a refit would give another basis
+    reloaded = RecommendationService(other, persist_path=path,
+                                     codec=VectorCodec(8, "int8", "pca"))
+    assert np.array_equal(reloaded.codec.components, svc.codec.components)
+    assert np.array_equal(reloaded._profiles["u1"].qvecs.codes, svc._profiles["u1"].qvecs.codes)
+
+    (tmp_path / "p.pca.npz").unlink()
+    with pytest.raises(ValueError, match="missing"):
+        RecommendationService(vectordb, persist_path=path, codec=VectorCodec(8, "int8", "pca"))
+
+
+def test_pca_needs_a_dimension_it_can_fit():
+    emb, _ = _random_kb()
+    with pytest.raises(ValueError):
+        VectorCodec(None, "int8", "pca")
+    with pytest.raises(ValueError):
+        VectorCodec(32, "int8", "pca").fit(emb)     # 12 vectors < 32 dims
@@ -0,0 +1,23 @@
+# tests/test_compression.py
+from app.services.rag import _split_passages
+
+
+def test_split_passages_merges_short_blocks():
+    assert _split_passages("# Title\n\n" + "x" * 100 + "\n\n" + "y" * 100) == \
+        ["# Title\n" + "x" * 100, "y" * 100]
+
+
+def test_compression_keeps_relevant_passages_and_sources(make_rag):
+    rag = make_rag(context_budget=40)
+    docs = rag._load_docs()
+    out = rag._compress(rag.emb.vec("fee"), docs)
+
+    assert [d.metadata["source"] for d in out] == [str(rag.docs_path / "fees.md")]
+    assert "platform fee" in out[0].page_content and "team" not in out[0].page_content
+    assert rag.metrics["context_tokens_kept"] < rag.metrics["context_tokens_retrieved"]
+
+
+def test_no_budget_passes_documents_through(make_rag):
+    rag = make_rag(context_budget=None)
+    docs = rag._load_docs()
+    assert rag._compress(rag.emb.vec("fee"), docs) is docs
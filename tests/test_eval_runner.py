@@ -0,0 +1,60 @@
+# tests/test_eval_runner.py
+import asyncio
+import json
+
+import pytest
+from eval_runner import ResultStore, example_key, replay
+
+EXAMPLES = [{"user_input": f"q{i}"} for i in range(5)]
+
+
+def _run(store, fail=()):
+    calls = []
+
+    async def worker(idx, example):
+        calls.append(idx)
+        if idx in fail:
+            raise RuntimeError("upstream down")
+        return {"answer": example["user_input"].upper()}
+    return asyncio.run(replay(EXAMPLES, worker, store, concurrency=2)), calls
+
+
+def test_interrupted_run_resumes_with_the_missing_examples(tmp_path):
+    path = tmp_path / "results.jsonl"
+    with pytest.raises(SystemExit):
+        _run(ResultStore(path), fail={1, 3})
+    assert len(path.read_text().splitlines()) == 3           # failures are not stored
+
+    results, calls = _run(ResultStore(path))
+    assert sorted(calls) == [1, 3]
+    assert [r["answer"] for r in results] == ["Q0", "Q1", "Q2", "Q3", "Q4"]
+
+    _, calls = _run(ResultStore(path))
+    assert calls == []
+
+
+def test_line_cut_short_by_a_kill_is_dropped_and_rerun(tmp_path):
+    path = tmp_path / "results.jsonl"
+    _run(ResultStore(path))
+    lines = path.read_text().splitlines(keepends=True)
+    path.write_text("".join(lines[:4]) + lines[4][:10])     # killed mid-write
+
+    store = ResultStore(path)
+    assert len(store.done) == 4
+    results, calls = _run(store)
+    assert len(calls) == 1 and len(results) == 5
+    assert all(json.loads(line) for line in path.read_text().splitlines())
+
+
+def test_records_are_keyed_by_position_and_content(tmp_path):
+    path = tmp_path / "results.jsonl"
+    store = ResultStore(path)
+    key = example_key(0, EXAMPLES[0])
+    store.add(key, {"answer": "old"})
+    store.add(key, {"answer": "new"})                       # last record wins
+    assert ResultStore(path).ordered(EXAMPLES[:1]) == [{"key": key, "answer": "new"}]
+
+    edited = [{"user_input": "q0 edited"}]                  # edited example runs again
+    assert example_key(0, edited[0]) != key
+    assert ResultStore(path).ordered(edited) == []
+    assert ResultStore(path, fresh=True).done == {} and not path.exists()
@@ -0,0 +1,65 @@
+# tests/test_profile_import.py
+import io
+import json
+
+import numpy as np
+from app.services.compact import VectorCodec
+
+
+def test_import_batches_queries_and_writes_once(make_rec, topics, tmp_path, monkeypatch):
+    rec = make_rec(tmp_path / "p.json")
+    saves = []
+    save = rec._save_profiles
+    monkeypatch.setattr(rec, "_save_profiles", lambda: saves.append(1) or save())
+
+    events = [json.dumps({"user_id": f"u{i % 3}", "query": "fee" * (i % 4),
+                          "sources": [f"docs/{topics[i % 5]}.md"]}) for i in range(10)]
+    stats = rec.import_events(events + [""], batch_size=4, workers=2)
+
+    assert stats["events"] == 10 and stats["queries"] == 7      # "" queries skipped
+    assert sorted(len(b) for b in rec.emb.batches) == [1, 3, 3]  # distinct texts only
+    assert rec.emb.queries == 0                                  # never one at a time
+    assert saves == [1]
+    assert len(rec._profiles["u0"].qvecs) == 3
+    assert rec._profiles["u1"].docs == {"docs/payments.md", "docs/onboarding.md", "docs/disputes.md"}
+
+    reloaded = make_rec(tmp_path / "p.json")
+    assert reloaded._profiles.keys() == rec._profiles.keys()
+    assert np.allclose(np.vstack(reloaded._profiles["u0"].qvecs), np.vstack(rec._profiles["u0"].qvecs))
+
+
+def test_export_round_trip_without_embedding(make_rec, tmp_path):
+    codec = VectorCodec(dtype="int8")
+    src = make_rec(tmp_path / "a.json", codec)
+    src.import_events([{"user_id": "u1", "query": "fees", "sources": ["docs/fees.md"]},
+                       {"user_id": "u2", "query": "disputes"}])
+    out = io.StringIO()
+    assert src.export_profiles(out) == 2
+
+    dst = make_rec(tmp_path / "b.json", codec)
+    stats = dst.import_events(io.StringIO(out.getvalue()))
+    assert stats["profiles"] == 2 and dst.emb.batches == [] and dst.emb.queries == 0
+    for uid in ("u1", "u2"):
+        assert dst._profiles[uid].docs == src._profiles[uid].docs
+        assert np.array_equal(dst._profiles[uid].qvecs.codes, src._profiles[uid].qvecs.codes)
+
+
+def test_loads_single_line_profile_file(make_rec, tmp_path):
+    path = tmp_path / "p.json"
+    path.write_text(json.dumps({"u1": {"docs": ["docs/fees.md"], "qvecs": [[1, 0, 0, 0, 0]]}}))
+    rec = make_rec(path)
+    assert rec._profiles["u1"].docs == {"docs/fees.md"}
+    assert len(rec._profiles["u1"].qvecs) == 1
+
+
+def test_malformed_lines_are_skipped_and_counted(make_rec, tmp_path):
+    rec = make_rec(tmp_path / "p.json")
+    events = ['{"user_id": "u1", "query": "fees", "sources": ["docs/fees.md"]}',
+              '{"query": "no user"}',
+              'not json',
+              '{"user_id": "u2", "sources": "docs/fees.md"}',
+              '{"user_id": "u2", "query": "disputes"}']
+    stats = rec.import_events(events, batch_size=2)
+    assert stats["events"] == 2 and stats["invalid"] == 3
+    assert set(rec._profiles) == {"u1", "u2"}
+    assert set(make_rec(tmp_path / "p.json")._profiles) == {"u1", "u2"}   # saved
@@ -0,0 +1,82 @@
+import json
+import logging
+import time
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.profiling import Profiler, ProfilingMiddleware, stage, tag
+
+
+def _app(profiler: Profiler) -> FastAPI:
+    app = FastAPI()
+    app.add_middleware(ProfilingMiddleware, profiler=profiler)
+
+    @app.post("/ask")
+    def ask(body: dict):                   # sync → runs in the thread pool
+        tag(body["user_id"])
+        with stage("retrieve"):
+            time.sleep(0.03)
+        with stage("chain"):
+            time.sleep(0.02)
+        return {"ok": True}
+
+    return app
+
+
+def test_stage_is_noop_outside_requests():
+    with stage("retrieve"):
+        pass
+
+
+def test_armed_requests_are_profiled_and_slow_ones_logged(tmp_path, caplog):
+    profiler = Profiler(out_dir=str(tmp_path), slow_ms=0, interval=0.002)
+    client = TestClient(_app(profiler))
+
+    profiler.arm(requests=1)
+    with caplog.at_level(logging.WARNING, logger="app.slow"):
+        client.post("/ask", json={"user_id": "alice"})
+        client.post("/ask", json={"user_id": "bob"})       # budget used up
+
+    summaries = list(tmp_path.glob("*.json"))
+    assert len(summaries) == 1 and "ask" in summaries[0].name
+    summary = json.loads(summaries[0].read_text())
+    assert summary["stages_ms"]["retrieve"] >= 30 and summary["samples"] > 0
+    folded = summaries[0].with_suffix(".folded").read_text()
+    assert "ask (test_profiling.py" in folded               # worker thread was sampled
+
+    slow = [r.getMessage() for r in caplog.records]
+    assert len(slow) == 2 and "'retrieve'" in slow[0] and "'chain'" in slow[0]
+
+
+def test_header_selects_request(tmp_path):
+    profiler = Profiler(out_dir=str(tmp_path), token="s3cret")
+    client = TestClient(_app(profiler))
+
+    client.post("/ask", json={"user_id": "a"}, headers={"X-Profile": "wrong"})
+    assert not list(tmp_path.glob("*.folded"))
+    client.post("/ask", json={"user_id": "a"}, headers={"X-Profile": "s3cret"})
+    assert len(list(tmp_path.glob("*.folded"))) == 1
+
+
+def test_header_ignored_without_token(tmp_path):
+    client = TestClient(_app(Profiler(out_dir=str(tmp_path))))
+    client.post("/ask", json={"user_id": "a"}, headers={"X-Profile": "1"})
+    assert not list(tmp_path.glob("*.folded"))
+
+
+def test_admin_routes_need_a_configured_token(tmp_path):
+    from app.api.v1.routes import router
+    from app.deps import get_profiler
+    app = FastAPI()
+    app.include_router(router)
+    client = TestClient(app)
+
+    app.dependency_overrides[get_profiler] = lambda: Profiler(out_dir=str(tmp_path))
+    assert client.get("/admin/profile", headers={"X-Admin-Token": ""}).status_code == 404
+    assert client.post("/admin/reindex").status_code == 404
+
+    app.dependency_overrides[get_profiler] = lambda: Profiler(out_dir=str(tmp_path), token="s3cret")
+    assert client.get("/admin/profile").status_code == 403
+    assert client.get("/admin/profile", headers={"X-Admin-Token": "wrong"}).status_code == 403
+    assert client.get("/admin/profile", headers={"X-Admin-Token": "s3cret"}).status_code == 200
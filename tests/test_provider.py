@@ -0,0 +1,61 @@
+# tests/test_provider.py
+import threading
+import time
+
+from app.services.provider import BatchingEmbeddings, OpenAIProvider
+
+
+class RecordingEmbeddings:
+    def __init__(self, fail=False):
+        self.calls, self.fail = [], fail
+
+    def embed_documents(self, texts):
+        self.calls.append(list(texts))
+        if self.fail:
+            raise ConnectionError("upstream down")
+        return [[float(len(t))] for t in texts]
+
+
+def _concurrently(fn, args):
+    results, threads = {}, []
+    for a in args:
+        def run(a=a):
+            try:
+                results[a] = fn(a)
+            except Exception as e:
+                results[a] = e
+        threads.append(threading.Thread(target=run))
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return results
+
+
+def test_concurrent_queries_share_one_request():
+    inner = RecordingEmbeddings()
+    emb = BatchingEmbeddings(inner, window=0.2)
+    texts = ["a", "bb", "ccc", "bb"] * 5
+    results = _concurrently(emb.embed_query, texts)
+    assert all(results[t] == [float(len(t))] for t in texts)
+    assert len(inner.calls) == 1 and sorted(inner.calls[0]) == ["a", "bb", "ccc"]
+    assert emb.metrics["embed_requests"] == 1 and emb.metrics["embed_texts"] == 3
+
+
+def test_full_batch_is_sent_without_waiting_and_errors_reach_every_caller():
+    inner = RecordingEmbeddings(fail=True)
+    emb = BatchingEmbeddings(inner, window=30, max_batch=2)
+    start = time.monotonic()
+    results = _concurrently(emb.embed_query, ["x", "yy"])
+    assert time.monotonic() - start < 5
+    assert all(isinstance(r, ConnectionError) for r in results.values())
+    assert len(inner.calls) == 1 and sorted(inner.calls[0]) == ["x", "yy"]
+
+
+def test_clients_share_the_provider_pool(monkeypatch):
+    monkeypatch.setenv("OPENAI_API_KEY", "sk-test")
+    provider = OpenAIProvider(base_url="http://127.0.0.1:9/v1", max_retries=5)
+    llm, stream = provider.chat(temperature=0.2), provider.chat(streaming=True)
+    assert llm.http_client is stream.http_client is provider.embeddings().inner.http_client
+    assert llm.max_retries == 5 and llm.openai_api_base == "http://127.0.0.1:9/v1"
+    assert provider.embeddings() is provider.embeddings()
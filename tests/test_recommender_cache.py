@@ -0,0 +1,67 @@
+# tests/test_recommender_cache.py
+import numpy as np
+
+
+def _drain(rec):
+    rec._refresher.submit(lambda: None).result()
+
+
+def test_cold_start_with_few_unseen_docs(rec, topics):
+    rec.log_sources("u1", [f"docs/{t}.md" for t in topics[:4]])
+    assert [r["title"] for r in rec.recommend("u1", k=3)] == ["Onboarding"]
+
+
+def test_profile_change_refreshes_materialised_list(rec):
+    rec.log_query("u1", "fees")
+    _drain(rec)
+    assert "u1" in rec._recs
+
+    first = rec.recommend("u1", k=3)
+    assert rec.metrics["rec_hits"] == 1 and len(first) == 3
+
+    rec.log_sources("u1", ["docs/" + first[0]["title"].lower() + ".md"])
+    assert first[0] not in rec.recommend("u1", k=3)      # filtered before refresh
+    _drain(rec)
+    assert rec.metrics["rec_misses"] == 0
+
+
+def test_calls_after_close_do_not_raise(rec):
+    rec.close()
+    rec.log_query("u1", "fees")                          # request outlived its tenant
+    rec.log_sources("u1", ["docs/fees.md"])
+    assert rec.metrics["rec_after_close"] >= 2
+
+
+def test_kb_swap_rebuilds_active_lists_in_background(rec, topic_kb):
+    rec.log_query("u1", "fees")
+    _drain(rec)
+    rec.swap_kb(topic_kb, "v2")
+    assert rec._recs == {}
+    _drain(rec)
+    assert "u1" in rec._recs
+    rec.recommend("u1", k=3)
+    assert rec.metrics["rec_misses"] == 0
+
+
+def test_list_computed_against_an_old_kb_is_not_stored(rec):
+    rec.log_query("u1", "fees")
+    _drain(rec)
+    rec._recs.clear()
+    compute = rec._compute
+
+    def compute_during_swap(*args):
+        recs = compute(*args)
+        rec.set_kb_version("v2")                         # reload lands mid-computation
+        return recs
+    rec._compute = compute_during_swap
+    assert rec.recommend("u1", k=3)
+    assert "u1" not in rec._recs
+
+
+def test_per_question_list_is_not_served_as_the_users_list(rec, topics):
+    qvec = np.eye(len(topics))[1]                        # a "payments" question
+    recs = rec.recommend_with_hits("u1", qvec, [], ["docs/fees.md", "docs/payments.md"],
+                                   k=1, exclude=["docs/payments.md"])
+    assert [r["title"] for r in recs] == ["Fees"]
+    _drain(rec)
+    assert rec._recs["u1"][0][0] == "docs/payments.md"    # context only excluded for that answer
@@ -0,0 +1,49 @@
+# tests/test_reload.py
+from app.services.recommender import RecommendationService
+
+
+def test_reload_reembeds_only_changed_files_and_swaps(make_rag, tmp_path, monkeypatch):
+    rag = make_rag({"fees.md": "The fee is 10 %. Every fee is listed.",
+                    "disputes.md": "Open a dispute within 14 days."})
+    docs = rag.docs_path
+    monkeypatch.setenv("OPENAI_API_KEY", "sk-test")
+    rec = RecommendationService(rag.vectordb, persist_path=str(tmp_path / "p.json"),
+                                kb_version=rag.kb_version, provider=rag.provider)
+    rec.log_sources("u1", [str(docs / "fees.md")])
+    rag.on_reload.append(rec.swap_kb)
+    chain = rag._get_chain("u1")
+    old_version, old_db = rag.kb_version, rag.vectordb
+
+    (docs / "disputes.md").write_text("Open a dispute within 14 days; escrow is frozen.")
+    (docs / "refunds.md").write_text("A refund takes five days.")
+    rag.emb.embedded.clear()
+    assert rag.reload()
+
+    assert rag.kb_version != old_version and rag.vectordb is not old_db
+    reembedded = " ".join(rag.emb.embedded)
+    assert "fee is 10" not in reembedded and "refund" in reembedded and "escrow" in reembedded
+    assert rag.vectordb._collection.count() == 3
+    hit = rag.vectordb.similarity_search_by_vector(rag.emb.vec("refund"), k=1)[0]
+    assert hit.metadata["source"].endswith("refunds.md")
+    assert set(rag._kb.passages) == {str(docs / n) for n in ("fees.md", "disputes.md", "refunds.md")}
+
+    assert rag._get_chain("u1") is chain                          # conversations survive
+    assert rec.vectordb is rag.vectordb and rec.kb_version == rag.kb_version
+    assert len(rec._get_vectors()[0]) == 3
+    assert rec._profiles["u1"].docs == {str(docs / "fees.md")}    # profiles survive
+
+    assert not rag.reload()                                       # nothing changed
+    assert rag.metrics["kb_reloads"] == 1 and rag.metrics["kb_files_reembedded"] == 2
+
+
+def test_edit_revert_reapply_never_drops_the_live_collection(make_rag):
+    rag = make_rag({"fees.md": "The fee is 10 %.", "disputes.md": "Open a dispute."})
+    fees = rag.docs_path / "fees.md"
+    for text in ("The fee is 12 %.", "The fee is 10 %.", "The fee is 12 %."):
+        before = rag._kb
+        fees.write_text(text)
+        assert rag.reload()
+        assert rag._kb is not before and rag.kb_version != before.version
+        assert rag.vectordb._collection.count() == 2
+        hit = rag.vectordb.similarity_search_by_vector(rag.emb.vec("fee"), k=1)[0]
+        assert hit.page_content == text
@@ -0,0 +1,67 @@
+# tests/test_routing.py
+import pytest
+from app.services.rag import OFF_SCOPE_REPLY
+
+TOPICS = {
+    "payments/fees.md": "The platform fee is 10 %, every fee is listed.",
+    "payments/refunds.md": "A refund of the fee is possible within 14 days.",
+    "payments/escrow.md": "Escrow keeps the funds until delivery; escrow is free.",
+    "support/disputes.md": "Disputes are opened within 14 days; a dispute is reviewed fast.",
+    "about/team.md": "Our team is spread across Europe and the team grows every year.",
+}
+
+
+@pytest.fixture
+def routed(make_rag):
+    return make_rag(route_threshold=0.25)
+
+
+@pytest.fixture
+def gated(routed):
+    def no_more_work(*args, **kwargs):
+        raise AssertionError("off-scope question reached mood / retrieval")
+    routed._update_mood = routed._answer = no_more_work
+    return routed
+
+
+def test_keyword_gate_rejects_without_embedding(gated):
+    queries = gated.emb.queries
+    assert gated.ask("Escríbeme un poema sobre el mar", "u1") == (OFF_SCOPE_REPLY, [])
+    assert gated.emb.queries == queries and gated.metrics["route_rejected_keyword"] == 1
+
+
+def test_centroid_gate_rejects_unrelated_questions(gated):
+    assert gated.ask("What is the weather like tomorrow?", "u1") == (OFF_SCOPE_REPLY, [])
+    assert gated.metrics["route_rejected_embedding"] == 1 and gated.metrics["route_reject_us"] > 0
+
+
+def test_embedding_gate_and_narrowing_are_off_by_default(rag):
+    queries = rag.emb.queries
+    assert rag.route("What is the weather like tomorrow?").in_scope
+    assert rag.emb.queries == queries
+    assert rag._topic_filter(rag._embed("How much is the fee?"), k=1) is None
+
+
+def test_in_scope_question_is_routed_and_search_narrowed(routed):
+    verdict = routed.route("How much is the fee?")
+    assert verdict.in_scope and verdict.topics == ("fees.md",)
+
+    assert routed._topic_filter(routed._embed("How much is the fee?"), k=1) == {"topic": "fees.md"}
+    assert routed.metrics["retrieval_docs_searched"] == 1
+    assert routed.metrics["retrieval_docs_total"] == 3
+
+    assert routed.route("How much is the fee?", follow_up=True).in_scope
+    assert routed.route("¿y eso?", follow_up=True).in_scope          # history decides
+
+
+def test_narrowing_widens_until_k_documents_are_covered(make_rag):
+    rag = make_rag(TOPICS, route_threshold=0.25)
+    qvec = rag._embed("How much is the fee?")
+    assert rag._topic_filter(qvec, k=3) == {"topic": "payments"}
+    widened = rag._topic_filter(qvec, k=4)["topic"]["$in"]
+    assert len(widened) == 2 and widened[0] == "payments"
+
+    rag.metrics.clear()
+    answer, sources = rag.ask("How much is the fee?", "u1")
+    assert len(sources) == 3                                # k=3 hits, not one topic's single file
+    assert rag.metrics["retrieval_docs_total"] == 5         # guard + retriever counted once
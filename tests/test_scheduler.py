@@ -0,0 +1,101 @@
+# tests/test_scheduler.py
+import asyncio
+import threading
+import time
+
+import pytest
+from app.services.scheduler import LLMScheduler, Priority, SchedulerTimeout
+
+
+def _hold(sched, release: threading.Event, **kw):
+    """Take a slot in a background thread and keep it until *release* is set."""
+    taken = threading.Event()
+
+    def run():
+        with sched.slot(**kw):
+            taken.set()
+            release.wait()
+    threading.Thread(target=run, daemon=True).start()
+    taken.wait()
+
+
+def test_interactive_calls_overtake_queued_batch_calls():
+    sched = LLMScheduler(max_concurrency=1, max_wait={Priority.INTERACTIVE: None})
+    release, order = threading.Event(), []
+    _hold(sched, release)
+
+    def call(priority, name):
+        with sched.slot(priority):
+            order.append(name)
+
+    threads = [threading.Thread(target=call, args=(Priority.BATCH, "batch"))]
+    threads[0].start()
+    time.sleep(0.02)
+    threads.append(threading.Thread(target=call, args=(Priority.INTERACTIVE, "interactive")))
+    threads[1].start()
+    time.sleep(0.02)
+    assert sched.status()["queue_depth"] == {"batch": 1, "interactive": 1}
+
+    release.set()
+    for t in threads:
+        t.join()
+    assert order == ["interactive", "batch"]
+    assert sched.status()["in_flight"] == 0
+
+
+def test_queue_wait_over_budget_fails_fast():
+    sched = LLMScheduler(max_concurrency=1, max_wait={Priority.INTERACTIVE: 0.05})
+    release = threading.Event()
+    _hold(sched, release)
+
+    start = time.monotonic()
+    with pytest.raises(SchedulerTimeout):
+        with sched.slot():
+            pass
+    assert time.monotonic() - start < 1
+    assert sched.metrics["llm_rejected_interactive"] == 1
+    release.set()
+
+
+def test_token_bucket_delays_calls_over_tpm():
+    sched = LLMScheduler(max_concurrency=4, tpm=6000)        # 100 tokens / s
+    with sched.slot(tokens=6000):
+        pass
+    start = time.monotonic()
+    with sched.slot(tokens=50):
+        pass
+    assert 0.3 < time.monotonic() - start < 2
+
+
+def test_async_waiter_cancelled_while_queued_leaves_no_slot_behind():
+    sched = LLMScheduler(max_concurrency=1, max_wait={Priority.INTERACTIVE: None})
+    release = threading.Event()
+    _hold(sched, release)
+
+    async def scenario():
+        async def waiter():
+            async with sched.aslot():
+                pass
+        task = asyncio.create_task(waiter())
+        await asyncio.sleep(0.02)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+    asyncio.run(scenario())
+
+    release.set()
+    time.sleep(0.02)
+    assert sched.status()["in_flight"] == 0 and sched.status()["queue_depth"] == {}
+
+
+def test_batch_ask_queues_instead_of_getting_busy_reply(make_rag):
+    from app.services.rag import BUSY_REPLY
+    sched = LLMScheduler(max_concurrency=1, max_wait={Priority.INTERACTIVE: 0.05})
+    rag = make_rag(scheduler=sched)
+    release = threading.Event()
+    _hold(sched, release)
+
+    assert rag.ask("How much is the platform fee?", "u1") == (BUSY_REPLY, [])
+    threading.Timer(0.2, release.set).start()
+    answer, sources = rag.ask("How much is the platform fee?", "u2", priority=Priority.BATCH)
+    assert answer != BUSY_REPLY and sources
@@ -0,0 +1,21 @@
+# tests/test_single_flight.py
+from concurrent.futures import ThreadPoolExecutor
+
+
+def test_identical_questions_share_one_upstream_call(rag):
+    rag.llm.delay = 0.2
+    questions = ["¿Cuánto es la fee de la plataforma?", "cuánto es la fee  de la plataforma"]
+    with ThreadPoolExecutor(10) as pool:
+        results = list(pool.map(lambda i: rag.ask(questions[i % 2], f"u{i}"), range(10)))
+
+    assert rag.llm.calls == 1
+    assert rag.metrics["ask_coalesced"] == 9
+    assert all(r == results[0] for r in results) and results[0][1]
+    for i in range(10):                             # every user got its own turn
+        assert len(rag._get_chain(f"u{i}").memory.chat_memory.messages) == 2
+
+
+def test_users_with_history_are_not_coalesced(rag):
+    rag.ask("¿Cuánto es la fee de la plataforma?", "u1")
+    rag.ask("¿Cuánto es la fee de la plataforma?", "u1")
+    assert rag.llm.calls == 3                       # 2 answers + 1 condensed follow-up
@@ -0,0 +1,52 @@
+# tests/test_sse.py
+import asyncio
+import logging
+from collections import Counter
+
+from app.api.v1.sse import ERROR_MESSAGE, encode_sse, format_event
+
+
+async def _events(items, delay=0.0):
+    for item in items:
+        await asyncio.sleep(delay)
+        yield item
+
+
+def _collect(gen):
+    async def run():
+        return [frame async for frame in gen]
+    return asyncio.run(run())
+
+
+def test_multiline_payload_keeps_framing():
+    assert format_event("token", "a\nb") == "event: token\ndata: a\ndata: b\n\n"
+
+
+def test_tokens_coalesced_and_typed():
+    stats = Counter()
+    items = [("token", f"t{i} ") for i in range(100)] + [("sources", ["docs/fees.md"])]
+    frames = _collect(encode_sse(_events(items), max_bytes=64, stats=stats))
+
+    assert frames[-2] == 'event: sources\ndata: ["docs/fees.md"]\n\n'
+    assert frames[-1] == "event: done\ndata: \n\n"
+    token_frames = [f for f in frames if f.startswith("event: token")]
+    assert 1 < len(token_frames) < 20
+    assert stats["sse_tokens"] == 100 and stats["sse_frames"] == len(frames)
+
+
+def test_heartbeat_on_idle_stream():
+    frames = _collect(encode_sse(_events([("token", "x")], delay=0.05), heartbeat=0.01))
+    assert ": ping\n\n" in frames
+
+
+def test_upstream_error_is_logged_not_sent(caplog):
+    async def failing():
+        yield "token", "Hola"
+        raise RuntimeError("db password=hunter2")
+
+    stats = Counter()
+    with caplog.at_level(logging.ERROR, logger="app.sse"):
+        frames = _collect(encode_sse(failing(), stats=stats))
+    assert frames[-2:] == [format_event("error", ERROR_MESSAGE), "event: done\ndata: \n\n"]
+    assert not any("hunter2" in f for f in frames)
+    assert "hunter2" in caplog.text and stats["sse_errors"] == 1
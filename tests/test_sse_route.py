@@ -0,0 +1,34 @@
+# tests/test_sse_route.py
+import asyncio
+
+from app.api.v1 import routes
+
+
+class DisconnectingRequest:
+    """Reports the client as gone once *after* frames were sent."""
+    def __init__(self, after: int):
+        self.after, self.polls = after, 0
+
+    async def is_disconnected(self) -> bool:
+        self.polls += 1
+        return self.polls > self.after
+
+
+def test_ask_stream_route_cancels_generation_on_disconnect(rag):
+    rag.provider.answer = " ".join(f"tok{i}" for i in range(200))
+    rag.provider.delay = 0.01
+
+    async def scenario():
+        response = await routes.ask_stream(DisconnectingRequest(after=2),
+                                           "How much is the platform fee?", "u1", rag)
+        frames = [frame async for frame in response.body_iterator]
+        llm = rag.provider.chats[-1]
+        stopped_at = llm.emitted
+        await asyncio.sleep(0.1)                    # ~10 more tokens if still running
+        return frames, stopped_at, llm.emitted
+
+    frames, stopped_at, later = asyncio.run(scenario())
+    assert len(frames) == 2 and not any("event: done" in f for f in frames)
+    assert stopped_at == later < 200                # LLM task cancelled
+    assert rag.metrics["streams_aborted"] == 1
+    assert rag.scheduler.status()["in_flight"] == 0
@@ -0,0 +1,23 @@
+# tests/test_stream_cancel.py
+import asyncio
+
+
+def test_stream_cancelled_on_disconnect(rag):
+    rag.provider.answer = " ".join(f"tok{i}" for i in range(200))
+    rag.provider.delay = 0.01
+
+    async def scenario():
+        stream = rag.ask_stream("How much is the platform fee?", "u1")
+        for _ in range(3):
+            await stream.__anext__()
+        await stream.aclose()                       # client disconnected
+        llm = rag.provider.chats[-1]
+        stopped_at = llm.emitted
+        await asyncio.sleep(0.1)                    # ~10 more tokens if still running
+        return stopped_at, llm.emitted
+
+    stopped_at, later = asyncio.run(scenario())
+    assert 3 <= stopped_at == later < 10
+    assert rag.metrics["streams_aborted"] == 1
+    assert rag._get_chain("u1").memory.chat_memory.messages == []   # partial answer not committed
+    assert rag.scheduler.status()["in_flight"] == 0                  # LLM slot given back
@@ -0,0 +1,86 @@
+# tests/test_tenants.py
+import threading
+import time
+from types import SimpleNamespace
+
+import pytest
+from app.services.tenants import Tenant, TenantRegistry
+
+
+class Factory:
+    """Builds fake tenants of a given size and records loads / closes."""
+    def __init__(self, sizes):
+        self.sizes, self.loads, self.closed = sizes, [], []
+
+    def __call__(self, name):
+        if name not in self.sizes:
+            raise LookupError(name)
+        self.loads.append(name)
+        time.sleep(0.02)                                  # slow enough to overlap
+        size = self.sizes[name]
+        rag = SimpleNamespace(memory_bytes=lambda: size,
+                              close=lambda: self.closed.append(("rag", name)))
+        rec = SimpleNamespace(memory_bytes=lambda: 0,
+                              close=lambda: self.closed.append(("rec", name)))
+        return Tenant(name, rag, rec)
+
+
+def test_tenants_load_lazily_once_and_evict_lru_by_count():
+    factory = Factory({"a": 10, "b": 10, "c": 10})
+    reg = TenantRegistry(factory, max_loaded=2, grace=0)
+
+    threads = [threading.Thread(target=reg.get, args=("a",)) for _ in range(5)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert factory.loads == ["a"]                         # concurrent first use → one load
+
+    reg.get("b")
+    reg.get("a")                                          # a is now most recent
+    reg.get("c")
+    assert list(reg.status()["loaded"]) == ["a", "c"]
+    time.sleep(0.05)
+    assert factory.closed == [("rec", "b"), ("rag", "b")]
+    assert reg.metrics["tenant_evictions"] == 1
+
+
+def test_memory_budget_and_unknown_tenant():
+    factory = Factory({"a": 60, "b": 60, "big": 500})
+    reg = TenantRegistry(factory, max_loaded=10, max_bytes=100, grace=0)
+
+    reg.get("a")
+    reg.get("b")
+    assert list(reg.status()["loaded"]) == ["b"]
+    reg.get("big")                                        # over budget alone: still served
+    assert list(reg.status()["loaded"]) == ["big"]
+
+    with pytest.raises(LookupError):
+        reg.get("nope")
+    with pytest.raises(LookupError):                      # failures are not cached as loading
+        reg.get("nope")
+
+
+def test_tenant_requested_during_grace_is_revived_not_reloaded():
+    factory = Factory({"a": 10, "b": 10})
+    reg = TenantRegistry(factory, max_loaded=1, grace=30)
+
+    first = reg.get("a")
+    reg.get("b")                                          # a evicted, closing in 30 s
+    assert reg.get("a") is first                          # same instance, same collection
+    assert factory.loads == ["a", "b"] and factory.closed == []
+    assert reg.metrics["tenant_revived"] == 1
+
+
+def test_revived_tenant_counts_in_the_budget_and_closes_on_next_eviction():
+    factory = Factory({"a": 60, "b": 30})
+    reg = TenantRegistry(factory, max_loaded=1, grace=0.05)
+
+    first = reg.get("a")
+    reg.get("b")
+    assert reg.get("a") is first                          # revived within the grace period
+    assert reg._bytes == {"a": 60}
+    reg.get("b")                                          # a evicted again: no KeyError
+    assert reg._bytes == {"b": 30} and reg.metrics["tenant_evictions"] == 3
+    time.sleep(0.2)
+    assert ("rec", "a") in factory.closed and ("rag", "a") in factory.closed